@@ -0,0 +1,165 @@
+"""
+Incremental maintenance of the UserActivity projection.
+
+Each auction event updates the projection in a couple of set-wise queries, and
+rebuild() reconstructs it from Listing, Watchlist, Bid and RemovedPurchase.
+Admin edits go through rebuild_listings() for the listings they touch.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Max
+
+from . import sharding
+from .models import Bid, Listing, RemovedPurchase, UserActivity, Watchlist
+
+# Dashboard mode -> projection relation
+MODE_RELATIONS = {
+    "watchlist": "watching",
+    "my_listings": "selling",
+    "my_purchases": "bidding",
+}
+
+PAGE_SIZE = 24
+
+
+def activity_status(is_active, winner_id, user_id, relation):
+    if is_active:
+        return "active"
+    if relation == "selling":
+        return "closed"
+    return "won" if winner_id == user_id else "lost"
+
+
+def listing_created(listing):
+    UserActivity.objects.create(
+        user_id=listing.owner_id, listing=listing, relation="selling",
+        price=listing.starting_bid, status=activity_status(listing.is_active, listing.winner_id, listing.owner_id, "selling"),
+    )
+
+
+def watch_added(user, listing, price, has_bids):
+    UserActivity.objects.get_or_create(
+        user=user, listing=listing, relation="watching",
+        defaults={
+            "price": price, "has_bids": has_bids,
+            "status": activity_status(listing.is_active, listing.winner_id, user.pk, "watching"),
+        },
+    )
+
+
+def watch_removed(user, listing):
+    UserActivity.objects.filter(user=user, listing=listing, relation="watching").delete()
+
+
+def bid_placed(user_id, listing_id, amount):
+    # Everyone following the listing sees the new price
+    UserActivity.objects.filter(listing_id=listing_id).update(price=amount, has_bids=True)
+
+    if RemovedPurchase.objects.filter(user_id=user_id, listing_id=listing_id).exists():
+        return
+    UserActivity.objects.update_or_create(
+        user_id=user_id, listing_id=listing_id, relation="bidding",
+        defaults={"price": amount, "has_bids": True, "last_bid": amount, "status": "active"},
+    )
+
+
+def listings_closed(listing_ids):
+    """Mark every activity row of the given (already closed) listings as closed/won/lost."""
+    rows = UserActivity.objects.filter(listing_id__in=listing_ids)
+    rows.filter(relation="selling").update(status="closed")
+    followers = rows.exclude(relation="selling")
+    followers.update(status="lost")
+    followers.filter(listing__winner=F("user")).update(status="won")
+
+
+def purchase_removed(user, listing):
+    UserActivity.objects.filter(user=user, listing=listing, relation="bidding").delete()
+
+
+def dashboard(user, mode, before=None):
+    """
+    Return (rows, next_before) for one page of a dashboard, newest listings first.
+    Pages are keyed on listing id, so each page is a range scan over the unique index.
+    """
+    rows = (
+        UserActivity.objects
+        .filter(user=user, relation=MODE_RELATIONS[mode])
+        .select_related("listing")
+        .order_by("-listing_id")
+    )
+    if before:
+        rows = rows.filter(listing_id__lt=before)
+
+    rows = list(rows[:PAGE_SIZE + 1])
+    next_before = rows[PAGE_SIZE - 1].listing_id if len(rows) > PAGE_SIZE else None
+    return rows[:PAGE_SIZE], next_before
+
+
+def activity_rows(listings, listing_ids=None):
+    """
+    Projection rows built from the source tables, for the `listings` queryset.
+    `listing_ids` narrows the watch, bid and removed purchase reads to the same listings.
+    """
+    listings = {
+        listing["id"]: listing
+        for listing in sharding.with_top_bids(listings, "id", "owner_id", "winner_id", "is_active", "starting_bid")
+    }
+    scope = {"listing_id__in": listing_ids} if listing_ids is not None else {}
+    removed = set(RemovedPurchase.objects.filter(**scope).values_list("user_id", "listing_id").iterator())
+
+    def row(user_id, listing_id, relation, last_bid=None):
+        listing = listings[listing_id]
+        return UserActivity(
+            user_id=user_id, listing_id=listing_id, relation=relation,
+            price=Decimal(listing["top_bid"] if listing["top_bid"] is not None else listing["starting_bid"]),
+            has_bids=listing["top_bid"] is not None, last_bid=last_bid,
+            status=activity_status(listing["is_active"], listing["winner_id"], user_id, relation),
+        )
+
+    for listing_id, listing in listings.items():
+        yield row(listing["owner_id"], listing_id, "selling")
+    watches = Watchlist.objects.filter(**scope).values_list("user_id", "listing_id").distinct()
+    for user_id, listing_id in watches.iterator():
+        yield row(user_id, listing_id, "watching")
+    # Outside a rebalance a listing's bids are all on one shard, so per-shard groups don't overlap
+    for alias in sharding.shard_aliases():
+        bids = (
+            Bid.objects.using(alias).filter(**scope)
+            .values("bidder_id", "listing_id").annotate(last_bid=Max("amount")).order_by()
+        )
+        for bid in bids.iterator():
+            key = (bid["bidder_id"], bid["listing_id"])
+            if key not in removed and listings[bid["listing_id"]]["owner_id"] != bid["bidder_id"]:
+                yield row(*key, "bidding", last_bid=bid["last_bid"])
+
+
+def rebuild(batch_size=1000):
+    """Recreate the whole projection from the source tables. Returns the number of rows written."""
+    written = 0
+    with transaction.atomic():
+        UserActivity.objects.all().delete()
+        batch = []
+        for activity in activity_rows(Listing.objects.all()):
+            batch.append(activity)
+            if len(batch) >= batch_size:
+                UserActivity.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        UserActivity.objects.bulk_create(batch)
+        written += len(batch)
+    return written
+
+
+def rebuild_listings(listing_ids):
+    """
+    Recreate the projection rows of some listings from the source tables.
+    For writes that bypass the events above, such as admin edits; other bulk or raw
+    edits of listings, bids or watches need `manage.py rebuild_activity` afterwards.
+    """
+    listing_ids = list(set(listing_ids))
+    if not listing_ids:
+        return
+    with transaction.atomic():
+        UserActivity.objects.filter(listing_id__in=listing_ids).delete()
+        UserActivity.objects.bulk_create(activity_rows(Listing.objects.filter(pk__in=listing_ids), listing_ids))
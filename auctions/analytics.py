@@ -0,0 +1,164 @@
+"""
+Vectorized auction reporting over the full bid history.
+
+Bids are read in keyset-paginated chunks (so SQLite is never held by one long
+read) and folded into NumPy accumulators indexed by listing and user id. Memory
+is bounded by the number of listings, users and distinct minutes, not by the
+number of bids. NumPy is optional and only needed for this module.
+"""
+import csv
+import os
+from datetime import datetime, timezone
+
+from django.db.models import CharField, Max
+from django.db.models.functions import Cast, Substr
+
+from . import sharding
+from .models import Bid, CATEGORY_CHOICES, Listing, User
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+CHUNK_SIZE = 100000
+
+UNCATEGORIZED = "Uncategorized"
+
+# Categories no longer in CATEGORY_CHOICES (renamed or retired) still count, under one bucket
+OTHER = "Other"
+
+
+def iter_chunks(queryset, fields, chunk_size=CHUNK_SIZE):
+    """Yield lists of `fields` tuples ordered by id, one keyset page at a time."""
+    last_id = 0
+    while True:
+        rows = list(queryset.filter(id__gt=last_id).order_by("id").values_list("id", *fields)[:chunk_size])
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        yield rows
+
+
+class BidStats:
+    """Running per-listing, per-bidder and per-minute aggregates over bid chunks."""
+
+    def __init__(self, max_listing_id, max_user_id):
+        self.max_bid = np.zeros(max_listing_id + 1, dtype=np.int64)
+        self.listing_bids = np.zeros(max_listing_id + 1, dtype=np.int64)
+        self.bidder_bids = np.zeros(max_user_id + 1, dtype=np.int64)
+        self.bidder_amount = np.zeros(max_user_id + 1, dtype=np.int64)
+        self.minutes = {}
+        self.total = 0
+
+    def add(self, rows):
+        _, listing_ids, bidder_ids, amounts, minutes = zip(*rows)
+        count = len(rows)
+        listing_ids = np.fromiter(listing_ids, dtype=np.int64, count=count)
+        bidder_ids = np.fromiter(bidder_ids, dtype=np.int64, count=count)
+        amounts = np.fromiter(amounts, dtype=np.int64, count=count)
+
+        np.maximum.at(self.max_bid, listing_ids, amounts)
+        self.listing_bids += np.bincount(listing_ids, minlength=len(self.listing_bids))
+        self.bidder_bids += np.bincount(bidder_ids, minlength=len(self.bidder_bids))
+        # Money stays in integers; bincount's weights would sum it as float64 and round large totals
+        np.add.at(self.bidder_amount, bidder_ids, amounts)
+
+        # Parsed in one vectorized call; bids from before timestamps were recorded come back as NaT
+        minutes = np.array(minutes, dtype="datetime64[m]")
+        minutes = minutes[~np.isnat(minutes)].astype(np.int64)
+        for minute, bids in zip(*np.unique(minutes, return_counts=True)):
+            self.minutes[int(minute)] = self.minutes.get(int(minute), 0) + int(bids)
+
+        self.total += count
+
+
+def collect(chunk_size=CHUNK_SIZE):
+    """Stream all bids and listings and return (BidStats, per-category rows)."""
+    if np is None:
+        raise ImportError("NumPy is required for auction analytics (pip install numpy).")
+
+    # Snapshot bids first: every bid up to a shard's max id references a listing and user that already exist
+    max_bid_ids = {
+        alias: Bid.objects.using(alias).aggregate(max_id=Max("id"))["max_id"] or 0
+        for alias in sharding.shard_aliases()
+    }
+    max_listing_id = Listing.objects.aggregate(max_id=Max("id"))["max_id"] or 0
+    max_user_id = User.objects.aggregate(max_id=Max("id"))["max_id"] or 0
+    stats = BidStats(max_listing_id, max_user_id)
+
+    # "YYYY-MM-DD HH:MM" text is far cheaper to fetch than datetimes the ORM would parse row by row
+    for alias, max_bid_id in max_bid_ids.items():
+        bids = Bid.objects.using(alias).filter(id__lte=max_bid_id).annotate(
+            minute=Substr(Cast("placed_at", CharField()), 1, 16),
+        )
+        for rows in iter_chunks(bids, ("listing_id", "bidder_id", "amount", "minute"), chunk_size):
+            stats.add(rows)
+
+    categories = {name: {"listings": 0, "closed": 0, "sold": 0, "uplift_sum": 0.0, "with_bids": 0}
+                  for name, _ in CATEGORY_CHOICES + [(UNCATEGORIZED, UNCATEGORIZED), (OTHER, OTHER)]}
+    known = {name for name, _ in CATEGORY_CHOICES}
+    fields = ("category", "starting_bid", "is_active", "winner_id")
+    for rows in iter_chunks(Listing.objects.filter(id__lte=max_listing_id), fields, chunk_size):
+        ids, category, starting_bid, is_active, winner_id = zip(*rows)
+        count = len(rows)
+        ids = np.fromiter(ids, dtype=np.int64, count=count)
+        category = np.array([name if name in known else OTHER if name else UNCATEGORIZED for name in category])
+        starting_bid = np.fromiter(starting_bid, dtype=np.float64, count=count)
+        closed = ~np.fromiter(is_active, dtype=bool, count=count)
+        sold = closed & np.fromiter((winner is not None for winner in winner_id), dtype=bool, count=count)
+        with_bids = stats.listing_bids[ids] > 0
+        uplift = np.where(with_bids, stats.max_bid[ids] / starting_bid - 1, 0.0)
+
+        for name, totals in categories.items():
+            mask = category == name
+            totals["listings"] += int(mask.sum())
+            totals["closed"] += int((mask & closed).sum())
+            totals["sold"] += int((mask & sold).sum())
+            totals["with_bids"] += int((mask & with_bids).sum())
+            totals["uplift_sum"] += float(uplift[mask].sum())
+
+    return stats, categories
+
+
+def write_report(output_dir, top=20, chunk_size=CHUNK_SIZE):
+    """Compute every report and write one CSV per report into `output_dir`. Returns the written paths."""
+    stats, categories = collect(chunk_size)
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+
+    def write(name, header, rows):
+        path = os.path.join(output_dir, name)
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(rows)
+        paths.append(path)
+
+    write("bids_per_minute.csv", ["minute", "bids"], (
+        (datetime.fromtimestamp(minute * 60, timezone.utc).isoformat(), bids)
+        for minute, bids in sorted(stats.minutes.items())
+    ))
+
+    write("categories.csv", ["category", "listings", "closed", "sell_through_rate", "mean_price_uplift"], (
+        (
+            name,
+            totals["listings"],
+            totals["closed"],
+            round(totals["sold"] / totals["closed"], 4) if totals["closed"] else "",
+            round(totals["uplift_sum"] / totals["with_bids"], 4) if totals["with_bids"] else "",
+        )
+        for name, totals in categories.items()
+    ))
+
+    # argpartition picks the top bidders without sorting every user
+    top = min(top, len(stats.bidder_bids))
+    leaders = np.argpartition(stats.bidder_bids, -top)[-top:] if top else np.array([], dtype=np.int64)
+    leaders = leaders[np.argsort(stats.bidder_bids[leaders])[::-1]]
+    usernames = dict(User.objects.filter(pk__in=leaders.tolist()).values_list("id", "username"))
+    write("top_bidders.csv", ["user_id", "username", "bids", "total_amount"], (
+        (int(user_id), usernames.get(int(user_id), ""), int(stats.bidder_bids[user_id]), int(stats.bidder_amount[user_id]))
+        for user_id in leaders if stats.bidder_bids[user_id]
+    ))
+
+    return paths
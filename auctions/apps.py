@@ -1,5 +1,29 @@
+import os
+
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class AuctionsConfig(AppConfig):
     name = 'auctions'
+
+    def ready(self):
+        # Connects the signals that delete sharded bids and comments with their listing or user
+        from . import sharding
+
+        if settings.TEMPLATE_PRELOAD:
+            self.preload_templates()
+
+    def preload_templates(self):
+        """Compile every auctions/**/*.html template into the cached template loader."""
+        from django.template.loader import get_template
+        from django.urls import reverse
+
+        root = os.path.join(self.path, 'templates')
+        for directory, _, names in os.walk(os.path.join(root, 'auctions')):
+            for name in sorted(names):
+                if name.endswith('.html'):
+                    get_template(os.path.relpath(os.path.join(directory, name), root).replace(os.sep, '/'))
+
+        # Every page renders {% url %} tags; the first reverse() loads the URLconf and builds its lookup table
+        reverse('index')
@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+from . import metrics
+from .models import user_cache_key
+
+
+def user_cache_enabled():
+    """
+    The cached User is only invalidated in the cache it lives in, so a per-process cache
+    would let other workers keep a deactivated user or an old password for the whole
+    timeout. Caching is therefore off unless the default cache is shared between
+    processes, or AUTH_USER_CACHE_LOCAL accepts a per-process one (single worker setups).
+    """
+    backend = caches[DEFAULT_CACHE_ALIAS]
+    if isinstance(backend, DummyCache):
+        return False
+    return settings.AUTH_USER_CACHE_LOCAL or not isinstance(backend, LocMemCache)
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend that keeps the User row in the shared cache between requests,
+    so authenticated requests skip the user query. Every write through the ORM
+    invalidates it: User.save() and delete(), and update() and delete() on User
+    querysets. Raw SQL writes to the user table don't; clear the cache after them.
+    """
+
+    def get_user(self, user_id):
+        if not user_cache_enabled():
+            return super().get_user(user_id)
+
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+        metrics.USER_CACHE_LOOKUPS.inc("miss" if user is None else "hit")
+        if user is None:
+            user = super().get_user(user_id)
+            if user is None:
+                return None
+            cache.set(key, user, settings.AUTH_USER_CACHE_TIMEOUT)
+        return user if self.user_can_authenticate(user) else None
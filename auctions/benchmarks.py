@@ -0,0 +1,581 @@
+"""
+Micro-benchmarks for the auction hot paths.
+
+Scenarios register themselves with @benchmark and are run by `python manage.py bench`.
+Each scenario returns a list of (label, value, unit) rows.
+"""
+import json
+import os
+import random
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import timedelta
+from importlib import import_module
+from io import StringIO
+
+from django.core.cache import cache, caches
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import Length, TruncMinute
+from django.http import HttpResponse
+from django.template.loader import get_template
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import activity, analytics, cards, events, metrics, proxy, recommendations, views
+from .finders import SPRITE_NAME, sprite_path
+from .livestate import AuctionState, LiveAuctionStore, load_state
+from .models import AuctionEvent, Bid, CATEGORY_CHOICES, Listing, ProxyBid, User, Watchlist
+from .ratelimit import ratelimit
+from .utils import close_listings, current_price, get_listing_context
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def decorator(func):
+        BENCHMARKS[name] = func
+        return func
+    return decorator
+
+
+def measure(func, number=10000):
+    """Return the mean wall time of func() in microseconds."""
+    start = time.perf_counter()
+    for _ in range(number):
+        func()
+    return (time.perf_counter() - start) / number * 1e6
+
+
+@benchmark("ratelimit")
+def bench_ratelimit():
+    caches[settings.RATELIMIT_CACHE].clear()
+    request = RequestFactory().post("/listing/1/bid/", REMOTE_ADDR="127.0.0.1")
+    request.user = AnonymousUser()
+
+    def view(request, listing_id):
+        return HttpResponse()
+
+    # Limits high enough that every call goes through the full counting path
+    limited = ratelimit(("user", "1000000/m"), ("ip", "1000000/m"), ("user_listing", "1000000/m"))(view)
+
+    bare = measure(lambda: view(request, listing_id=1))
+    wrapped = measure(lambda: limited(request, listing_id=1))
+    return [
+        ("bare view", bare, "us/request"),
+        ("3-rule limiter", wrapped, "us/request"),
+        ("limiter overhead", wrapped - bare, "us/request"),
+    ]
+
+
+@benchmark("auth")
+def bench_auth():
+    with override_settings(PASSWORD_HASHERS=settings.FAST_PASSWORD_HASHERS):
+        user = User.objects.create_user("bench-auth", password="bench")
+
+    profiles = [
+        ("db session + ModelBackend", "django.contrib.sessions.backends.db",
+         "django.contrib.auth.backends.ModelBackend"),
+        ("cached_db + CachedModelBackend", "django.contrib.sessions.backends.cached_db",
+         "auctions.backends.CachedModelBackend"),
+        ("signed_cookies + CachedModelBackend", "django.contrib.sessions.backends.signed_cookies",
+         "auctions.backends.CachedModelBackend"),
+    ]
+
+    rows = []
+    for label, engine, backend in profiles:
+        cache.clear()
+        # One process, so the locmem cache stands in for the shared cache production needs
+        with override_settings(SESSION_ENGINE=engine, AUTHENTICATION_BACKENDS=[backend], AUTH_USER_CACHE_LOCAL=True):
+            session = import_module(engine).SessionStore()
+            session[SESSION_KEY] = str(user.pk)
+            session[BACKEND_SESSION_KEY] = backend
+            session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+            session.save()
+
+            # Just the session + auth middleware, with a view that touches request.user
+            handler = SessionMiddleware(AuthenticationMiddleware(lambda request: HttpResponse(request.user.pk)))
+            factory = RequestFactory()
+
+            def run():
+                request = factory.get("/")
+                request.COOKIES[settings.SESSION_COOKIE_NAME] = session.session_key
+                handler(request)
+
+            run()
+            with CaptureQueriesContext(connection) as queries:
+                run()
+            rows.append((f"{label} queries", len(queries), "queries/request"))
+            rows.append((label, measure(run, 2000), "us/request"))
+    return rows
+
+
+def timed(func):
+    """Return the wall time of a single func() call in milliseconds."""
+    start = time.perf_counter()
+    func()
+    return (time.perf_counter() - start) * 1000
+
+
+def create_bid_history(users=200, listings=2000, bids=100000, seed=1):
+    """Bulk-create users, listings and bids spread over the last day."""
+    rng = random.Random(seed)
+    User.objects.bulk_create([User(username=f"bench-{i}") for i in range(users)])
+    user_ids = list(User.objects.values_list("id", flat=True))
+    categories = [name for name, _ in CATEGORY_CHOICES] + [None]
+    Listing.objects.bulk_create([
+        Listing(title=f"Listing {i}", description="", starting_bid=rng.randint(1, 100),
+                category=rng.choice(categories), owner_id=rng.choice(user_ids), is_active=rng.random() < 0.5)
+        for i in range(listings)
+    ])
+    listing_ids = list(Listing.objects.values_list("id", flat=True))
+    now = timezone.now()
+    Bid.objects.bulk_create([
+        Bid(amount=rng.randint(100, 10000), bidder_id=rng.choice(user_ids), listing_id=rng.choice(listing_ids),
+            placed_at=now - timedelta(seconds=rng.randint(0, 86400)))
+        for _ in range(bids)
+    ])
+
+
+@benchmark("analytics")
+def bench_analytics():
+    create_bid_history()
+
+    def orm():
+        list(Bid.objects.annotate(minute=TruncMinute("placed_at")).values("minute").annotate(bids=Count("id")))
+        list(Listing.objects.annotate(top=Max("bids__amount")).values_list(
+            "category", "starting_bid", "top", "is_active", "winner_id"))
+        list(Bid.objects.values("bidder").annotate(bids=Count("id"), total=Sum("amount")).order_by("-bids")[:20])
+
+    return [
+        ("ORM aggregation, 100k bids", timed(orm), "ms"),
+        ("chunked NumPy collect, 100k bids", timed(analytics.collect), "ms"),
+        ("chunked NumPy collect, 10k-row chunks", timed(lambda: analytics.collect(chunk_size=10000)), "ms"),
+    ]
+
+
+@benchmark("close")
+def bench_close():
+    create_bid_history(users=500, listings=100000, bids=200000)
+    Listing.objects.update(is_active=True)
+
+    with CaptureQueriesContext(connection) as queries:
+        elapsed = timed(lambda: close_listings(Listing.objects.all()))
+    return [
+        ("close 100k listings", elapsed, "ms"),
+        ("queries", len(queries), "queries"),
+    ]
+
+
+# Runs in a fresh interpreter: boots the WSGI application, then serves the login page twice.
+# The login page needs no database, so the probe works without the benchmark's test database.
+STARTUP_PROBE = """
+import json, time
+from wsgiref.util import setup_testing_defaults
+
+start = time.perf_counter()
+from commerce.wsgi import application
+boot = time.perf_counter() - start
+
+def get(path):
+    environ = {"PATH_INFO": path}
+    setup_testing_defaults(environ)
+    start = time.perf_counter()
+    b"".join(application(environ, lambda status, headers: None))
+    return time.perf_counter() - start
+
+print(json.dumps({"boot": boot, "first": get("/login/"), "second": get("/login/")}))
+"""
+
+
+@benchmark("startup")
+def bench_startup(runs=5):
+    variants = [
+        ("default", {}),
+        ("stdlib distutils", {"SETUPTOOLS_USE_DISTUTILS": "stdlib"}),
+        ("template preload", {"COMMERCE_TEMPLATE_PRELOAD": "1"}),
+    ]
+    rows = []
+    for label, env in variants:
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE="commerce.settings", **env)
+        samples = []
+        for _ in range(runs):
+            result = subprocess.run([sys.executable, "-c", STARTUP_PROBE], cwd=settings.BASE_DIR,
+                                    env=env, capture_output=True, text=True, check=True)
+            samples.append(json.loads(result.stdout.splitlines()[-1]))
+        # Medians, since a single cold start is noisy
+        for key, name in (("boot", "boot"), ("first", "first request"), ("second", "second request")):
+            rows.append((f"{label}: {name}", statistics.median(s[key] for s in samples) * 1000, "ms"))
+    return rows
+
+
+@benchmark("render")
+def bench_render():
+    create_bid_history(users=100, listings=1000, bids=20000)
+    Listing.objects.update(is_active=True)
+    listings = Listing.objects.filter(is_active=True)
+    request = RequestFactory().get("/")
+    request.user = AnonymousUser()
+    grid = get_template("auctions/cards/index.html")
+
+    with CaptureQueriesContext(connection) as queries:
+        built = cards.listing_cards(listings)
+    rows = [
+        ("per-listing current_price()", timed(lambda: current_price(listings)), "ms/1000 cards"),
+        ("listing_cards() (one query)", timed(lambda: cards.listing_cards(listings)), "ms/1000 cards"),
+        ("listing_cards() queries", len(queries), "queries"),
+    ]
+
+    grid.render({"listings": built}, request)
+    rows.append(("render cards template", timed(lambda: grid.render({"listings": built}, request)), "ms/1000 cards"))
+
+    def page(threshold):
+        """Return (ms until the first body chunk, ms for the whole body)."""
+        with override_settings(LISTING_STREAM_THRESHOLD=threshold):
+            start = time.perf_counter()
+            response = cards.render_grid(request, "auctions/index.html", "auctions/cards/index.html", {"listings": built})
+            chunks = iter(response.streaming_content if response.streaming else [response.content])
+            next(chunks)
+            first = time.perf_counter() - start
+            list(chunks)
+            return first * 1000, (time.perf_counter() - start) * 1000
+
+    rendered = page(len(built))
+    streamed = page(0)
+    rows += [
+        ("full page, rendered", rendered[1], "ms/1000 cards"),
+        ("full page, streamed", streamed[1], "ms/1000 cards"),
+        ("rendered, until first byte", rendered[0], "ms"),
+        ("streamed, until first byte", streamed[0], "ms"),
+    ]
+    return rows
+
+
+def first_load(html, accept_encoding):
+    """(requests, bytes transferred) for `html` and every static asset it references, on an empty cache."""
+    requests, transferred = 1, len(html.encode())
+    for path in sorted(set(re.findall(r'%s([^"#\']+)' % re.escape(settings.STATIC_URL), html))):
+        request = RequestFactory().get(settings.STATIC_URL + path, HTTP_ACCEPT_ENCODING=accept_encoding)
+        response = views.static_file(request, path)
+        requests += 1
+        transferred += len(b"".join(response.streaming_content))
+    return requests, transferred
+
+
+@benchmark("static")
+def bench_static():
+    # Served from a throwaway collectstatic, as in production (SERVE_STATIC or a web server)
+    root = tempfile.mkdtemp()
+    try:
+        storage = "auctions.storage.CompressedManifestStaticFilesStorage"
+        with override_settings(STATIC_ROOT=os.path.join(root, "static"), SPRITE_ROOT=os.path.join(root, "build"),
+                               STATICFILES_STORAGE=storage, DEBUG=False):
+            call_command("collectstatic", interactive=False, verbosity=0)
+            request = RequestFactory().get("/login/")
+            request.user = AnonymousUser()
+            SessionMiddleware().process_request(request)
+            html = views.login_view(request).content.decode()
+
+            # Before sprites: every page inlined its icons, and assets were served uncompressed
+            with open(sprite_path()) as f:
+                symbols = dict(re.findall(r'<symbol id="([^"]+)"[^>]*>(.*?)</symbol>', f.read(), re.S))
+            sprite_url = re.escape(settings.STATIC_URL) + r"[^\"]*" + re.escape(SPRITE_NAME.rsplit(".", 1)[0])
+            inlined = re.sub(r'<use href="%s[^"#]*#([^"]+)"/>' % sprite_url, lambda use: symbols[use.group(1)], html)
+            before = first_load(inlined, "")
+            after = first_load(html, "gzip, deflate, br")
+    finally:
+        shutil.rmtree(root)
+    return [
+        ("inline icons, raw assets: first load", before[0], "requests"),
+        ("  first load", before[1] / 1024, "KB"),
+        ("  every further page (HTML only)", len(inlined.encode()) / 1024, "KB"),
+        ("sprite, precompressed assets: first load", after[0], "requests"),
+        ("  first load", after[1] / 1024, "KB"),
+        ("  every further page (HTML only)", len(html.encode()) / 1024, "KB"),
+    ]
+
+
+def locked_validate(state):
+    with state.lock:
+        return state.validate(0, 10 ** 9)
+
+
+@benchmark("livestate")
+def bench_livestate():
+    create_bid_history(users=100, listings=1000, bids=20000)
+    Listing.objects.update(is_active=True)
+    listing_ids = list(Listing.objects.values_list("id", flat=True))
+    listing = Listing.objects.get(pk=listing_ids[0])
+    state = load_state(listing.pk)
+
+    # Memory of the state objects themselves, as the store would hold them
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    states = [AuctionState(i, 1, state.starting_bid, 100, 1, 5, None, 0, True) for i in range(10000)]
+    grown = sum(stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(before, "filename"))
+    tracemalloc.stop()
+    del states
+
+    rows = [
+        ("memory per tracked auction", grown / 10000, "bytes"),
+        ("validate via current_price() (DB)", measure(lambda: current_price(listing), 1000), "us/bid"),
+        ("validate in memory, under the auction lock", measure(lambda: locked_validate(state), 100000), "us/bid"),
+    ]
+
+    # Threads validating bids on different auctions only contend on the store's dict lock
+    store = LiveAuctionStore()
+    for listing_id in listing_ids:
+        store.get(listing_id)
+
+    def worker(ids, number):
+        for i in range(number):
+            locked_validate(store.get(ids[i % len(ids)]))
+
+    for count in (1, 4):
+        number = 100000 // count
+        threads = [threading.Thread(target=worker, args=(listing_ids[i::count], number)) for i in range(count)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        rows.append((f"store lookup + validate, {count} thread(s)", 100000 / elapsed / 1000, "k bids/s"))
+
+    bidder = User.objects.exclude(pk=listing.owner_id).first()
+    amounts = iter(range(20000, 10 ** 9))
+    rows.append(("place_bid (validate + versioned write)",
+                 measure(lambda: store.place_bid(listing.pk, bidder, next(amounts)), 500), "us/bid"))
+    return rows
+
+
+def resolve_by_increments(price, proxies):
+    """Reference: proxies outbid each other one bid step at a time. Returns the number of bids."""
+    leader, bids = None, 0
+    while True:
+        step_price = price + proxy.bid_step(price)
+        challenger = next((p for p in proxies if p.user_id != leader and p.max_amount >= step_price), None)
+        if challenger is None:
+            return bids
+        leader, price, bids = challenger.user_id, step_price, bids + 1
+
+
+@benchmark("proxy")
+def bench_proxy():
+    rng = random.Random(1)
+    rows = []
+    for count in (100, 10000):
+        proxies = [proxy.Contender(rng.randint(100, 20000), i, i) for i in range(count)]
+        rows.append((f"resolve {count} proxies in one pass", timed(lambda: proxy.resolve(10, True, None, proxies)), "ms"))
+    proxies = [proxy.Contender(rng.randint(100, 20000), i, i) for i in range(100)]
+    increments = []
+    rows.append(("100 proxies by single increments",
+                 timed(lambda: increments.append(resolve_by_increments(10, proxies))), "ms"))
+    rows.append(("bids recorded by single increments", increments[0], "bids"))
+
+    create_bid_history(users=1000, listings=1, bids=0)
+    listing = Listing.objects.get()
+    user_ids = list(User.objects.exclude(pk=listing.owner_id).values_list("id", flat=True))
+    ProxyBid.objects.bulk_create([
+        ProxyBid(user_id=user_id, listing=listing, max_amount=rng.randint(100, 20000)) for user_id in user_ids
+    ])
+    with CaptureQueriesContext(connection) as queries:
+        elapsed = timed(lambda: proxy.settle(listing.pk))
+    rows += [
+        (f"settle {len(user_ids)} stored proxies", elapsed, "ms"),
+        ("settle queries", len(queries), "queries"),
+        ("settle bids recorded", Bid.objects.count(), "bids"),
+    ]
+    return rows
+
+
+@benchmark("shards")
+def bench_shards():
+    # Compare layouts with COMMERCE_SHARDS=N. Bulk-created bids all land on "default",
+    # so spreading them is the rebalance being timed.
+    create_bid_history(users=200, listings=2000, bids=100000)
+    Listing.objects.update(is_active=True)
+    listing = Listing.objects.select_related("owner", "winner").first()
+
+    moved = StringIO()
+    rows = [
+        ("shards", len(settings.AUCTION_SHARDS), "aliases"),
+        ("rebalance 100k bids", timed(lambda: call_command("rebalance_shards", stdout=moved)), "ms"),
+        ("listing_cards(), 2000 listings", timed(lambda: cards.listing_cards(Listing.objects.all())), "ms"),
+        ("get_listing_context()", measure(lambda: get_listing_context(listing), 200), "us"),
+        ("load_state()", measure(lambda: load_state(listing.pk), 200), "us"),
+        ("close 2000 listings", timed(lambda: close_listings(Listing.objects.all())), "ms"),
+    ]
+    return rows
+
+
+def noop():
+    pass
+
+
+@benchmark("metrics")
+def bench_metrics():
+    counter = metrics.Counter("bench_total", "", ("outcome",))
+    histogram = metrics.Histogram("bench_seconds", "", ("view",))
+    timed_noop = metrics.timed(histogram, "noop")(noop)
+    timing = measure(timed_noop, 100000) - measure(noop, 100000)
+    rows = [
+        ("Counter.inc()", measure(lambda: counter.inc("accepted"), 100000), "us"),
+        ("Histogram.observe()", measure(lambda: histogram.observe(0.003, "noop"), 100000), "us"),
+        ("timed() overhead per call", timing, "us"),
+    ]
+
+    # Per-thread cells: threads never wait on each other to record
+    for count in (1, 4):
+        threads = [threading.Thread(target=lambda: [counter.inc("accepted") for _ in range(100000 // count)])
+                   for _ in range(count)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        rows.append((f"Counter.inc(), {count} thread(s)", 100000 / (time.perf_counter() - start) / 1e6, "M/s"))
+
+    # A listing page is timed twice: the view and get_listing_context()
+    create_bid_history(users=100, listings=100, bids=5000)
+    listing = Listing.objects.first()
+    request = RequestFactory().get(f"/listing/{listing.pk}/")
+    request.user = AnonymousUser()
+    page = measure(lambda: views.listing_detail(request, listing.pk), 200)
+    rows += [
+        ("listing_detail view", page / 1000, "ms"),
+        ("instrumentation share of listing_detail", 2 * timing / page * 100, "%"),
+        ("scrape /metrics", measure(metrics.REGISTRY.render, 1000), "us"),
+    ]
+    return rows
+
+
+def create_watches(watches, seed=1):
+    """Bulk-create watches, each user mostly watching within one favourite category."""
+    rng = random.Random(seed)
+    by_category = {}
+    for listing_id, category in Listing.objects.filter(is_active=True).values_list("id", "category"):
+        by_category.setdefault(category, []).append(listing_id)
+    categories = list(by_category)
+    user_ids = list(User.objects.values_list("id", flat=True))
+    favourites = {user_id: rng.choice(categories) for user_id in user_ids}
+    pairs = set(Watchlist.objects.values_list("user_id", "listing_id"))
+    rows = []
+    while len(rows) < watches:
+        user_id = rng.choice(user_ids)
+        category = favourites[user_id] if rng.random() < 0.8 else rng.choice(categories)
+        pair = (user_id, rng.choice(by_category[category]))
+        if pair not in pairs:
+            pairs.add(pair)
+            rows.append(Watchlist(user_id=pair[0], listing_id=pair[1]))
+    Watchlist.objects.bulk_create(rows)
+
+
+@benchmark("recommendations")
+def bench_recommendations():
+    create_bid_history(users=2000, listings=10000, bids=100000)
+    create_watches(40000)
+    listing = Listing.objects.filter(is_active=True, category="Toys", watchlist_entries__isnull=False).first()
+    rows = [("full refresh, 5k active listings", timed(lambda: recommendations.refresh(full=True)), "ms")]
+
+    # What a refresh sees every minute or so
+    create_watches(200, seed=2)
+    for listing_id in Listing.objects.filter(is_active=True).values_list("id", flat=True)[:200]:
+        Bid.objects.create(amount=20000, bidder_id=listing.owner_id, listing_id=listing_id)
+    rows.append(("incremental refresh, 200 watches + 200 bids", timed(recommendations.refresh), "ms"))
+
+    # The joins the tables replace: ranking by live counts, co-watch over the whole watchlist
+    def popular_join():
+        list(Listing.objects.filter(is_active=True, category="Toys").annotate(
+            score=recommendations.BID_WEIGHT * Count("bids", distinct=True)
+            + recommendations.WATCH_WEIGHT * Count("watchlist_entries", distinct=True),
+        ).order_by("-score").values_list("id", flat=True)[:settings.RECOMMENDATIONS_K])
+
+    def similar_join():
+        watchers = Watchlist.objects.filter(listing=listing).values("user_id")
+        list(Watchlist.objects.filter(user_id__in=watchers, listing__is_active=True).exclude(listing=listing)
+             .values("listing_id").annotate(shared=Count("user_id", distinct=True))
+             .order_by("-shared").values_list("listing_id", flat=True)[:settings.RECOMMENDATIONS_K])
+
+    connection.queries_log.clear()
+    with CaptureQueriesContext(connection) as queries:
+        recommendations.popular("Toys")
+    rows += [
+        ("popular in category, joins", measure(popular_join, 20) / 1000, "ms"),
+        ("popular in category, top-K read + cards", measure(lambda: recommendations.popular("Toys"), 200) / 1000, "ms"),
+        ("  queries", len(queries), "queries"),
+        ("similar listings, co-watch join", measure(similar_join, 20) / 1000, "ms"),
+        ("similar listings, top-K read + cards", measure(lambda: recommendations.similar(listing.pk), 200) / 1000, "ms"),
+    ]
+    return rows
+
+
+@benchmark("events")
+def bench_events():
+    create_bid_history(users=500, listings=10000, bids=200000)
+    create_watches(20000)
+    activity.rebuild()
+    rows = []
+
+    elapsed = timed(events.backfill)
+    logged = AuctionEvent.objects.count()
+    payload = AuctionEvent.objects.aggregate(bytes=Sum(Length("payload")))["bytes"]
+    rows += [
+        ("backfill", elapsed, "ms"),
+        ("  events", logged, "events"),
+        ("  payload per event", payload / logged, "bytes"),
+    ]
+
+    state = None
+
+    def replay():
+        nonlocal state
+        state = events.replay()
+
+    elapsed = timed(replay)
+    rows += [
+        ("replay whole log", elapsed, "ms"),
+        ("  throughput", logged / elapsed / 1000, "M events/s"),
+        ("check against live tables", timed(lambda: events.check(state)), "ms"),
+    ]
+
+    # One INSERT per transaction on commit, against one per event
+    listing_ids = list(Listing.objects.values_list("id", flat=True)[:1000])
+
+    def buffered():
+        with events.atomic():
+            for listing_id in listing_ids:
+                events.record(events.WATCHED, listing_id, 1)
+
+    def one_by_one():
+        with transaction.atomic():
+            for listing_id in listing_ids:
+                AuctionEvent.objects.create(kind=events.WATCHED, listing_id=listing_id, user_id=1)
+
+    rows += [
+        ("1000 events, written on commit", timed(buffered), "ms"),
+        ("1000 events, one INSERT each", timed(one_by_one), "ms"),
+    ]
+
+    Listing.objects.filter(pk__in=listing_ids).update(is_active=True)
+    with CaptureQueriesContext(connection) as queries:
+        elapsed = timed(lambda: close_listings(Listing.objects.filter(pk__in=listing_ids)))
+    rows += [
+        ("close 1000 listings, logged", elapsed, "ms"),
+        ("  queries", len(queries), "queries"),
+    ]
+    return rows
@@ -0,0 +1,119 @@
+"""
+Flat card data for the listing grids.
+
+Views turn listings into plain dicts before rendering, so templates never touch
+the ORM: prices come from one aggregate query, URLs are formatted from a single
+reverse() per page and status text is decided here instead of in the template.
+Dict lookups are also the first thing the template engine tries, which makes
+dicts cheaper to render than model instances.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.middleware.csrf import get_token
+from django.shortcuts import render
+from django.template.loader import get_template, render_to_string
+from django.urls import reverse
+
+from .sharding import with_top_bids
+
+CARD_FIELDS = ("id", "title", "description", "image_url", "thumbnail", "starting_bid")
+
+# Cards rendered per streamed chunk
+STREAM_CHUNK_SIZE = 200
+
+# Placeholder the page template renders where streamed cards go
+STREAM_MARKER = "<!-- cards -->"
+
+# Any id works, it only has to be findable in the reversed URL
+_URL_PLACEHOLDER = 2147483647
+
+
+class CardUrls:
+    """Per-page URL builders, so each card costs a string concatenation instead of a reverse()."""
+
+    def __init__(self):
+        self.detail = self._formatter("listing_detail")
+        self.remove = self._formatter("remove_listing_from_mode")
+        self.thumbnails = reverse("thumbnail", args=["0" * 32 + ".jpg"])[:-36]
+
+    @staticmethod
+    def _formatter(name):
+        prefix, suffix = reverse(name, args=[_URL_PLACEHOLDER]).split(str(_URL_PLACEHOLDER))
+        return lambda listing_id: f"{prefix}{listing_id}{suffix}"
+
+    def thumbnail(self, name, extension):
+        return f"{self.thumbnails}{name}.{extension}" if name else ""
+
+
+def card(urls, listing, price, has_bids, status_message=""):
+    """Build the card for `listing`, a values() row or a dict of the same shape."""
+    return {
+        "id": listing["id"],
+        "url": urls.detail(listing["id"]),
+        "remove_url": urls.remove(listing["id"]),
+        "title": listing["title"],
+        "description": listing["description"],
+        "image_url": listing["image_url"],
+        "thumbnail_webp": urls.thumbnail(listing["thumbnail"], "webp"),
+        "thumbnail_jpg": urls.thumbnail(listing["thumbnail"], "jpg"),
+        "starting_bid": listing["starting_bid"],
+        "current_price": price,
+        "has_bids": has_bids,
+        "status_message": status_message,
+    }
+
+
+def listing_cards(listings):
+    """Cards for a Listing queryset, priced by their highest bid, in one query (one more per shard if sharded)."""
+    urls = CardUrls()
+    cards = []
+    for listing in with_top_bids(listings, *CARD_FIELDS):
+        has_bids = listing["top_bid"] is not None
+        price = Decimal(listing["top_bid"]) if has_bids else listing["starting_bid"]
+        cards.append(card(urls, listing, price, has_bids))
+    return cards
+
+
+def activity_status_message(mode, status, price):
+    if mode == "my_listings":
+        return "Active" if status == "active" else "Closed"
+    if status == "active":
+        return f"Current price: ${price}"
+    return "YOU WON!" if status == "won" else "YOU DID NOT WIN"
+
+
+def activity_cards(rows, mode):
+    """Cards for UserActivity rows fetched with select_related("listing")."""
+    urls = CardUrls()
+    return [
+        card(urls, {field: getattr(row.listing, field) for field in CARD_FIELDS}, row.price,
+             row.has_bids, activity_status_message(mode, row.status, row.price))
+        for row in rows
+    ]
+
+
+def render_grid(request, template_name, cards_template_name, context):
+    """
+    Render a card grid page. Grids above LISTING_STREAM_THRESHOLD cards are sent as a
+    StreamingHttpResponse: the page is rendered around STREAM_MARKER and the cards
+    follow in chunks, so neither the worker nor the client waits for the whole page.
+    """
+    cards = context["listings"]
+    if len(cards) <= settings.LISTING_STREAM_THRESHOLD:
+        return render(request, template_name, context)
+
+    page = render_to_string(template_name, {**context, "listings": [], "stream": True}, request)
+    head, tail = page.split(STREAM_MARKER, 1)
+    cards_template = get_template(cards_template_name)
+    # The CSRF cookie is set by middleware, which runs before the streamed cards are rendered
+    get_token(request)
+
+    def chunks():
+        yield head
+        for start in range(0, len(cards), STREAM_CHUNK_SIZE):
+            yield cards_template.render({**context, "listings": cards[start:start + STREAM_CHUNK_SIZE]}, request)
+        yield tail
+
+    return StreamingHttpResponse(chunks())
@@ -0,0 +1,82 @@
+"""
+Static files finder for the generated icon sprite.
+
+auctions/icons/sprite.svg is built from the SVG icon sets into SPRITE_ROOT, outside
+the source tree, by collectstatic and `manage.py build_static` (only when it is
+missing or older than one of its icons). The finder then serves it like any other
+static file; it never builds it, so a request doesn't write files. In development,
+run build_static once, and again after changing an icon.
+"""
+import glob
+import os
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles.finders import BaseFinder
+from django.core.files.storage import FileSystemStorage
+
+ICONS_DIR = os.path.join(os.path.dirname(__file__), "static", "auctions", "icons")
+
+# Icon sets bundled into the sprite, as (directory, symbol id prefix)
+ICON_SETS = [("bck-svg", "bck"), ("ppl-svg", "ppl")]
+
+SPRITE_NAME = "auctions/icons/sprite.svg"
+
+
+def symbol_id(prefix, filename):
+    # "apps_33dp_800080_FILL0_wght400_GRAD0_opsz40.svg" -> "ppl-apps"
+    name = re.split(r"_\d+dp", os.path.basename(filename))[0]
+    return f"{prefix}-{name.replace('_', '-')}"
+
+
+def icon_paths():
+    for directory, prefix in ICON_SETS:
+        for path in sorted(glob.glob(os.path.join(ICONS_DIR, directory, "*.svg"))):
+            yield prefix, path
+
+
+def sprite_path():
+    return os.path.join(settings.SPRITE_ROOT, *SPRITE_NAME.split("/"))
+
+
+def build_sprite(force=False):
+    """
+    Combine the SVG icon sets into a single <symbol> sprite under SPRITE_ROOT.
+    Returns the number of icons, or None if the existing sprite was still up to date.
+    """
+    path = sprite_path()
+    icons = list(icon_paths())
+    if not force and os.path.exists(path):
+        if all(os.path.getmtime(icon) <= os.path.getmtime(path) for _, icon in icons):
+            return None
+
+    symbols = []
+    for prefix, icon in icons:
+        with open(icon) as f:
+            svg = f.read()
+        view_box = re.search(r'viewBox="([^"]+)"', svg).group(1)
+        body = re.search(r"<svg[^>]*>(.*)</svg>", svg, re.S).group(1)
+        # Drop hard-coded colours so the page CSS controls the fill
+        body = re.sub(r'\sfill="(?!none)[^"]*"', "", body)
+        symbols.append(f'<symbol id="{symbol_id(prefix, icon)}" viewBox="{view_box}">{body.strip()}</symbol>')
+
+    sprite = '<svg xmlns="http://www.w3.org/2000/svg">' + "".join(symbols) + "</svg>\n"
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write to a temp file first so a request never reads half a sprite
+    with open(path + ".tmp", "w") as f:
+        f.write(sprite)
+    os.replace(path + ".tmp", path)
+    return len(symbols)
+
+
+class SpriteFinder(BaseFinder):
+
+    def find(self, path, all=False):
+        if path != SPRITE_NAME or not os.path.exists(sprite_path()):
+            # Not None: finders.find() would return [None] instead of moving on
+            return []
+        return [sprite_path()] if all else sprite_path()
+
+    def list(self, ignore_patterns):
+        if os.path.exists(sprite_path()):
+            yield SPRITE_NAME, FileSystemStorage(location=settings.SPRITE_ROOT)
@@ -0,0 +1,202 @@
+"""
+Thumbnail pipeline for Listing.image_url.
+
+The source image is downloaded once, resized to THUMBNAIL_SIZE and written to
+MEDIA_ROOT/thumbs as WebP and JPEG under a content-hashed name, so the files
+never change and can be cached forever. Pillow is optional: without it listings
+simply keep serving the original URL.
+
+image_url is user input, so fetching it must not reach the server's own network:
+only http(s) is allowed, every host (including redirect targets) is resolved and
+refused unless all of its addresses are public, and the connection is made to the
+address that was checked rather than resolving the name a second time.
+"""
+import hashlib
+import http.client
+import importlib.util
+import io
+import ipaddress
+import logging
+import os
+import socket
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from .models import Listing
+
+# Pillow is imported on first use; importing it at boot would cost more than the rest of the app
+HAS_PILLOW = importlib.util.find_spec("PIL") is not None
+
+THUMBNAIL_FORMATS = {"webp": "WEBP", "jpg": "JPEG"}
+
+ALLOWED_SCHEMES = ("http", "https")
+
+logger = logging.getLogger(__name__)
+
+# Small pool so slow third-party hosts never block request workers
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="thumbnails")
+
+
+def thumbnail_dir():
+    return os.path.join(settings.MEDIA_ROOT, "thumbs")
+
+
+class UnsafeImageURL(ValueError):
+    """The image URL points somewhere the server must not fetch from."""
+
+
+def is_public_address(address):
+    address = ipaddress.ip_address(address)
+    if address.version == 6 and address.ipv4_mapped:
+        address = address.ipv4_mapped
+    return address.is_global
+
+
+def check_scheme(url):
+    scheme = urllib.parse.urlsplit(url).scheme.lower()
+    if scheme not in ALLOWED_SCHEMES:
+        raise UnsafeImageURL(f"Refusing to fetch {url}: only http and https are allowed.")
+
+
+def connect_public(address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None):
+    """socket.create_connection() that refuses hosts resolving to private, loopback or reserved addresses."""
+    host, port = address
+    addresses = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    for *_, sockaddr in addresses:
+        if not is_public_address(sockaddr[0]):
+            raise UnsafeImageURL(f"Refusing to fetch from {host}: it resolves to {sockaddr[0]}.")
+    error = OSError(f"{host} did not resolve to any address.")
+    for *_, sockaddr in addresses:
+        try:
+            return socket.create_connection(sockaddr[:2], timeout, source_address)
+        except OSError as exc:
+            error = exc
+    raise error
+
+
+class PublicHTTPConnection(http.client.HTTPConnection):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = connect_public
+
+
+class PublicHTTPSConnection(http.client.HTTPSConnection):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = connect_public
+
+
+class PublicHTTPHandler(urllib.request.HTTPHandler):
+
+    def http_open(self, req):
+        return self.do_open(PublicHTTPConnection, req)
+
+
+class PublicHTTPSHandler(urllib.request.HTTPSHandler):
+
+    def https_open(self, req):
+        return self.do_open(PublicHTTPSConnection, req, context=self._context)
+
+
+class CheckedRedirectHandler(urllib.request.HTTPRedirectHandler):
+    # Redirect targets connect through the handlers above, so their addresses are checked too
+    max_redirections = 5
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        check_scheme(newurl)
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+# No ProxyHandler: going through a proxy would make the address check meaningless
+_opener = urllib.request.build_opener(
+    urllib.request.ProxyHandler({}), PublicHTTPHandler, PublicHTTPSHandler, CheckedRedirectHandler,
+)
+
+
+def fetch_image(url):
+    """Download a public http(s) `url` and return its bytes, refusing oversized files."""
+    check_scheme(url)
+    with _opener.open(url, timeout=settings.THUMBNAIL_FETCH_TIMEOUT) as response:
+        data = response.read(settings.THUMBNAIL_MAX_BYTES + 1)
+    if len(data) > settings.THUMBNAIL_MAX_BYTES:
+        raise ValueError(f"Image at {url} is larger than {settings.THUMBNAIL_MAX_BYTES} bytes.")
+    return data
+
+
+def make_thumbnails(data):
+    """
+    Write WebP and JPEG thumbnails for the image in `data`.
+    Returns the content hash used as the file name, or None if Pillow is unavailable.
+    """
+    if not HAS_PILLOW:
+        return None
+    from PIL import Image
+
+    name = hashlib.sha256(data).hexdigest()[:32]
+    os.makedirs(thumbnail_dir(), exist_ok=True)
+
+    image = None
+    for extension, image_format in THUMBNAIL_FORMATS.items():
+        path = os.path.join(thumbnail_dir(), f"{name}.{extension}")
+        # Same content means same thumbnail, so existing files are reused
+        if os.path.exists(path):
+            continue
+        if image is None:
+            image = Image.open(io.BytesIO(data))
+            image = image.convert("RGB")
+            image.thumbnail(settings.THUMBNAIL_SIZE)
+        # Write to a temp file first so readers never see half a thumbnail
+        image.save(path + ".tmp", image_format, quality=80)
+        os.replace(path + ".tmp", path)
+
+    return name
+
+
+def generate_thumbnail(listing):
+    """Fetch the listing image, build its thumbnails and store the hash on the listing."""
+    if not listing.image_url:
+        return None
+
+    name = make_thumbnails(fetch_image(listing.image_url))
+    if name:
+        # update() keeps this from overwriting fields changed while we were downloading
+        Listing.objects.filter(pk=listing.pk, image_url=listing.image_url).update(thumbnail=name)
+        listing.thumbnail = name
+    return name
+
+
+def _generate_in_background(listing_id):
+    close_old_connections()
+    try:
+        listing = Listing.objects.filter(pk=listing_id).first()
+        if listing:
+            generate_thumbnail(listing)
+    except Exception:
+        # A broken image URL must never take the worker down; the backfill command retries later
+        logger.exception("Could not build the thumbnail for listing %s.", listing_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_thumbnail(listing):
+    """Queue thumbnail generation once the current transaction commits."""
+    if not HAS_PILLOW or not listing.image_url:
+        return
+    transaction.on_commit(lambda: _executor.submit(_generate_in_background, listing.pk))
+
+
+def image_url_changed(listing):
+    """
+    Drop the thumbnail of a listing whose image_url was edited and build the new one.
+    The old thumbnail belongs to the old image, so the listing falls back to image_url meanwhile.
+    """
+    if listing.thumbnail:
+        Listing.objects.filter(pk=listing.pk).update(thumbnail="")
+        listing.thumbnail = ""
+    schedule_thumbnail(listing)
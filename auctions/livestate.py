@@ -0,0 +1,216 @@
+"""
+In-process state of live auctions, so place_bid can validate a bid without a database round trip.
+
+Each tracked auction is a slotted AuctionState (price, top bidder, bid count, highest
+proxy maximum and the listing version it was read at), loaded on demand and evicted
+least recently used.
+The store is only a cache: a bid is checked against it in memory, under the auction's
+own lock, and then written with a versioned UPDATE on Listing. If another worker took
+a bid or closed the auction in the meantime the UPDATE matches nothing, the state is
+reloaded and the bid is checked again.
+"""
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
+
+from . import activity, events, metrics, proxy, sharding
+from .models import Bid, Listing, ProxyBid
+
+# Why AuctionState.validate() refuses a bid, and what the bidder is told
+REJECTIONS = {
+    "owner": "Owners cannot place bids on their own listings.",
+    "closed": "This auction is closed.",
+    "too_low": "Your bid must be greater than the current price (${price}).",
+    "below_start": "Your bid must be at least the starting price (${price}).",
+    "outbid": "Another bidder's earlier maximum of ${price} takes precedence over your bid.",
+}
+
+
+class AuctionState:
+    __slots__ = (
+        "listing_id", "owner_id", "starting_bid", "price", "top_bidder_id",
+        "bid_count", "proxy_max", "version", "is_active", "loaded_at", "lock",
+    )
+
+    def __init__(self, listing_id, owner_id, starting_bid, top_amount, top_bidder_id, bid_count, proxy_max,
+                 version, is_active):
+        self.listing_id = listing_id
+        self.owner_id = owner_id
+        self.starting_bid = starting_bid
+        self.price = Decimal(top_amount) if bid_count else starting_bid
+        self.top_bidder_id = top_bidder_id
+        self.bid_count = bid_count
+        self.proxy_max = proxy_max
+        self.version = version
+        self.is_active = is_active
+        self.loaded_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def validate(self, bidder_id, amount):
+        """Return why `amount` can't be bid by `bidder_id`, a REJECTIONS key, or "" if it can."""
+        if bidder_id == self.owner_id:
+            return "owner"
+        if not self.is_active:
+            return "closed"
+        if self.bid_count and amount <= self.price:
+            return "too_low"
+        if not self.bid_count and amount < self.price:
+            return "below_start"
+        return ""
+
+    def apply(self, bidder_id, amount):
+        self.price = Decimal(amount)
+        self.top_bidder_id = bidder_id
+        self.bid_count += 1
+        self.version += 1
+
+
+def load_state(listing_id):
+    """Read one auction's state, or None if the listing doesn't exist."""
+    row = Listing.objects.filter(pk=listing_id).annotate(
+        proxy_max=Subquery(
+            ProxyBid.objects.filter(listing=OuterRef("pk")).order_by("-max_amount").values("max_amount")[:1]
+        ),
+    ).values_list("owner_id", "starting_bid", "proxy_max", "version", "is_active").first()
+    if row is None:
+        return None
+    owner_id, starting_bid, proxy_max, version, is_active = row
+
+    # Bids may be on a shard, so they are read after the listing: a bid stored in between
+    # has bumped the version, which makes the state stale rather than wrong
+    bids = sharding.for_listing(Bid, listing_id)
+    top_bid = bids.order_by("-amount", "id").values_list("amount", "bidder_id").first()
+    top_amount, top_bidder_id = top_bid or (None, None)
+    bid_count = bids.count() if top_bidder_id is not None else 0
+    return AuctionState(
+        listing_id, owner_id, starting_bid, top_amount, top_bidder_id, bid_count, proxy_max, version, is_active,
+    )
+
+
+class LiveAuctionStore:
+    """Thread-safe LRU of AuctionState; one store per process."""
+
+    def __init__(self):
+        self._states = OrderedDict()
+        # Guards the dict only; bids on one auction are serialized by that auction's lock
+        self._lock = threading.Lock()
+
+    def get(self, listing_id):
+        """Return the auction's state, loading it if needed, or None if the listing doesn't exist."""
+        with self._lock:
+            state = self._states.get(listing_id)
+            if state is not None and time.monotonic() - state.loaded_at < settings.LIVE_AUCTIONS_TTL:
+                self._states.move_to_end(listing_id)
+                metrics.LIVE_STATE_LOOKUPS.inc("hit")
+                return state
+
+        metrics.LIVE_STATE_LOOKUPS.inc("miss" if state is None else "expired")
+        # Loaded outside the lock, so one slow query doesn't hold up every other auction
+        stale, state = state, load_state(listing_id)
+        if state is None:
+            return None
+        with self._lock:
+            current = self._states.get(listing_id)
+            if current is not None and current is not stale:
+                # Another thread loaded the auction meanwhile; bids must share its state and lock
+                self._states.move_to_end(listing_id)
+                return current
+            self._states[listing_id] = state
+            self._states.move_to_end(listing_id)
+            while len(self._states) > settings.LIVE_AUCTIONS_MAX:
+                self._states.popitem(last=False)
+        return state
+
+    def forget(self, listing_id):
+        with self._lock:
+            self._states.pop(listing_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._states.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._states)
+
+    def place_bid(self, listing_id, user, amount):
+        """
+        Validate `amount` in memory and, if it is accepted, write the bid.
+        Returns an error message, or "" once the bid is stored. Raises Listing.DoesNotExist.
+        """
+        # A stale state is reloaded once; a second conflict means the auction is too busy to retry here
+        for _ in range(2):
+            state = self.get(listing_id)
+            if state is None:
+                raise Listing.DoesNotExist
+            with state.lock:
+                reason = state.validate(user.pk, amount)
+                if reason:
+                    metrics.BIDS.inc(reason)
+                    return REJECTIONS[reason].format(price=state.price)
+                countered = []
+                alias = sharding.listing_db(listing_id)
+                # A bid shard commits just before "default" (see auctions/sharding.py)
+                with events.atomic(), transaction.atomic(using=alias, savepoint=False):
+                    written = Listing.objects.filter(
+                        pk=listing_id, version=state.version, is_active=True,
+                    ).update(version=F("version") + 1)
+                    tied_id = None
+                    if written:
+                        # A proxy maximum equal to the bid came first, so its owner takes the amount instead
+                        if state.proxy_max == amount:
+                            tied_id = proxy.tied_proxy(listing_id, user.pk, amount)
+                        bidder_id = tied_id or user.pk
+                        Bid.objects.using(alias).create(amount=amount, bidder_id=bidder_id, listing_id=listing_id)
+                        activity.bid_placed(bidder_id, listing_id, amount)
+                        events.record(events.BID, listing_id, bidder_id, amount)
+                        # Only a proxy reaching the new bid can answer it
+                        if state.proxy_max is not None and state.proxy_max >= amount:
+                            countered = proxy.settle(listing_id)
+                if written:
+                    if tied_id:
+                        self.forget(listing_id)
+                        metrics.BIDS.inc("outbid")
+                        return REJECTIONS["outbid"].format(price=amount)
+                    if countered:
+                        # Proxies answered with bids of their own; reload rather than replay them
+                        self.forget(listing_id)
+                    else:
+                        state.apply(user.pk, amount)
+                    metrics.BIDS.inc("accepted")
+                    return ""
+            self.forget(listing_id)
+        metrics.BIDS.inc("conflict")
+        return "The auction changed while your bid was being placed. Please try again."
+
+    def place_proxy(self, listing_id, user, max_amount):
+        """
+        Store `user`'s maximum bid and resolve the auction's proxies in one transaction.
+        Returns an error message, or "" once the proxy is stored. Raises Listing.DoesNotExist.
+        """
+        with events.atomic(), transaction.atomic(using=sharding.listing_db(listing_id), savepoint=False):
+            # Bumping the version locks the listing row and makes every worker reload the auction
+            locked = Listing.objects.filter(pk=listing_id, is_active=True).update(version=F("version") + 1)
+            if locked:
+                error = proxy.place_proxy(listing_id, user, max_amount)
+            elif Listing.objects.filter(pk=listing_id).exists():
+                error = "This auction is closed."
+            else:
+                raise Listing.DoesNotExist
+        self.forget(listing_id)
+        return error
+
+
+live_auctions = LiveAuctionStore()
+
+
+def bids_changed(listing_ids):
+    """Call after writing bids outside place_bid, so every worker reloads these auctions."""
+    Listing.objects.filter(pk__in=listing_ids).update(version=F("version") + 1)
+    for listing_id in listing_ids:
+        live_auctions.forget(listing_id)
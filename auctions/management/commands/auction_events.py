@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from auctions import events
+from auctions.models import AuctionEvent
+
+
+class Command(BaseCommand):
+    help = (
+        "Work with the auction event log: show one listing's history, check a replay of the log "
+        "against the live tables, or backfill listings older than the log."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("action", choices=["show", "check", "backfill"])
+        parser.add_argument("--listing", type=int, help="Listing id to show.")
+        parser.add_argument("--after", type=int, default=0, help="Only show events after this sequence number.")
+        parser.add_argument("--limit", type=int, default=50, help="Mismatches printed by check.")
+
+    def handle(self, *args, **options):
+        if options["action"] == "show":
+            self.show_history(options["listing"], options["after"])
+        elif options["action"] == "check":
+            self.check_log(options["limit"])
+        else:
+            written = events.backfill()
+            self.stdout.write(self.style.SUCCESS(f"Logged {written} event(s)."))
+
+    def show_history(self, listing_id, after):
+        if listing_id is None:
+            raise CommandError("Give the --listing to show.")
+        history = AuctionEvent.objects.filter(listing_id=listing_id, seq__gt=after).order_by("seq")
+        for event in history.iterator():
+            self.stdout.write(
+                f"#{event.seq} {event.created_at:%Y-%m-%d %H:%M:%S} {event.get_kind_display():<9} "
+                f"user {event.user_id} {event.payload}"
+            )
+        # --after only trims what is printed: the summary needs the LISTED event and every bid
+        listing = events.replay(0, listing_id).listings.get(listing_id)
+        if listing:
+            status = "active" if listing.is_active else f"closed, won by {listing.winner_id}"
+            if listing.edited:
+                status += ", edited in the admin"
+            self.stdout.write(f"Replayed: ${listing.price} after {listing.bids} bid(s), {status}.")
+
+    def check_log(self, limit):
+        state = events.replay()
+        problems = events.check(state)
+        for problem in problems[:limit]:
+            self.stdout.write(problem)
+        summary = f"Replayed {state.events} event(s) up to #{state.last_seq} over {len(state.listings)} listing(s)"
+        if state.skipped:
+            summary += f"; skipped {state.skipped} about listings older than the log (see backfill)"
+        edited = sum(listing.edited for listing in state.listings.values())
+        if edited:
+            summary += f"; left out {edited} listing(s) edited in the admin"
+        if problems:
+            raise CommandError(f"{summary}. {len(problems)} mismatch(es).")
+        self.stdout.write(self.style.SUCCESS(f"{summary}. The log matches the live tables."))
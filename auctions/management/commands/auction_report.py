@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from auctions import analytics
+
+
+class Command(BaseCommand):
+    help = "Write bids-per-minute, category (uplift, sell-through) and top-bidder reports as CSV files."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", default="reports", help="Directory the CSV files are written to.")
+        parser.add_argument("--top", type=int, default=20, help="Number of top bidders to report.")
+        parser.add_argument("--chunk-size", type=int, default=analytics.CHUNK_SIZE,
+                            help="Rows read per query; bounds memory and how long SQLite is held.")
+
+    def handle(self, *args, **options):
+        if analytics.np is None:
+            raise CommandError("NumPy is required for auction reports (pip install numpy).")
+
+        paths = analytics.write_report(options["output"], top=options["top"], chunk_size=options["chunk_size"])
+        for path in paths:
+            self.stdout.write(self.style.SUCCESS(f"Wrote {path}"))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from auctions.benchmarks import BENCHMARKS
+
+
+class Command(BaseCommand):
+    help = "Run the auction micro-benchmarks against a throwaway test database."
+
+    def add_arguments(self, parser):
+        parser.add_argument("names", nargs="*", help="Benchmarks to run (default: all).")
+
+    def handle(self, *args, **options):
+        names = options["names"] or sorted(BENCHMARKS)
+        unknown = set(names) - set(BENCHMARKS)
+        if unknown:
+            raise CommandError(f"Unknown benchmarks: {', '.join(sorted(unknown))}. "
+                               f"Available: {', '.join(sorted(BENCHMARKS))}")
+
+        # Benchmarks create their own data, so never run them against the real databases (shards included)
+        old_names = {}
+        for alias in connections:
+            old_names[alias] = connections[alias].settings_dict["NAME"]
+            connections[alias].creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            for name in names:
+                self.stdout.write(self.style.MIGRATE_HEADING(name))
+                for label, value, unit in BENCHMARKS[name]():
+                    self.stdout.write(f"  {label:<44} {value:>12.2f} {unit}")
+        finally:
+            for alias, old_name in old_names.items():
+                connections[alias].creation.destroy_test_db(old_name, verbosity=0)
@@ -0,0 +1,38 @@
+import gzip
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from auctions.finders import SPRITE_NAME, build_sprite, sprite_path
+from auctions.storage import brotli
+
+# Assets every page requests on first load
+FIRST_LOAD_ASSETS = ["auctions/styles.css", "auctions/nav-tooltip.js", SPRITE_NAME]
+
+
+class Command(BaseCommand):
+    help = "Build the icon sprite, run collectstatic and report first-load asset sizes."
+
+    def handle(self, *args, **options):
+        icons = build_sprite(force=True)
+        self.stdout.write(f"Bundled {icons} icons into {sprite_path()}")
+
+        call_command("collectstatic", interactive=False, verbosity=0)
+
+        total = {"raw": 0, "gzip": 0, "brotli": 0}
+        self.stdout.write(f"{'asset':<32} {'raw':>8} {'gzip':>8} {'brotli':>8}")
+        for name in FIRST_LOAD_ASSETS:
+            with open(finders.find(name), "rb") as f:
+                data = f.read()
+            sizes = {
+                "raw": len(data),
+                "gzip": len(gzip.compress(data, compresslevel=9)),
+                "brotli": len(brotli.compress(data, quality=11)) if brotli else 0,
+            }
+            for key in total:
+                total[key] += sizes[key]
+            self.stdout.write(f"{name:<32} {sizes['raw']:>8} {sizes['gzip']:>8} {sizes['brotli'] or '-':>8}")
+        self.stdout.write(f"{'total':<32} {total['raw']:>8} {total['gzip']:>8} {total['brotli'] or '-':>8}")
+        self.stdout.write(self.style.SUCCESS(f"Collected static files into {settings.STATIC_ROOT}"))
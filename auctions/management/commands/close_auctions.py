@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from auctions.models import Listing
+from auctions.utils import close_listings
+
+
+class Command(BaseCommand):
+    help = "Close a set of active auctions in one pass and record their winners."
+
+    def add_arguments(self, parser):
+        parser.add_argument("ids", nargs="*", type=int, help="Listing ids to close.")
+        parser.add_argument("--category", help="Close every active listing in this category.")
+        parser.add_argument("--owner", help="Close every active listing of this username.")
+        parser.add_argument("--all", action="store_true", help="Close every active listing.")
+
+    def handle(self, *args, **options):
+        listings = Listing.objects.filter(is_active=True)
+        if options["ids"]:
+            listings = listings.filter(pk__in=options["ids"])
+        if options["category"]:
+            listings = listings.filter(category=options["category"])
+        if options["owner"]:
+            listings = listings.filter(owner__username=options["owner"])
+        if not (options["ids"] or options["category"] or options["owner"] or options["all"]):
+            raise CommandError("Give listing ids, --category, --owner or --all.")
+
+        closed = close_listings(listings)
+        self.stdout.write(self.style.SUCCESS(f"Closed {closed} auction(s)."))
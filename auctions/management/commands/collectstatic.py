@@ -0,0 +1,13 @@
+from django.contrib.staticfiles.management.commands.collectstatic import Command as CollectStaticCommand
+
+from auctions.finders import build_sprite
+
+
+class Command(CollectStaticCommand):
+    help = CollectStaticCommand.help + " Builds the icon sprite first if it is missing or stale."
+
+    def collect(self):
+        # SpriteFinder only reads the sprite, so it is built here rather than on a request
+        if not self.dry_run:
+            build_sprite()
+        return super().collect()
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from auctions import images
+from auctions.models import Listing
+
+
+class Command(BaseCommand):
+    help = "Download listing images and build their local thumbnails."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Rebuild listings that already have thumbnails.")
+
+    def handle(self, *args, **options):
+        if not images.HAS_PILLOW:
+            raise CommandError("Pillow is required to build thumbnails (pip install Pillow).")
+
+        listings = Listing.objects.exclude(image_url__isnull=True).exclude(image_url="")
+        if not options["all"]:
+            listings = listings.filter(thumbnail="")
+
+        built = failed = 0
+        for listing in listings.only("id", "image_url").iterator():
+            try:
+                images.generate_thumbnail(listing)
+            except Exception as exc:
+                failed += 1
+                self.stderr.write(f"Listing {listing.id}: {exc}")
+            else:
+                built += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Built {built} thumbnails, {failed} failed."))
@@ -0,0 +1,75 @@
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# What a worker does before it can serve: settings, app registry, URLconf and views
+BOOT_SCRIPT = """
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+"""
+
+# "import time:       self [us] |  cumulative | imported package", nested imports are indented
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def parse_importtime(output):
+    """Return [(module, self_us, cumulative_us, depth)] from `python -X importtime` stderr."""
+    modules = []
+    for line in output.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            modules.append((module, int(self_us), int(cumulative_us), len(indent) // 2))
+    return modules
+
+
+class Command(BaseCommand):
+    help = "Profile module import times of a cold worker boot (django.setup() plus the URLconf)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=25, help="Number of slowest modules to list.")
+        parser.add_argument("--package", help="Only list modules from this top-level package, e.g. auctions.")
+
+    def handle(self, *args, **options):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get("DJANGO_SETTINGS_MODULE", "commerce.settings"))
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", BOOT_SCRIPT],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        if result.returncode:
+            raise CommandError(f"Boot failed:\n{result.stderr[-2000:]}")
+
+        modules = parse_importtime(result.stderr)
+        if options["package"]:
+            shown = [m for m in modules if m[0].split(".")[0] == options["package"]]
+        else:
+            shown = modules
+
+        self.stdout.write(self.style.MIGRATE_HEADING("Slowest modules (self time)"))
+        for module, self_us, cumulative_us, _ in sorted(shown, key=lambda m: m[1], reverse=True)[:options["top"]]:
+            self.stdout.write(f"  {module:<56} {self_us / 1000:>9.2f} ms  {cumulative_us / 1000:>9.2f} ms cumulative")
+
+        # Self times add up exactly, so per-package totals show where boot time goes
+        packages = defaultdict(int)
+        for module, self_us, _, _ in modules:
+            packages[module.split(".")[0]] += self_us
+        self.stdout.write(self.style.MIGRATE_HEADING("By top-level package"))
+        for package, self_us in sorted(packages.items(), key=lambda p: p[1], reverse=True)[:options["top"]]:
+            self.stdout.write(f"  {package:<56} {self_us / 1000:>9.2f} ms")
+
+        total = sum(self_us for _, self_us, _, _ in modules)
+        self.stdout.write(f"  {'total':<56} {total / 1000:>9.2f} ms ({len(modules)} modules)")
+
+        # Django 3.0 imports distutils; setuptools' shim (installed at interpreter start) then loads pkg_resources
+        if packages.get("pkg_resources"):
+            self.stdout.write(self.style.WARNING(
+                f"pkg_resources took {packages['pkg_resources'] / 1000:.0f} ms. "
+                "Start workers with SETUPTOOLS_USE_DISTUTILS=stdlib to keep setuptools out of the boot."
+            ))
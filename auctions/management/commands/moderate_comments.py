@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from auctions import sharding
+from auctions.models import Comment, User
+from auctions.utils import set_comments_hidden
+
+
+class Command(BaseCommand):
+    help = "Hide, unhide or delete a set of comments with a single query (one per shard if sharded)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("action", choices=["hide", "unhide", "delete"])
+        parser.add_argument("ids", nargs="*", type=int, help="Comment ids.")
+        parser.add_argument("--author", help="Every comment by this username.")
+        parser.add_argument("--listing", type=int, help="Every comment on this listing id.")
+
+    def handle(self, *args, **options):
+        if not (options["ids"] or options["author"] or options["listing"]):
+            raise CommandError("Give comment ids, --author or --listing.")
+
+        if options["listing"]:
+            comments = [sharding.for_listing(Comment, options["listing"])]
+        else:
+            comments = [Comment.objects.using(alias) for alias in sharding.shard_aliases()]
+        if options["ids"]:
+            # Every shard numbers its rows from its own id base, so an id matches on one shard at most
+            comments = [shard.filter(pk__in=options["ids"]) for shard in comments]
+        if options["author"]:
+            # Comments can't join users across shards
+            author_id = User.objects.filter(username=options["author"]).values_list("id", flat=True).first()
+            comments = [shard.filter(author_id=author_id) for shard in comments]
+
+        count = 0
+        for shard in comments:
+            if options["action"] == "delete":
+                count += shard.delete()[0]
+            else:
+                count += set_comments_hidden(shard, options["action"] == "hide")
+        self.stdout.write(self.style.SUCCESS(f"{options['action'].capitalize()}: {count} comment(s)."))
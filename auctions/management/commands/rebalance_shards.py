@@ -0,0 +1,84 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+
+from auctions import sharding
+from auctions.livestate import live_auctions
+from auctions.models import Bid, Comment, Listing
+
+SHARDED = (Bid, Comment)
+
+
+def misplaced_listings(alias, batch_size):
+    """Yield the ids of listings with rows on `alias` that belong on another shard, in keyset batches."""
+    last_id = 0
+    while True:
+        ids = set()
+        for model in SHARDED:
+            ids.update(
+                model.objects.using(alias).filter(listing_id__gt=last_id).order_by("listing_id")
+                .values_list("listing_id", flat=True).distinct()[:batch_size]
+            )
+        if not ids:
+            return
+        # Both models were read up to at least this id
+        ids = sorted(ids)[:batch_size]
+        last_id = ids[-1]
+        yield [listing_id for listing_id in ids if sharding.shard_for(listing_id) != alias]
+
+
+def move_listing(listing_id, source, target):
+    """Copy one listing's bids and comments from `source` to `target`, then delete them on `source`."""
+    copied = {}
+    with transaction.atomic():
+        # Locks the listing like place_bid does, so no bid lands mid-copy, and makes workers reload it
+        Listing.objects.filter(pk=listing_id).update(version=F("version") + 1)
+        with transaction.atomic(using=target):
+            for model in SHARDED:
+                rows = list(model.objects.using(source).filter(listing_id=listing_id).order_by("id"))
+                if rows:
+                    copied[model] = (rows[-1].pk, len(rows))
+                    # Ids are per shard; copies get new ones, in the same order
+                    for row in rows:
+                        row.pk = None
+                    model.objects.using(target).bulk_create(rows)
+
+    # Only once the copies are committed. Until then the listing is still read from `source`,
+    # and rows written there in between are newer than `last_id` and move with the next pass.
+    for model, (last_id, _) in copied.items():
+        model.objects.using(source).filter(listing_id=listing_id, id__lte=last_id).delete()
+    live_auctions.forget(listing_id)
+    return sum(count for _, count in copied.values())
+
+
+class Command(BaseCommand):
+    help = (
+        "Move bids and comments to the shard their listing hashes to under AUCTION_SHARDS. "
+        "Run it with AUCTION_SHARDS_PREVIOUS set to the old layout, so the site keeps serving meanwhile."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Listings scanned per query.")
+        parser.add_argument("--dry-run", action="store_true", help="Only count the listings to move.")
+
+    def handle(self, *args, **options):
+        # Rows written to an old shard while it was being scanned are picked up by the next pass
+        while True:
+            listings = rows = 0
+            for source in sharding.shard_aliases():
+                for listing_ids in misplaced_listings(source, options["batch_size"]):
+                    listings += len(listing_ids)
+                    if not options["dry_run"]:
+                        for listing_id in listing_ids:
+                            rows += move_listing(listing_id, source, sharding.shard_for(listing_id))
+            if options["dry_run"]:
+                self.stdout.write(f"{listings} listing(s) to move.")
+                return
+            self.stdout.write(f"Moved {rows} row(s) of {listings} listing(s).")
+            if not listings:
+                break
+
+        self.stdout.write(self.style.SUCCESS("Every listing is on its shard."))
+        if settings.AUCTION_SHARDS_PREVIOUS:
+            self.stdout.write("Deploy without AUCTION_SHARDS_PREVIOUS (COMMERCE_SHARDS_PREVIOUS) to finish.")
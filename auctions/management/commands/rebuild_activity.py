@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from auctions import activity
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-user activity projection (watchlist, my listings, my purchases) from source tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        written = activity.rebuild(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} activity rows."))
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from auctions import recommendations
+
+
+class Command(BaseCommand):
+    help = (
+        "Rescore the popular and similar listing rankings for what changed since the last run. "
+        "Run it from cron, or keep it running with --every."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true", help="Rebuild the rankings from scratch.")
+        parser.add_argument("--every", type=float, help="Keep refreshing, waiting this many seconds between runs.")
+
+    def handle(self, *args, **options):
+        full = options["full"]
+        while True:
+            popular, similar = recommendations.refresh(full=full)
+            self.stdout.write(f"Rescored {popular} listing(s) for popularity, {similar} for similarity.")
+            if not options["every"]:
+                break
+            full = False
+            time.sleep(options["every"])
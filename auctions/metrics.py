@@ -0,0 +1,194 @@
+"""
+In-process counters and histograms for the auction hot paths, served in the
+Prometheus text format by the /metrics view.
+
+Every metric keeps one cell per thread. Recording a sample only touches the
+calling thread's cell, so it takes no lock and threads never contend; a scrape
+copies and sums the cells of the running threads. When a thread ends, its cell
+is folded into the metric's retired totals and freed, so thread churn doesn't
+grow the cell list and totals never go back. Like the live
+auction state, the registry is per process: scrape each worker (or sum them by
+instance) when running several.
+"""
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from functools import wraps
+
+# Seconds, as in the Prometheus client libraries
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(names, values, **extra):
+    pairs = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{value}"' for name, value in extra.items()]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        # {id(cell): cell} of the threads still running
+        self._cells = {}
+        # The summed cells of the threads that have ended
+        self._retired = {}
+        # Only taken when a thread starts or stops recording, and by scrapes
+        self._lock = threading.Lock()
+
+    def _cell(self):
+        try:
+            return self._local.cell
+        except AttributeError:
+            cell = self._local.cell = {}
+            with self._lock:
+                self._cells[id(cell)] = cell
+            # Runs once the thread has ended and its Thread object is gone
+            weakref.finalize(threading.current_thread(), self._retire, cell)
+            return cell
+
+    def _retire(self, cell):
+        with self._lock:
+            del self._cells[id(cell)]
+            self._add(self._retired, cell)
+
+    def _snapshot(self):
+        # Under the lock, so a thread retiring meanwhile is counted exactly once. dict.copy()
+        # is atomic under the GIL, so the owning threads keep writing meanwhile.
+        with self._lock:
+            return [self._add({}, self._retired), *(cell.copy() for cell in self._cells.values())]
+
+    def _add(self, totals, cell):
+        """Add the samples of `cell` to `totals` and return it."""
+        raise NotImplementedError
+
+    def totals(self):
+        totals = {}
+        for cell in self._snapshot():
+            self._add(totals, cell)
+        return totals
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        cell = self._cell()
+        cell[labels] = cell.get(labels, 0) + amount
+
+    def _add(self, totals, cell):
+        for labels, value in cell.items():
+            totals[labels] = totals.get(labels, 0) + value
+        return totals
+
+    def samples(self):
+        for labels, value in sorted(self.totals().items()):
+            yield f"{self.name}{format_labels(self.labelnames, labels)} {value}"
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        cell = self._cell()
+        counts = cell.get(labels)
+        if counts is None:
+            # One count per bucket and one for +Inf, then the sum of the observed values
+            counts = cell[labels] = [0] * (len(self.buckets) + 2)
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def _add(self, totals, cell):
+        for labels, counts in cell.items():
+            total = totals.setdefault(labels, [0] * len(counts))
+            for index, count in enumerate(list(counts)):
+                total[index] += count
+        return totals
+
+    def samples(self):
+        for labels, counts in sorted(self.totals().items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                yield f"{self.name}_bucket{format_labels(self.labelnames, labels, le=bound)} {cumulative}"
+            yield f"{self.name}_sum{format_labels(self.labelnames, labels)} {counts[-1]}"
+            yield f"{self.name}_count{format_labels(self.labelnames, labels)} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def _register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        return "\n".join(metric.render() for metric in self.metrics) + "\n"
+
+
+def timed(histogram, *labels):
+    """Decorator recording the wall time of every call, in seconds, in `histogram`."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start, *labels)
+        return wrapper
+    return decorator
+
+
+REGISTRY = Registry()
+
+BIDS = REGISTRY.counter(
+    "auction_bids_total", "Bids submitted, by outcome (accepted or why they were refused).", ("outcome",),
+)
+
+AUCTIONS_CLOSED = REGISTRY.counter("auction_closed_total", "Auctions closed.")
+
+LIVE_STATE_LOOKUPS = REGISTRY.counter(
+    "auction_live_state_lookups_total", "Live auction state lookups, by result (hit, miss or expired).", ("result",),
+)
+
+USER_CACHE_LOOKUPS = REGISTRY.counter(
+    "auction_user_cache_lookups_total", "Cached user lookups on authenticated requests, by result.", ("result",),
+)
+
+VIEW_SECONDS = REGISTRY.histogram("auction_view_seconds", "View latency in seconds, by view.", ("view",))
+
+LISTING_CONTEXT_SECONDS = REGISTRY.histogram(
+    "auction_listing_context_seconds", "Time spent building a listing page's context, in seconds.",
+)
+
+GRID_CARDS = REGISTRY.histogram(
+    "auction_grid_cards", "Cards per listings page, by mode.", ("mode",), buckets=(0, 10, 24, 100, 1000, 10000),
+)
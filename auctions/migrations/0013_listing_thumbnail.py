@@ -0,0 +1,18 @@
+# Generated by Django 3.0.2 on 2026-10-19 09:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0012_auto_20251213_1856'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='thumbnail',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 3.0.2 on 2026-10-19 09:38
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0013_listing_thumbnail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserActivity',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('relation', models.CharField(choices=[('watching', 'Watching'), ('selling', 'Selling'), ('bidding', 'Bidding')], max_length=10)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('last_bid', models.IntegerField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('active', 'Active'), ('closed', 'Closed'), ('won', 'Won'), ('lost', 'Lost')], default='active', max_length=10)),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity', to='auctions.Listing')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'relation', 'listing')},
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.0.2 on 2026-10-19 09:39
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0014_useractivity'),
+    ]
+
+    operations = [
+        # Added without a default first so existing bids keep a NULL timestamp
+        migrations.AddField(
+            model_name='bid',
+            name='placed_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='bid',
+            name='placed_at',
+            field=models.DateTimeField(blank=True, db_index=True, default=django.utils.timezone.now, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.0.2 on 2026-10-19 09:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0015_bid_placed_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='listing',
+            name='title',
+            field=models.CharField(db_index=True, max_length=100),
+        ),
+    ]
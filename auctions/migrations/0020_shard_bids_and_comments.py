@@ -0,0 +1,50 @@
+# Generated by Django 3.0.2 on 2026-10-19 10:02
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class AlterShardedField(migrations.AlterField):
+    """
+    AlterField that only changes the schema on shard aliases. The listing and user
+    tables are on "default", so its Bid and Comment foreign keys stay enforced there.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.alias != 'default':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.alias != 'default':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0019_proxybid'),
+    ]
+
+    operations = [
+        AlterShardedField(
+            model_name='bid',
+            name='bidder',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='bids', to=settings.AUTH_USER_MODEL),
+        ),
+        AlterShardedField(
+            model_name='bid',
+            name='listing',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='bids', to='auctions.Listing'),
+        ),
+        AlterShardedField(
+            model_name='comment',
+            name='author',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='comments', to=settings.AUTH_USER_MODEL),
+        ),
+        AlterShardedField(
+            model_name='comment',
+            name='listing',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='comments', to='auctions.Listing'),
+        ),
+    ]
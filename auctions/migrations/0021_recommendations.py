@@ -0,0 +1,57 @@
+# Generated by Django 3.0.2 on 2026-10-19 10:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0020_shard_bids_and_comments'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingPopularity',
+            fields=[
+                ('listing', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='popularity', serialize=False, to='auctions.Listing')),
+                ('category', models.CharField(blank=True, max_length=50, null=True)),
+                ('bids', models.PositiveIntegerField(default=0)),
+                ('watchers', models.PositiveIntegerField(default=0)),
+                ('score', models.FloatField(default=0)),
+                ('stale', models.BooleanField(default=False)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RecommendationWatermark',
+            fields=[
+                ('name', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('last_id', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SimilarListing',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_listings', to='auctions.Listing')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='auctions.Listing')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='listingpopularity',
+            index=models.Index(fields=['-score', 'listing'], name='popularity_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listingpopularity',
+            index=models.Index(fields=['category', '-score', 'listing'], name='popularity_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='similarlisting',
+            index=models.Index(fields=['listing', '-score'], name='similar_listing_score_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='similarlisting',
+            unique_together={('listing', 'similar')},
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.0.2 on 2026-10-19 10:22
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0021_recommendations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuctionEvent',
+            fields=[
+                ('seq', models.BigAutoField(primary_key=True, serialize=False)),
+                ('kind', models.PositiveSmallIntegerField(choices=[(1, 'Listed'), (2, 'Bid'), (3, 'Closed'), (4, 'Comment'), (5, 'Watched'), (6, 'Unwatched')])),
+                ('listing_id', models.IntegerField()),
+                ('user_id', models.IntegerField(blank=True, null=True)),
+                ('payload', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='auctionevent',
+            index=models.Index(fields=['listing_id', 'seq'], name='event_listing_seq_idx'),
+        ),
+    ]
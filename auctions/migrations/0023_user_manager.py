@@ -0,0 +1,20 @@
+# Generated by Django 3.0.2 on 2026-10-19 10:58
+
+import auctions.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0022_auction_events'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='user',
+            managers=[
+                ('objects', auctions.models.UserManager()),
+            ],
+        ),
+    ]
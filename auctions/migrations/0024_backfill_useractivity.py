@@ -0,0 +1,87 @@
+from django.conf import settings
+from django.db import connections, migrations
+from django.db.models import Max
+
+
+def activity_status(is_active, winner_id, user_id, relation):
+    if is_active:
+        return "active"
+    if relation == "selling":
+        return "closed"
+    return "won" if winner_id == user_id else "lost"
+
+
+def bid_aliases(apps):
+    # Bids may already be spread over shards; skip the ones that haven't been migrated yet
+    table = apps.get_model("auctions", "Bid")._meta.db_table
+    aliases = dict.fromkeys(["default", *settings.AUCTION_SHARDS, *(settings.AUCTION_SHARDS_PREVIOUS or [])])
+    return [alias for alias in aliases if table in connections[alias].introspection.table_names()]
+
+
+def backfill(apps, schema_editor):
+    """
+    Fill UserActivity, which 0014 created empty, the same way activity.rebuild() does.
+    A table the app has been maintaining already is left alone.
+    """
+    if schema_editor.connection.alias != "default":
+        return
+    Listing = apps.get_model("auctions", "Listing")
+    Watchlist = apps.get_model("auctions", "Watchlist")
+    Bid = apps.get_model("auctions", "Bid")
+    RemovedPurchase = apps.get_model("auctions", "RemovedPurchase")
+    UserActivity = apps.get_model("auctions", "UserActivity")
+    if UserActivity.objects.exists():
+        return
+
+    listings = {
+        listing["id"]: listing
+        for listing in Listing.objects.values("id", "owner_id", "winner_id", "is_active", "starting_bid").iterator()
+    }
+    last_bids = {}
+    for alias in bid_aliases(apps):
+        bids = Bid.objects.using(alias).values("bidder_id", "listing_id").annotate(last_bid=Max("amount")).order_by()
+        for bid in bids.iterator():
+            key = (bid["bidder_id"], bid["listing_id"])
+            last_bids[key] = max(last_bids.get(key, bid["last_bid"]), bid["last_bid"])
+    top_bids = {}
+    for (_, listing_id), amount in last_bids.items():
+        top_bids[listing_id] = max(top_bids.get(listing_id, amount), amount)
+    removed = set(RemovedPurchase.objects.values_list("user_id", "listing_id").iterator())
+
+    def row(user_id, listing_id, relation, last_bid=None):
+        listing = listings[listing_id]
+        return UserActivity(
+            user_id=user_id, listing_id=listing_id, relation=relation,
+            price=top_bids.get(listing_id, listing["starting_bid"]), last_bid=last_bid,
+            status=activity_status(listing["is_active"], listing["winner_id"], user_id, relation),
+        )
+
+    def rows():
+        for listing_id, listing in listings.items():
+            yield row(listing["owner_id"], listing_id, "selling")
+        for user_id, listing_id in Watchlist.objects.values_list("user_id", "listing_id").distinct().iterator():
+            yield row(user_id, listing_id, "watching")
+        for (user_id, listing_id), last_bid in last_bids.items():
+            # Bids whose listing is gone only linger on shards, which have no foreign keys
+            if listing_id in listings and (user_id, listing_id) not in removed \
+                    and listings[listing_id]["owner_id"] != user_id:
+                yield row(user_id, listing_id, "bidding", last_bid=last_bid)
+
+    batch = []
+    for activity in rows():
+        batch.append(activity)
+        if len(batch) >= 1000:
+            UserActivity.objects.bulk_create(batch)
+            batch = []
+    UserActivity.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0023_user_manager'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+from django.db import migrations
+
+# (index name, table, column) for every column the admin searches by prefix ('^field').
+# istartswith compares case-insensitively, which a plain index can't serve.
+INDEXES = [
+    ("auctions_listing_title_ci", "auctions_listing", "title"),
+    ("auctions_user_username_ci", "auctions_user", "username"),
+    ("auctions_user_email_ci", "auctions_user", "email"),
+]
+
+
+def index_expression(vendor, column):
+    if vendor == "postgresql":
+        # Matches the UPPER("column"::text) LIKE UPPER(%s) that istartswith compiles to
+        return f'UPPER("{column}"::text) text_pattern_ops'
+    if vendor == "sqlite":
+        # SQLite's LIKE is case-insensitive and uses an index with the same collation
+        return f'"{column}" COLLATE NOCASE'
+    # MySQL compares case-insensitively already, so the plain indexes serve it
+    return None
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.alias != "default":
+        return
+    for name, table, column in INDEXES:
+        expression = index_expression(schema_editor.connection.vendor, column)
+        if expression:
+            schema_editor.execute(f'CREATE INDEX "{name}" ON "{table}" ({expression})')
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.alias != "default":
+        return
+    for name, _, column in INDEXES:
+        if index_expression(schema_editor.connection.vendor, column):
+            schema_editor.execute(f'DROP INDEX "{name}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0024_backfill_useractivity'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
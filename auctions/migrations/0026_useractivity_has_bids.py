@@ -0,0 +1,35 @@
+# Generated by Django 3.0.2 on 2026-10-19 11:09
+
+from django.conf import settings
+from django.db import connections, migrations, models
+
+
+def fill_has_bids(apps, schema_editor):
+    """Flag the rows of every listing that has a bid, reading bids from each migrated shard."""
+    if schema_editor.connection.alias != "default":
+        return
+    Bid = apps.get_model("auctions", "Bid")
+    UserActivity = apps.get_model("auctions", "UserActivity")
+    aliases = dict.fromkeys(["default", *settings.AUCTION_SHARDS, *(settings.AUCTION_SHARDS_PREVIOUS or [])])
+    for alias in aliases:
+        if Bid._meta.db_table not in connections[alias].introspection.table_names():
+            continue
+        listing_ids = list(Bid.objects.using(alias).values_list("listing_id", flat=True).distinct().order_by())
+        for start in range(0, len(listing_ids), 500):
+            UserActivity.objects.filter(listing_id__in=listing_ids[start:start + 500]).update(has_bids=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0025_prefix_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='useractivity',
+            name='has_bids',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(fill_has_bids, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,67 @@
+from django.conf import settings
+from django.db import migrations, models
+
+TABLES = ("auctions_bid", "auctions_comment")
+
+# Must match auctions.sharding.SHARD_ID_SPAN
+SHARD_ID_SPAN = 2 ** 40
+
+
+def widen_ids(apps, schema_editor):
+    # SQLite's integer primary keys are 64-bit already
+    if schema_editor.connection.vendor == "postgresql":
+        for table in TABLES:
+            schema_editor.execute(f'ALTER TABLE "{table}" ALTER COLUMN "id" TYPE bigint')
+            schema_editor.execute(f'ALTER SEQUENCE "{table}_id_seq" AS bigint')
+
+
+def start_id_ranges(apps, schema_editor):
+    """
+    Move each shard's id sequences to its own range, so ids no longer collide across
+    shards. Ids already handed out stay as they are.
+    """
+    connection = schema_editor.connection
+    if connection.alias not in settings.SHARD_ALIASES:
+        return
+    base = settings.SHARD_ALIASES.index(connection.alias) * SHARD_ID_SPAN
+    if not base:
+        return
+    with connection.cursor() as cursor:
+        for table in TABLES:
+            cursor.execute(f'SELECT MAX("id") FROM "{table}"')
+            if (cursor.fetchone()[0] or 0) >= base:
+                continue
+            if connection.vendor == "postgresql":
+                cursor.execute("SELECT setval(pg_get_serial_sequence(%s, 'id'), %s)", [table, base])
+            elif connection.vendor == "sqlite":
+                cursor.execute("DELETE FROM sqlite_sequence WHERE name = %s", [table])
+                cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)", [table, base])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0026_useractivity_has_bids'),
+    ]
+
+    operations = [
+        # A plain AlterField would rebuild the SQLite tables and drop the foreign keys "default" keeps
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(widen_ids, migrations.RunPython.noop, hints={'model_name': 'bid'}),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='bid',
+                    name='id',
+                    field=models.BigAutoField(primary_key=True, serialize=False),
+                ),
+                migrations.AlterField(
+                    model_name='comment',
+                    name='id',
+                    field=models.BigAutoField(primary_key=True, serialize=False),
+                ),
+            ],
+        ),
+        migrations.RunPython(start_id_ranges, migrations.RunPython.noop, hints={'model_name': 'bid'}),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.0.2 on 2026-10-19 11:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0027_shard_id_ranges'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='auctionevent',
+            name='kind',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'Listed'), (2, 'Bid'), (3, 'Closed'), (4, 'Comment'), (5, 'Watched'), (6, 'Unwatched'), (7, 'Edited')]),
+        ),
+    ]
@@ -1,11 +1,56 @@
-from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.contrib.auth.models import AbstractUser, UserManager as BaseUserManager
+from django.core.cache import cache
+from django.db import models, transaction
+from django.urls import reverse
+from django.utils import timezone
 
 
-class User(AbstractUser):
+def user_cache_key(user_id):
+    return f"auth:user:{user_id}"
+
+
+def forget_users(user_ids):
+    """
+    Drop the copies kept by auctions.backends.CachedModelBackend. They are dropped again
+    on commit, since another request may cache the old row before the write commits.
+    """
+    keys = [user_cache_key(user_id) for user_id in user_ids]
+    if keys:
+        cache.delete_many(keys)
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+class UserQuerySet(models.QuerySet):
+
+    def update(self, **kwargs):
+        user_ids = list(self.values_list("pk", flat=True))
+        rows = super().update(**kwargs)
+        forget_users(user_ids)
+        return rows
+    update.alters_data = True
+
+    def delete(self):
+        forget_users(list(self.values_list("pk", flat=True)))
+        return super().delete()
+    delete.alters_data = True
+
+
+class UserManager(BaseUserManager.from_queryset(UserQuerySet)):
     pass
 
 
+class User(AbstractUser):
+    objects = UserManager()
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        forget_users([self.pk])
+
+    def delete(self, *args, **kwargs):
+        forget_users([self.pk])
+        return super().delete(*args, **kwargs)
+
+
 CATEGORY_CHOICES = [
     ("Fashion", "Fashion"),
     ("Toys", "Toys"),
@@ -16,14 +61,18 @@ CATEGORY_CHOICES = [
 
 
 class Listing(models.Model):
-    title = models.CharField(max_length=100)
+    title = models.CharField(max_length=100, db_index=True)
     description = models.TextField(max_length=420)
     starting_bid = models.DecimalField(max_digits=10, decimal_places=2)
     image_url = models.URLField(blank=True, null=True)
+    # Content hash of the locally generated thumbnails, see auctions/images.py
+    thumbnail = models.CharField(max_length=32, blank=True, default="")
     category = models.CharField(max_length=50, choices=CATEGORY_CHOICES, blank=True, null=True)
     winner = models.ForeignKey(User, on_delete=models.SET_NULL, blank=True, null=True, related_name="won_listings")
     is_active = models.BooleanField(default=True)
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="listings")
+    # Bumped with every accepted bid, see auctions/livestate.py
+    version = models.PositiveIntegerField(default=0)
 
     class Meta:
         constraints = [
@@ -33,6 +82,14 @@ class Listing(models.Model):
     def __str__(self):
         return self.title
 
+    @property
+    def thumbnail_webp(self):
+        return reverse("thumbnail", args=[f"{self.thumbnail}.webp"]) if self.thumbnail else ""
+
+    @property
+    def thumbnail_jpg(self):
+        return reverse("thumbnail", args=[f"{self.thumbnail}.jpg"]) if self.thumbnail else ""
+
 
 class Watchlist(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="watchlist_entries")
@@ -43,18 +100,45 @@ class Watchlist(models.Model):
 
 
 class Bid(models.Model):
+    # 64-bit, since every shard numbers its rows from its own base (auctions/sharding.py)
+    id = models.BigAutoField(primary_key=True)
     amount = models.IntegerField()  # Changed from DecimalField to IntegerField
-    bidder = models.ForeignKey(User, on_delete=models.CASCADE, related_name="bids")
-    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name="bids")
+    # Null for bids placed before timestamps were recorded
+    placed_at = models.DateTimeField(default=timezone.now, blank=True, null=True, db_index=True)
+    # Bids may live on another database than users and listings (auctions/sharding.py)
+    bidder = models.ForeignKey(User, on_delete=models.CASCADE, related_name="bids", db_constraint=False)
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name="bids", db_constraint=False)
 
     def __str__(self):
         return f"{self.amount}"
 
 
+class ProxyBid(models.Model):
+    """
+    A bidder's secret maximum. auctions/proxy.py bids on the user's behalf, one
+    step above the runner-up, and only the resulting bids are visible as Bid rows.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="proxy_bids")
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name="proxy_bids")
+    max_amount = models.IntegerField()
+    # Equal maxima are won by the earlier proxy
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ('listing', 'user')
+
+    def __str__(self):
+        return f"{self.user_id} up to {self.max_amount} on {self.listing_id}"
+
+
 class Comment(models.Model):
+    # Sharded with bids, see Bid
+    id = models.BigAutoField(primary_key=True)
     text = models.TextField()
-    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name="comments")
-    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name="comments")
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name="comments", db_constraint=False)
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name="comments", db_constraint=False)
+    # Hidden by a moderator; kept for the record but not shown on the listing page
+    is_hidden = models.BooleanField(default=False)
 
     def __str__(self):
         return self.text[:50]
@@ -66,3 +150,120 @@ class RemovedPurchase(models.Model):
 
     class Meta:
         unique_together = ('user', 'listing')
+
+
+ACTIVITY_RELATION_CHOICES = [
+    ("watching", "Watching"),
+    ("selling", "Selling"),
+    ("bidding", "Bidding"),
+]
+
+ACTIVITY_STATUS_CHOICES = [
+    ("active", "Active"),
+    ("closed", "Closed"),
+    ("won", "Won"),
+    ("lost", "Lost"),
+]
+
+
+class UserActivity(models.Model):
+    """
+    Denormalized per-user view of the listings a user watches, sells or bids on.
+    Kept up to date by auctions/activity.py so each dashboard is one indexed range scan.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="activity")
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name="activity")
+    relation = models.CharField(max_length=10, choices=ACTIVITY_RELATION_CHOICES)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    # Whether the listing has any bid; a first bid may equal the starting price
+    has_bids = models.BooleanField(default=False)
+    last_bid = models.IntegerField(blank=True, null=True)
+    status = models.CharField(max_length=10, choices=ACTIVITY_STATUS_CHOICES, default="active")
+
+    class Meta:
+        # Also serves as the (user, relation, listing) index the dashboards scan
+        unique_together = ('user', 'relation', 'listing')
+
+    def __str__(self):
+        return f"{self.user_id} {self.relation} {self.listing_id}"
+
+
+class ListingPopularity(models.Model):
+    """
+    Precomputed popularity of an active listing, kept by auctions/recommendations.py
+    so "popular" strips are one indexed top-K scan.
+    """
+    listing = models.OneToOneField(Listing, on_delete=models.CASCADE, primary_key=True, related_name="popularity")
+    # Copied from the listing, so the per-category ranking needs no join
+    category = models.CharField(max_length=50, blank=True, null=True)
+    bids = models.PositiveIntegerField(default=0)
+    watchers = models.PositiveIntegerField(default=0)
+    score = models.FloatField(default=0)
+    # Set when the listing loses a watcher or closes; rescored by the next refresh
+    stale = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-score", "listing"], name="popularity_score_idx"),
+            models.Index(fields=["category", "-score", "listing"], name="popularity_category_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.listing_id}: {self.score}"
+
+
+class SimilarListing(models.Model):
+    """One of the top-K listings most often watched together with `listing` (auctions/recommendations.py)."""
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name="similar_listings")
+    similar = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name="+")
+    score = models.FloatField()
+
+    class Meta:
+        unique_together = ('listing', 'similar')
+        indexes = [models.Index(fields=["listing", "-score"], name="similar_listing_score_idx")]
+
+    def __str__(self):
+        return f"{self.listing_id} ~ {self.similar_id}: {self.score}"
+
+
+class RecommendationWatermark(models.Model):
+    """Highest row id a recommendations refresh has read from a table (per shard for bids)."""
+    name = models.CharField(max_length=64, primary_key=True)
+    last_id = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: {self.last_id}"
+
+
+# AuctionEvent kinds; small integers keep the log compact (see auctions/events.py)
+EVENT_LISTED, EVENT_BID, EVENT_CLOSED, EVENT_COMMENT, EVENT_WATCHED, EVENT_UNWATCHED, EVENT_EDITED = range(1, 8)
+
+EVENT_KIND_CHOICES = [
+    (EVENT_LISTED, "Listed"),
+    (EVENT_BID, "Bid"),
+    (EVENT_CLOSED, "Closed"),
+    (EVENT_COMMENT, "Comment"),
+    (EVENT_WATCHED, "Watched"),
+    (EVENT_UNWATCHED, "Unwatched"),
+    (EVENT_EDITED, "Edited"),
+]
+
+
+class AuctionEvent(models.Model):
+    """
+    Append-only log of auction actions, written and replayed by auctions/events.py.
+    Listings and users are plain ids, so the history outlives the rows it describes.
+    """
+    seq = models.BigAutoField(primary_key=True)
+    kind = models.PositiveSmallIntegerField(choices=EVENT_KIND_CHOICES)
+    listing_id = models.IntegerField()
+    user_id = models.IntegerField(blank=True, null=True)
+    # Compact JSON array laid out per kind, empty when the kind carries nothing
+    payload = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=["listing_id", "seq"], name="event_listing_seq_idx")]
+
+    def __str__(self):
+        return f"#{self.seq} {self.get_kind_display()} {self.listing_id}"
@@ -0,0 +1,141 @@
+"""
+Proxy bidding: bidders leave a secret maximum and the engine bids for them.
+
+Competing maxima are resolved in one pass instead of trading single increments:
+the contenders are ranked once (O(N log N)), the best one leads at one bid step
+above the runner-up, and at most two visible bids are recorded, the runner-up's
+maximum and the leader's new price. Callers must hold the listing's row lock,
+i.e. run inside the transaction that bumped Listing.version.
+"""
+import math
+from bisect import bisect_right
+from collections import namedtuple
+
+from django.utils import timezone
+
+from . import activity, events, sharding
+from .models import Bid, Listing, ProxyBid
+
+# (price from, step): the automatic increment for prices at or above each threshold
+BID_STEPS = (
+    (0, 1),
+    (50, 2),
+    (100, 5),
+    (500, 10),
+    (1000, 25),
+    (5000, 50),
+    (10000, 100),
+)
+
+_STEP_THRESHOLDS = [threshold for threshold, _ in BID_STEPS]
+
+# A proxy, or the standing top bid, taking part in a resolution.
+# `order` breaks ties between equal maxima: lower wins.
+Contender = namedtuple("Contender", "max_amount order user_id")
+
+
+def bid_step(price):
+    return BID_STEPS[bisect_right(_STEP_THRESHOLDS, price) - 1][1]
+
+
+def opening_bid(price, has_bids):
+    """The lowest amount a new leader may bid."""
+    return int(price) + bid_step(price) if has_bids else math.ceil(price)
+
+
+def resolve(price, has_bids, leader_id, proxies):
+    """
+    Return the visible bids, as [(user_id, amount)] in order, that settle `proxies`
+    against the standing price. `proxies` are Contenders; the standing leader keeps
+    the lead on equal maxima, since their bid came first.
+    """
+    opening = opening_bid(price, has_bids)
+
+    # The standing leader defends up to the larger of their bid and their own proxy
+    leader_max = int(price)
+    contenders = []
+    for proxy in proxies:
+        if proxy.user_id == leader_id:
+            leader_max = max(leader_max, proxy.max_amount)
+        elif proxy.max_amount >= opening:
+            contenders.append(proxy)
+    if leader_id is not None:
+        contenders.append(Contender(leader_max, -1, leader_id))
+
+    ranked = sorted(contenders, key=lambda proxy: (-proxy.max_amount, proxy.order))
+    if not ranked or len(ranked) == 1 and ranked[0].user_id == leader_id:
+        return []
+    winner = ranked[0]
+    if len(ranked) == 1:
+        # Unopposed, a new leader enters at the opening bid
+        return [(winner.user_id, opening)]
+
+    runner_up = ranked[1]
+    bids = []
+    # The runner-up's maximum becomes visible unless it is only the standing bid or ties the winner
+    if price < runner_up.max_amount < winner.max_amount:
+        bids.append((runner_up.user_id, runner_up.max_amount))
+    new_price = min(winner.max_amount, runner_up.max_amount + bid_step(runner_up.max_amount))
+    bids.append((winner.user_id, max(new_price, opening)))
+    return bids
+
+
+def settle(listing_id):
+    """Resolve the proxies on `listing_id` and record the resulting bids. Returns them."""
+    listing = Listing.objects.values("starting_bid").get(pk=listing_id)
+    bids = sharding.for_listing(Bid, listing_id)
+    top_bid = bids.order_by("-amount", "id").values("amount", "bidder_id").first()
+    price = top_bid["amount"] if top_bid else listing["starting_bid"]
+    leader_id = top_bid["bidder_id"] if top_bid else None
+
+    proxies = [
+        Contender(max_amount, order, user_id)
+        for order, (max_amount, user_id) in enumerate(
+            ProxyBid.objects.filter(listing_id=listing_id, max_amount__gte=price)
+            .order_by("created_at", "id").values_list("max_amount", "user_id")
+        )
+    ]
+
+    placed = []
+    for user_id, amount in resolve(price, top_bid is not None, leader_id, proxies):
+        placed.append(Bid.objects.using(bids.db).create(amount=amount, bidder_id=user_id, listing_id=listing_id))
+        activity.bid_placed(user_id, listing_id, amount)
+        events.record(events.BID, listing_id, user_id, amount)
+    return placed
+
+
+def tied_proxy(listing_id, user_id, amount):
+    """
+    Return the user whose proxy maximum is exactly `amount`, if it isn't `user_id`, or None.
+    That proxy was there before any explicit bid of the same amount, so it wins the tie.
+    """
+    first = (
+        ProxyBid.objects.filter(listing_id=listing_id, max_amount=amount)
+        .order_by("created_at", "id").values_list("user_id", flat=True).first()
+    )
+    return first if first != user_id else None
+
+
+def place_proxy(listing_id, user, max_amount):
+    """
+    Store `user`'s maximum for the listing and resolve the auction.
+    Returns an error message, or "" once the proxy is stored.
+    Must run inside the transaction that locked the listing.
+    """
+    listing = Listing.objects.values("owner_id", "starting_bid").get(pk=listing_id)
+    if listing["owner_id"] == user.pk:
+        return "Owners cannot place bids on their own listings."
+
+    bids = sharding.for_listing(Bid, listing_id)
+    top_amount = bids.order_by("-amount").values_list("amount", flat=True).first()
+    opening = opening_bid(top_amount if top_amount is not None else listing["starting_bid"], top_amount is not None)
+    if max_amount < opening:
+        return f"Your maximum must be at least ${opening}."
+
+    ProxyBid.objects.update_or_create(
+        user=user, listing_id=listing_id,
+        # Raising a maximum counts as a new proxy for tie-breaking
+        defaults={"max_amount": max_amount, "created_at": timezone.now()},
+    )
+    settle(listing_id)
+    return ""
@@ -0,0 +1,133 @@
+"""
+Sliding-window rate limiting backed by Django's cache.
+
+Each rule counts hits in fixed windows and weights the previous window by how
+much of it still overlaps the sliding window, so only two counters per key are
+ever stored. Counters are bumped with cache.add() + cache.incr(), which are
+atomic on the locmem, memcached and redis backends. A rejected request takes its
+hits back, so a client hammering a limit is let through again once its accepted
+requests age out, and can't keep itself locked out.
+
+The limits are only global when RATELIMIT_CACHE is shared by every worker
+(memcached, redis). On the default locmem cache each worker process counts on
+its own, so N workers let through up to N times each rate.
+"""
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_rate(rate):
+    """Turn a rate string like "10/m" into (limit, period_in_seconds)."""
+    limit, period = rate.split("/")
+    return int(limit), PERIODS[period]
+
+
+def client_ip(request):
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def user_key(request, kwargs):
+    # Anonymous users fall back to their IP address
+    if request.user.is_authenticated:
+        return f"u{request.user.pk}"
+    return f"ip{client_ip(request)}"
+
+
+def ip_key(request, kwargs):
+    return client_ip(request)
+
+
+def user_listing_key(request, kwargs):
+    # Per bidder and auction, so one client flooding an auction never locks other bidders out of it
+    listing_id = kwargs.get("listing_id")
+    return None if listing_id is None else f"{user_key(request, kwargs)}:{listing_id}"
+
+
+def username_key(request, kwargs):
+    return request.POST.get("username", "").lower()
+
+
+KEY_FUNCTIONS = {
+    "user": user_key,
+    "ip": ip_key,
+    "user_listing": user_listing_key,
+    "username": username_key,
+}
+
+
+def hit(keys, now=None):
+    """
+    Record one hit for every (key, limit, period) in `keys`.
+    Returns the number of seconds to wait if any limit is exceeded, else 0; the
+    hits of a rejected request are taken back.
+    """
+    cache = caches[settings.RATELIMIT_CACHE]
+    now = time.time() if now is None else now
+
+    current_keys = []
+    previous_keys = []
+    for key, limit, period in keys:
+        window = int(now // period)
+        current_keys.append(f"rl:{key}:{period}:{window}")
+        previous_keys.append(f"rl:{key}:{period}:{window - 1}")
+
+    # One round trip for all previous windows
+    previous_counts = cache.get_many(previous_keys)
+
+    retry_after = 0
+    for (key, limit, period), current_key, previous_key in zip(keys, current_keys, previous_keys):
+        # add() is a no-op when the counter already exists, so incr() never races a set()
+        cache.add(current_key, 0, period * 2)
+        try:
+            current = cache.incr(current_key)
+        except ValueError:
+            # Counter expired between add() and incr()
+            cache.set(current_key, 1, period * 2)
+            current = 1
+
+        overlap = 1 - (now % period) / period
+        if previous_counts.get(previous_key, 0) * overlap + current > limit:
+            retry_after = max(retry_after, int(period - now % period) + 1)
+
+    if retry_after:
+        for current_key in current_keys:
+            try:
+                cache.decr(current_key)
+            except ValueError:
+                pass
+    return retry_after
+
+
+def ratelimit(*rules, methods=("POST",)):
+    """
+    Reject requests with a 429 once any rule is exceeded.
+    Rules are (key, rate) pairs, e.g. ("user", "10/m"), where key is one of KEY_FUNCTIONS.
+    The check runs before the view body, so throttled requests never touch the ORM.
+    """
+    parsed = [(KEY_FUNCTIONS[key], key, *parse_rate(rate)) for key, rate in rules]
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if settings.RATELIMIT_ENABLE and request.method in methods:
+                keys = []
+                for key_func, name, limit, period in parsed:
+                    value = key_func(request, kwargs)
+                    if value is not None:
+                        keys.append((f"{view.__name__}:{name}:{value}", limit, period))
+
+                retry_after = hit(keys)
+                if retry_after:
+                    response = HttpResponse("Too many requests.", status=429, content_type="text/plain")
+                    response["Retry-After"] = str(retry_after)
+                    return response
+
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,313 @@
+"""
+Precomputed recommendations: the most popular listings, overall and per
+category, and the listings most often watched together with a given one.
+
+Pages only read the ranking tables (ListingPopularity and SimilarListing) with
+one indexed top-K query, then price those K cards, so a recommendation strip
+costs O(K) however many bids and watches there are. `manage.py
+refresh_recommendations` keeps the tables current and only rescores what
+changed since its previous run:
+- listings created, bid on or watched since then, found by id watermarks
+  (RecommendationWatermark, one per shard for bids);
+- listings that lost a watcher or closed since then, flagged stale by
+  remove_from_watchlist() and close_listings().
+Each batch of rows is rescored in its own short transaction, which also moves
+the watermark past it, so a refresh never holds the database's write lock for
+long and one that stops halfway resumes where it stopped. Ids are handed out
+before rows commit, so the rows just behind each watermark are read again
+(WATERMARK_LOOKBACK) in case they committed late.
+
+Popularity weighs bids above watches. Similarity is the cosine of the watcher
+sets: users watching both listings over the square root of the product of their
+watcher counts. It is symmetric, so rescoring a listing whose watchers changed
+also gives its new score in every other list, which is merged in place instead
+of rescoring those lists. Merging can't see listings that never made a list, so
+lists keep spare entries past the K served (SIMILAR_SPARES); a nightly --full
+rebuild clears whatever drift remains.
+"""
+import heapq
+import math
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max
+
+from . import sharding
+from .cards import listing_cards
+from .models import Bid, Listing, ListingPopularity, RecommendationWatermark, SimilarListing, Watchlist
+
+BID_WEIGHT = 2
+WATCH_WEIGHT = 1
+
+# Users watching more listings than this link everything to everything and cost the
+# most to scan, so similarity leaves them out
+MAX_USER_WATCHES = 200
+
+# Similar listings kept per list, as a multiple of the K served, so an entry that
+# loses score in a merge is overtaken by a spare
+SIMILAR_SPARES = 2
+
+# Ids per query when rescoring, under every backend's parameter limit
+CHUNK_SIZE = 500
+
+# New rows rescored per transaction
+BATCH_ROWS = 2000
+
+# Ids behind a watermark read again by the next refresh, for rows that committed late
+WATERMARK_LOOKBACK = 100
+
+
+def popularity_score(bids, watchers):
+    return BID_WEIGHT * bids + WATCH_WEIGHT * watchers
+
+
+def mark_stale(listing_ids):
+    """Have the next refresh rescore `listing_ids` (ids or a values("pk") queryset)."""
+    ListingPopularity.objects.filter(listing_id__in=listing_ids).update(stale=True)
+
+
+def ranked_cards(listing_ids):
+    """Cards for `listing_ids` in that order, skipping listings closed since the last refresh."""
+    listing_ids = list(listing_ids)
+    if not listing_ids:
+        return []
+    cards = {card["id"]: card for card in listing_cards(Listing.objects.filter(pk__in=listing_ids, is_active=True))}
+    return [cards[listing_id] for listing_id in listing_ids if listing_id in cards]
+
+
+def popular(category=None, exclude=None, k=None):
+    """Cards of the `k` most popular active listings, only from `category` if given."""
+    rows = ListingPopularity.objects.all()
+    if category:
+        rows = rows.filter(category=category)
+    if exclude is not None:
+        rows = rows.exclude(listing_id=exclude)
+    rows = rows.order_by("-score", "listing_id").values_list("listing_id", flat=True)
+    return ranked_cards(rows[:k or settings.RECOMMENDATIONS_K])
+
+
+def similar(listing_id, k=None):
+    """Cards of the `k` listings most often watched together with `listing_id`."""
+    rows = SimilarListing.objects.filter(listing_id=listing_id).order_by("-score", "similar_id")
+    rows = rows.values_list("similar_id", flat=True)
+    return ranked_cards(rows[:k or settings.RECOMMENDATIONS_K])
+
+
+def _rescore_new_rows(name, queryset, field, rescore):
+    """
+    Pass the `field` values of the `queryset` rows added since the last refresh to
+    `rescore`, BATCH_ROWS rows per transaction, moving watermark `name` past each batch
+    in the same transaction. Returns every value passed.
+    """
+    last_id = RecommendationWatermark.objects.filter(name=name).values_list("last_id", flat=True).first() or 0
+    start = max(last_id - WATERMARK_LOOKBACK, 0)
+    passed = set()
+    while True:
+        rows = list(queryset.filter(id__gt=start).order_by("id").values_list("id", field)[:BATCH_ROWS])
+        if not rows:
+            return passed
+        values = {value for _, value in rows}
+        with transaction.atomic():
+            rescore(sorted(values))
+            start = rows[-1][0]
+            if start > last_id:
+                last_id = start
+                RecommendationWatermark.objects.update_or_create(name=name, defaults={"last_id": last_id})
+        passed |= values
+
+
+def _rows_for(queryset, lookup, ids, *fields):
+    """values_list(*fields) of the `queryset` rows whose `lookup` is in `ids`, CHUNK_SIZE ids per query."""
+    ids = list(ids)
+    rows = []
+    for start in range(0, len(ids), CHUNK_SIZE):
+        rows.extend(queryset.filter(**{f"{lookup}__in": ids[start:start + CHUNK_SIZE]}).values_list(*fields))
+    return rows
+
+
+def rescore_popularity(listing_ids, clear_stale=True):
+    """
+    Recount the bids and watchers of `listing_ids`; closed or deleted listings lose their row.
+    Unless `clear_stale`, rows flagged stale stay flagged, for similarity to be rescored too.
+    """
+    for start in range(0, len(listing_ids), CHUNK_SIZE):
+        ids = listing_ids[start:start + CHUNK_SIZE]
+        categories = dict(Listing.objects.filter(pk__in=ids, is_active=True).values_list("id", "category"))
+        stale = set() if clear_stale else set(
+            ListingPopularity.objects.filter(listing_id__in=ids, stale=True).values_list("listing_id", flat=True)
+        )
+        bids = sharding.bid_counts(list(categories))
+        watchers = dict(
+            Watchlist.objects.filter(listing_id__in=categories).values("listing_id")
+            .annotate(count=Count("user_id", distinct=True)).order_by().values_list("listing_id", "count")
+        )
+        ListingPopularity.objects.filter(listing_id__in=ids).delete()
+        ListingPopularity.objects.bulk_create([
+            ListingPopularity(
+                listing_id=listing_id, category=category, bids=bids.get(listing_id, 0),
+                watchers=watchers.get(listing_id, 0),
+                score=popularity_score(bids.get(listing_id, 0), watchers.get(listing_id, 0)),
+                stale=listing_id in stale,
+            )
+            for listing_id, category in categories.items()
+        ])
+
+
+def rescore_similar(listing_ids, heavy_users, k):
+    """
+    Replace the similar listings of `listing_ids` with their top `k`, using the watcher
+    counts of ListingPopularity. Similarity is symmetric, so this also returns the new
+    scores {other listing: {listing: score}} of the co-watched listings left out, for
+    merge_similar() to fold into their lists.
+    """
+    rescored = set(listing_ids)
+    reverse = defaultdict(dict)
+    for start in range(0, len(listing_ids), CHUNK_SIZE):
+        ids = listing_ids[start:start + CHUNK_SIZE]
+        # (listing, co-watched listing, users watching both) for the whole chunk in one self-join through the user
+        pairs = list(
+            Watchlist.objects.filter(listing_id__in=ids).exclude(user_id__in=heavy_users)
+            .values("listing_id", "user__watchlist_entries__listing_id")
+            .annotate(shared=Count("user_id", distinct=True)).order_by()
+            .values_list("listing_id", "user__watchlist_entries__listing_id", "shared")
+        )
+        # Listings without a popularity row are closed
+        others = {other for _, other, _ in pairs} | set(ids)
+        watchers = dict(_rows_for(ListingPopularity.objects.all(), "listing_id", others, "listing_id", "watchers"))
+        candidates = defaultdict(list)
+        for listing_id, other, shared in pairs:
+            if other != listing_id and watchers.get(listing_id) and watchers.get(other):
+                score = shared / math.sqrt(watchers[listing_id] * watchers[other])
+                candidates[listing_id].append((score, -other))
+                if other not in rescored:
+                    reverse[other][listing_id] = score
+
+        SimilarListing.objects.filter(listing_id__in=ids).delete()
+        SimilarListing.objects.bulk_create([
+            SimilarListing(listing_id=listing_id, similar_id=-negative_id, score=score)
+            for listing_id, scored in candidates.items()
+            for score, negative_id in heapq.nlargest(k, scored)
+        ])
+    return reverse
+
+
+def merge_similar(rescored, reverse, k):
+    """
+    Fold the scores of the `rescored` listings returned by rescore_similar() into the
+    other lists: entries are updated, added if they make the top `k`, or dropped once no
+    user watches both listings any more. Returns the lists that lost an entry.
+    """
+    holding = _rows_for(SimilarListing.objects.all(), "similar_id", rescored, "listing_id")
+    targets = sorted((set(reverse) | {listing_id for listing_id, in holding}) - set(rescored))
+    shrunk = []
+    for start in range(0, len(targets), CHUNK_SIZE):
+        ids = targets[start:start + CHUNK_SIZE]
+        current = defaultdict(dict)
+        rows = SimilarListing.objects.filter(listing_id__in=ids).values_list("listing_id", "similar_id", "score")
+        for listing_id, similar_id, score in rows:
+            current[listing_id][similar_id] = score
+
+        changed = {}
+        for listing_id in ids:
+            merged = {
+                similar_id: score for similar_id, score in current[listing_id].items() if similar_id not in rescored
+            }
+            merged.update(reverse.get(listing_id, {}))
+            top = dict(heapq.nlargest(k, merged.items(), key=lambda item: (item[1], -item[0])))
+            if top != current[listing_id]:
+                changed[listing_id] = top
+                if len(top) < len(current[listing_id]):
+                    shrunk.append(listing_id)
+
+        SimilarListing.objects.filter(listing_id__in=changed).delete()
+        SimilarListing.objects.bulk_create([
+            SimilarListing(listing_id=listing_id, similar_id=similar_id, score=score)
+            for listing_id, top in changed.items()
+            for similar_id, score in top.items()
+        ])
+    return shrunk
+
+
+def _sources():
+    """(watermark name, queryset, listing id field) of every table whose new rows change a score."""
+    yield "listing", Listing.objects.all(), "id"
+    for alias in sharding.shard_aliases():
+        yield f"bid:{alias}", Bid.objects.using(alias), "listing_id"
+    yield "watchlist", Watchlist.objects.all(), "listing_id"
+
+
+def heavy_watchers():
+    return list(
+        Watchlist.objects.values("user_id").annotate(count=Count("listing_id", distinct=True))
+        .filter(count__gt=MAX_USER_WATCHES).order_by().values_list("user_id", flat=True)
+    )
+
+
+def refresh_full(k):
+    """Rescore every listing, a transaction per CHUNK_SIZE listings. Returns how many there were."""
+    # Rows added from here on are left to the next incremental refresh
+    with transaction.atomic():
+        for name, queryset, _ in _sources():
+            last_id = queryset.aggregate(last_id=Max("id"))["last_id"] or 0
+            RecommendationWatermark.objects.update_or_create(name=name, defaults={"last_id": last_id})
+
+    listing_ids = list(Listing.objects.order_by("pk").values_list("pk", flat=True))
+    # Every popularity row first, since similarity reads their watcher counts
+    for start in range(0, len(listing_ids), CHUNK_SIZE):
+        with transaction.atomic():
+            rescore_popularity(listing_ids[start:start + CHUNK_SIZE])
+    heavy_users = heavy_watchers()
+    for start in range(0, len(listing_ids), CHUNK_SIZE):
+        with transaction.atomic():
+            # Every list gets rebuilt, so the scores to merge into the others are dropped
+            rescore_similar(listing_ids[start:start + CHUNK_SIZE], heavy_users, k)
+    return len(listing_ids)
+
+
+def refresh(full=False, k=None):
+    """
+    Rescore the listings changed since the last refresh, or every listing if `full`,
+    keeping SIMILAR_SPARES times `k` similar listings each. Returns (listings rescored
+    for popularity, listings rescored for similarity).
+    """
+    k = (k or settings.RECOMMENDATIONS_K) * SIMILAR_SPARES
+    if full:
+        rescored = refresh_full(k)
+        return rescored, rescored
+
+    heavy_users = None
+
+    def rescore_watched(listing_ids):
+        # Listings whose watchers changed, or that closed
+        nonlocal heavy_users
+        if heavy_users is None:
+            heavy_users = heavy_watchers()
+        rescore_popularity(listing_ids)
+        reverse = rescore_similar(listing_ids, heavy_users, k)
+        # Lists left short by a closed or unwatched listing are refilled from scratch
+        shrunk = merge_similar(set(listing_ids), reverse, k)
+        rescore_similar(shrunk, heavy_users, k)
+
+    def rescore_counts(listing_ids):
+        # Bids and new listings don't change similarity, which a stale flag still asks for
+        rescore_popularity(listing_ids, clear_stale=False)
+
+    popular = set()
+    watched = set()
+    for name, queryset, field in _sources():
+        rescore = rescore_watched if name == "watchlist" else rescore_counts
+        rescored = _rescore_new_rows(name, queryset, field, rescore)
+        (watched if name == "watchlist" else popular).update(rescored)
+    while True:
+        # Rescoring clears the flag
+        stale = list(
+            ListingPopularity.objects.filter(stale=True).order_by("listing_id")
+            .values_list("listing_id", flat=True)[:CHUNK_SIZE]
+        )
+        if not stale:
+            break
+        with transaction.atomic():
+            rescore_watched(stale)
+        watched.update(stale)
+    return len(popular | watched), len(watched)
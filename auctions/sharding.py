@@ -0,0 +1,250 @@
+"""
+Bids and comments sharded by listing across database aliases.
+
+settings.AUCTION_SHARDS lists the aliases, "default" first. A listing's bids and
+comments live on AUCTION_SHARDS[jump_hash(listing_id)]; every other table stays
+on "default". Jump consistent hashing makes the list growable: appending an
+alias only moves the listings that now hash to it.
+
+Changing the layout:
+1. add the new aliases to DATABASES and run `manage.py migrate --database <alias>`
+   (shards only get the bid and comment tables);
+2. deploy the new AUCTION_SHARDS with AUCTION_SHARDS_PREVIOUS set to the old one,
+   so a listing keeps being read and written on its old shard until it has moved;
+3. run `manage.py rebalance_shards`, then deploy without AUCTION_SHARDS_PREVIOUS.
+
+Databases can't join or enforce foreign keys across aliases, so:
+- Bid and Comment foreign keys have db_constraint=False, which migration 0020
+  only applies on shard aliases; "default" keeps its constraints. Deleting a
+  listing or a user deletes their rows on the other shards through the signals below.
+- ShardRouter routes queries that carry a listing: related managers
+  (listing.bids), saved instances and the helpers here. Anything else, such as
+  Bid.objects.filter(bidder=user), only sees the "default" shard; use the
+  cross-shard helpers instead of joins. The Bid and Comment admins show one
+  shard at a time.
+- Each shard hands out bid and comment ids from its own range (id_base()), so
+  an id names one row across every shard.
+- A shard's writes commit separately from "default"'s. Callers open the shard's
+  transaction inside the default one, so the shard commits first.
+
+With a single alias every helper resolves to "default" and joins are kept.
+A single PostgreSQL server gets the same data layout without these limits from
+declarative partitioning (PARTITION BY HASH (listing_id)); aliases are for
+spreading bids and comments over several servers.
+"""
+import heapq
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Count, Max
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+
+from .models import Bid, Comment, Listing, User
+
+SHARDED_MODELS = ("auctions.bid", "auctions.comment")
+
+# Rows fetched per alias by the cross-shard user helpers
+USER_ROWS_LIMIT = 20
+
+# Ids per shard: the nth alias of settings.SHARD_ALIASES numbers its rows from n * SHARD_ID_SPAN
+SHARD_ID_SPAN = 2 ** 40
+
+# Listings known to have left their shard under AUCTION_SHARDS_PREVIOUS, see listing_db()
+MOVED_CACHE_SIZE = 100000
+_moved = {"layout": None, "ids": set()}
+
+
+def jump_hash(key, buckets):
+    """Jump consistent hash (Lamping & Veach): growing from n to n + 1 buckets moves 1/(n + 1) of the keys."""
+    bucket, jump = -1, 0
+    while jump < buckets:
+        bucket = jump
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        jump = int((bucket + 1) * (float(1 << 31) / float((key >> 33) + 1)))
+    return bucket
+
+
+def shard_for(listing_id, shards=None):
+    """The alias `listing_id`'s rows belong on under `shards` (default: AUCTION_SHARDS)."""
+    shards = shards or settings.AUCTION_SHARDS
+    return shards[jump_hash(listing_id, len(shards))]
+
+
+def is_sharded():
+    return len(settings.AUCTION_SHARDS) > 1 or bool(settings.AUCTION_SHARDS_PREVIOUS)
+
+
+def shard_aliases():
+    """Every alias that may hold bids or comments, current layout first."""
+    return list(dict.fromkeys([*settings.AUCTION_SHARDS, *(settings.AUCTION_SHARDS_PREVIOUS or [])]))
+
+
+def id_base(alias):
+    """Bids and comments on `alias` get ids above this (migration 0027); "default"'s is 0."""
+    return settings.SHARD_ALIASES.index(alias) * SHARD_ID_SPAN
+
+
+def local_id(pk):
+    """A bid or comment id without its shard's base, comparable across shards."""
+    return pk % SHARD_ID_SPAN
+
+
+def holds_listing(alias, listing_id):
+    return any(model.objects.using(alias).filter(listing_id=listing_id).exists() for model in (Bid, Comment))
+
+
+def listing_db(listing_id):
+    """The alias holding `listing_id`'s bids and comments right now."""
+    alias = shard_for(listing_id)
+    previous = settings.AUCTION_SHARDS_PREVIOUS
+    if previous:
+        # Mid-rebalance a listing stays on its old shard until rebalance_shards has moved all its rows
+        old = shard_for(listing_id, previous)
+        if old != alias and not _known_moved(previous, listing_id):
+            if holds_listing(old, listing_id):
+                return old
+            # Rows only ever leave the old shard, so the next call can skip the lookup
+            _remember_moved(previous, listing_id)
+    return alias
+
+
+def _known_moved(previous, listing_id):
+    return _moved["layout"] == previous and listing_id in _moved["ids"]
+
+
+def _remember_moved(previous, listing_id):
+    if _moved["layout"] != previous or len(_moved["ids"]) >= MOVED_CACHE_SIZE:
+        _moved["layout"], _moved["ids"] = list(previous), set()
+    _moved["ids"].add(listing_id)
+
+
+def for_listing(model, listing_id):
+    """`model`'s rows (Bid or Comment) for one listing, on the shard holding them."""
+    return model.objects.using(listing_db(listing_id)).filter(listing_id=listing_id)
+
+
+def batches(listing_ids):
+    """Yield (alias, listing ids) covering `listing_ids`, sized for each backend's query parameter limit."""
+    if settings.AUCTION_SHARDS_PREVIOUS:
+        # Rows may be on either layout; asking every alias is cheaper than locating each listing
+        groups = {alias: listing_ids for alias in shard_aliases()}
+    else:
+        groups = defaultdict(list)
+        for listing_id in listing_ids:
+            groups[shard_for(listing_id)].append(listing_id)
+    for alias, ids in groups.items():
+        size = connections[alias].features.max_query_params or len(ids) or 1
+        for start in range(0, len(ids), size):
+            yield alias, ids[start:start + size]
+
+
+def top_bids(listing_ids):
+    """{listing_id: highest bid} for those of `listing_ids` that have bids, one query per shard batch."""
+    top = {}
+    for alias, ids in batches(listing_ids):
+        rows = Bid.objects.using(alias).filter(listing_id__in=ids).values("listing_id").annotate(top=Max("amount"))
+        for row in rows.order_by():
+            top[row["listing_id"]] = max(row["top"], top.get(row["listing_id"], row["top"]))
+    return top
+
+
+def bid_counts(listing_ids):
+    """{listing_id: number of bids} for those of `listing_ids` that have bids, one query per shard batch."""
+    counts = defaultdict(int)
+    for alias, ids in batches(listing_ids):
+        rows = Bid.objects.using(alias).filter(listing_id__in=ids).values("listing_id").annotate(count=Count("id"))
+        for row in rows.order_by():
+            counts[row["listing_id"]] += row["count"]
+    return counts
+
+
+def top_bidders(listing_ids):
+    """{listing_id: bidder_id of the highest bid} for those of `listing_ids` that have bids."""
+    bidders = {}
+    for alias, ids in batches(listing_ids):
+        # One ordered scan per batch: a correlated subquery would run once per bid, not per listing.
+        # Earliest of equal bids wins, as in close_listings().
+        rows = Bid.objects.using(alias).filter(listing_id__in=ids).order_by("listing_id", "-amount", "id")
+        for listing_id, bidder_id in rows.values_list("listing_id", "bidder_id").iterator():
+            bidders.setdefault(listing_id, bidder_id)
+    return bidders
+
+
+def with_top_bids(listings, *fields):
+    """
+    values(*fields) rows of the `listings` queryset, each with "top_bid": its highest
+    bid or None. `fields` must include "id".
+    """
+    if not is_sharded():
+        # Bids sit next to the listings, so the database joins them
+        return listings.annotate(top_bid=Max("bids__amount")).values(*fields, "top_bid")
+    rows = list(listings.values(*fields))
+    top = top_bids([row["id"] for row in rows])
+    for row in rows:
+        row["top_bid"] = top.get(row["id"])
+    return rows
+
+
+def for_user(model, field, user_id, limit=USER_ROWS_LIMIT):
+    """The newest `limit` rows of `model` whose `field` is `user_id`, gathered from every shard."""
+    # Shards number rows from their own base, so "newest" is only exact within a shard;
+    # rows are interleaved by their id within it
+    per_shard = [
+        list(model.objects.using(alias).filter(**{field: user_id}).order_by("-id")[:limit])
+        for alias in shard_aliases()
+    ]
+    return list(heapq.merge(*per_shard, key=lambda row: local_id(row.pk), reverse=True))[:limit]
+
+
+def usernames(user_ids):
+    """{user_id: username}, the join bids and comments can't make across aliases."""
+    user_ids = set(user_ids)
+    return dict(User.objects.filter(pk__in=user_ids).values_list("id", "username")) if user_ids else {}
+
+
+class ShardRouter:
+    """Routes Bid and Comment queries to the shard of the listing they carry; everything else to "default"."""
+
+    def _listing_id(self, hints):
+        instance = hints.get("instance")
+        if isinstance(instance, Listing):
+            return instance.pk
+        return getattr(instance, "listing_id", None)
+
+    def db_for_read(self, model, **hints):
+        if model._meta.label_lower not in SHARDED_MODELS:
+            return "default"
+        listing_id = self._listing_id(hints)
+        return listing_db(listing_id) if listing_id is not None else None
+
+    db_for_write = db_for_read
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if obj1._meta.label_lower in SHARDED_MODELS or obj2._meta.label_lower in SHARDED_MODELS:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == "default":
+            return True
+        # Shards only hold the sharded tables
+        return f"{app_label}.{model_name}" in SHARDED_MODELS
+
+
+@receiver(pre_delete, sender=Listing)
+def delete_listing_rows(sender, instance, using, **kwargs):
+    # Django's cascade only reaches the rows on `using`
+    for alias in shard_aliases():
+        if alias != using:
+            for model in (Bid, Comment):
+                model.objects.using(alias).filter(listing_id=instance.pk).delete()
+
+
+@receiver(pre_delete, sender=User)
+def delete_user_rows(sender, instance, using, **kwargs):
+    for alias in shard_aliases():
+        if alias != using:
+            Bid.objects.using(alias).filter(bidder_id=instance.pk).delete()
+            Comment.objects.using(alias).filter(author_id=instance.pk).delete()
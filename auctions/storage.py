@@ -0,0 +1,62 @@
+"""
+Static files storage that fingerprints files and precompresses them.
+
+collectstatic writes every file under a content-hashed name (via the manifest)
+and adds .gz and, when the brotli package is installed, .br siblings for text
+assets so the web server can send them without compressing on the fly.
+"""
+import gzip
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = {".css", ".js", ".svg", ".txt", ".html", ".json"}
+
+# Below this size the compressed file usually isn't smaller once headers are counted
+MIN_COMPRESS_SIZE = 256
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+
+    def stored_name(self, name):
+        # In development, before collectstatic has produced a manifest, serve the plain name.
+        # Without DEBUG a missing manifest is a deployment error and must not go unnoticed.
+        if not self.hashed_files and settings.DEBUG:
+            return name
+        return super().stored_name(name)
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+
+        if dry_run:
+            return
+
+        # hashed_files now holds the final names; intermediate passes may have yielded others
+        for hashed_name in set(self.hashed_files.values()):
+            if os.path.splitext(hashed_name)[1] in COMPRESSIBLE_EXTENSIONS:
+                self.compress(hashed_name)
+
+    def compress(self, name):
+        """Write .gz/.br variants next to `name`. Hashed names never change, so existing ones are kept."""
+        path = self.path(name)
+        with open(path, "rb") as f:
+            data = f.read()
+        if len(data) < MIN_COMPRESS_SIZE:
+            return
+
+        variants = [(".gz", lambda: gzip.compress(data, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            variants.append((".br", lambda: brotli.compress(data, quality=11)))
+
+        for extension, compressor in variants:
+            if not os.path.exists(path + extension):
+                compressed = compressor()
+                if len(compressed) < len(data):
+                    with open(path + extension, "wb") as f:
+                        f.write(compressed)
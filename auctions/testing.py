@@ -0,0 +1,369 @@
+"""
+Test data at realistic volume, and query budgets for the views.
+
+The factories bulk-create users, listings, bids, comments and watches with the
+skew real auctions show: a few hot listings draw most of the bids and watches, a
+few power sellers own most listings and a few heavy watchers follow hundreds of
+them. Ranks are drawn from a Zipf-like distribution (weight 1 / rank ** skew)
+over a shuffled order, so the hot rows aren't simply the lowest ids. Bids go to
+their listing's shard and rise by valid bid steps, closed listings get their
+winner, and create_dataset() rebuilds the UserActivity projection afterwards, so
+every view sees consistent data. Nothing is written to the event log; call
+events.backfill() when a test needs it.
+
+query_budget() fails a test when a block runs more than N queries or takes more
+than M milliseconds:
+
+    with query_budget(queries=8, ms=200):
+        client.get("/")
+
+    @query_budget(queries=3)
+    def test_close(self): ...
+
+Queries are counted on every alias holding bids and comments, so a test reading
+shards needs `databases = "__all__"`, as AuctionTestCase sets. ScalingTestCase
+checks that a page runs as many queries after its data grows as before.
+"""
+import random
+import time
+from collections import Counter, namedtuple
+from contextlib import ContextDecorator
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import connections
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import activity, recommendations, sharding
+from .livestate import live_auctions
+from .models import Bid, CATEGORY_CHOICES, Comment, Listing, ProxyBid, User, Watchlist
+from .proxy import bid_step
+from .utils import set_winners
+
+# Row counts per data scale
+SCALES = {
+    "small": {"users": 30, "listings": 60, "bids": 600, "comments": 100, "watches": 300},
+    "medium": {"users": 300, "listings": 600, "bids": 6000, "comments": 1000, "watches": 3000},
+    "large": {"users": 2000, "listings": 20000, "bids": 200000, "comments": 10000, "watches": 50000},
+}
+
+# Zipf exponents: how strongly bids and watches pile onto the top ranks
+LISTING_SKEW = 1.1
+USER_SKEW = 1.0
+
+# Share of the listings still open
+ACTIVE_SHARE = 0.8
+
+# Password of every generated user, for tests that log in through the form
+PASSWORD = "password"
+
+Dataset = namedtuple("Dataset", "users listings active hot_listings sellers bidders watchers")
+Dataset.__doc__ = """
+Ids created by create_dataset(). `active` is a set; hot_listings, sellers, bidders
+and watchers are ordered by their number of bids, listings, bids and watches.
+"""
+
+
+def zipf_weights(count, skew):
+    return [1 / (rank + 1) ** skew for rank in range(count)]
+
+
+def ranked(ids, skew, rng):
+    """(ids, weights): `ids` shuffled, weighted by rank."""
+    ids = list(ids)
+    rng.shuffle(ids)
+    return ids, zipf_weights(len(ids), skew)
+
+
+def _last_id(model):
+    return model.objects.order_by("-pk").values_list("pk", flat=True).first() or 0
+
+
+def create_users(count, prefix="user"):
+    """Bulk-create `count` users named "<prefix>-<n>", all with PASSWORD. Returns their ids."""
+    last_id = _last_id(User)
+    password = make_password(PASSWORD)
+    User.objects.bulk_create([
+        User(username=f"{prefix}-{index}", email=f"{prefix}-{index}@example.com", password=password)
+        for index in range(count)
+    ])
+    return list(User.objects.filter(pk__gt=last_id).order_by("pk").values_list("pk", flat=True))
+
+
+def create_listings(count, owner_ids, active_share=ACTIVE_SHARE, seed=1):
+    """Bulk-create `count` listings, most of them owned by a few power sellers. Returns their ids."""
+    rng = random.Random(seed)
+    owners, weights = ranked(owner_ids, USER_SKEW, rng)
+    categories = [name for name, _ in CATEGORY_CHOICES] + [None]
+    last_id = _last_id(Listing)
+    Listing.objects.bulk_create([
+        Listing(
+            title=f"Listing {index}", description=f"Description of listing {index}",
+            starting_bid=rng.randint(1, 200), category=rng.choice(categories),
+            owner_id=owner_id, is_active=rng.random() < active_share,
+        )
+        for index, owner_id in enumerate(rng.choices(owners, weights, k=count))
+    ])
+    return list(Listing.objects.filter(pk__gt=last_id).order_by("pk").values_list("pk", flat=True))
+
+
+def create_bids(count, listing_ids, bidder_ids, skew=LISTING_SKEW, seed=1):
+    """
+    Bulk-create `count` bids over `listing_ids`, hot listings drawing most of them.
+    Each listing's bids rise by one to three bid steps over its current price, from
+    bidders other than the owner, and land on the listing's shard. Winners of closed
+    listings are set from their new top bids. Returns {listing_id: bids created}.
+    """
+    rng = random.Random(seed)
+    listings, listing_weights = ranked(listing_ids, skew, rng)
+    bidders, bidder_weights = ranked(bidder_ids, USER_SKEW, rng)
+    per_listing = Counter(rng.choices(listings, listing_weights, k=count))
+
+    wanted = set(per_listing)
+    rows = Listing.objects.values_list("id", "owner_id", "starting_bid", "is_active")
+    owners = {listing_id: row for listing_id, *row in rows if listing_id in wanted}
+    prices = sharding.top_bids(list(wanted))
+    now = timezone.now()
+    by_alias = {}
+    for listing_id, bids in sorted(per_listing.items()):
+        owner_id, starting_bid, _ = owners[listing_id]
+        price = prices.get(listing_id) or int(starting_bid)
+        for index in range(bids):
+            price += bid_step(price) * rng.randint(1, 3)
+            bidder_id = owner_id
+            while bidder_id == owner_id and len(bidders) > 1:
+                bidder_id = rng.choices(bidders, bidder_weights)[0]
+            by_alias.setdefault(sharding.listing_db(listing_id), []).append(Bid(
+                amount=price, bidder_id=bidder_id, listing_id=listing_id,
+                placed_at=now - timedelta(minutes=bids - index),
+            ))
+    for alias, bids in by_alias.items():
+        Bid.objects.using(alias).bulk_create(bids)
+
+    closed = [listing_id for listing_id, (_, _, is_active) in owners.items() if not is_active]
+    set_winners(sharding.top_bidders(closed))
+    return dict(per_listing)
+
+
+def create_comments(count, listing_ids, author_ids, skew=LISTING_SKEW, seed=1):
+    """Bulk-create `count` comments, hot listings drawing most of them."""
+    rng = random.Random(seed)
+    listings, listing_weights = ranked(listing_ids, skew, rng)
+    authors, author_weights = ranked(author_ids, USER_SKEW, rng)
+    by_alias = {}
+    for index, listing_id in enumerate(rng.choices(listings, listing_weights, k=count)):
+        by_alias.setdefault(sharding.listing_db(listing_id), []).append(Comment(
+            text=f"Comment {index}", author_id=rng.choices(authors, author_weights)[0], listing_id=listing_id,
+        ))
+    for alias, comments in by_alias.items():
+        Comment.objects.using(alias).bulk_create(comments)
+
+
+def create_watches(count, listing_ids, user_ids, skew=LISTING_SKEW, seed=1):
+    """
+    Bulk-create up to `count` watches: a few heavy watchers follow most listings and
+    hot listings are the most watched. Pairs already watched are skipped, so heavily
+    skewed inputs may yield fewer watches. Returns {user_id: watches created}.
+    """
+    rng = random.Random(seed)
+    listings, listing_weights = ranked(listing_ids, skew, rng)
+    users, user_weights = ranked(user_ids, USER_SKEW, rng)
+    pairs = set(Watchlist.objects.values_list("user_id", "listing_id"))
+    rows = []
+    for _ in range(count * 10):
+        pair = (rng.choices(users, user_weights)[0], rng.choices(listings, listing_weights)[0])
+        if pair not in pairs:
+            pairs.add(pair)
+            rows.append(Watchlist(user_id=pair[0], listing_id=pair[1]))
+            if len(rows) == count:
+                break
+    Watchlist.objects.bulk_create(rows)
+    return dict(Counter(row.user_id for row in rows))
+
+
+def create_proxies(count, listing_ids, user_ids, skew=LISTING_SKEW, seed=1):
+    """
+    Bulk-create up to `count` proxy bids, hot listings drawing most of them, each
+    with a maximum up to twice the listing's current price. Owners and pairs that
+    already have a proxy are skipped.
+    """
+    rng = random.Random(seed)
+    listings, listing_weights = ranked(listing_ids, skew, rng)
+    users, user_weights = ranked(user_ids, USER_SKEW, rng)
+    owners = dict(Listing.objects.values_list("id", "owner_id"))
+    prices = {**dict(Listing.objects.values_list("id", "starting_bid")), **sharding.top_bids(list(set(listings)))}
+    pairs = set(ProxyBid.objects.values_list("user_id", "listing_id"))
+    rows = []
+    for _ in range(count * 10):
+        pair = (rng.choices(users, user_weights)[0], rng.choices(listings, listing_weights)[0])
+        if pair not in pairs and owners[pair[1]] != pair[0]:
+            pairs.add(pair)
+            price = int(prices[pair[1]])
+            rows.append(ProxyBid(user_id=pair[0], listing_id=pair[1], max_amount=price + rng.randint(1, price + 1)))
+            if len(rows) == count:
+                break
+    ProxyBid.objects.bulk_create(rows)
+
+
+def create_dataset(scale="small", seed=1, **counts):
+    """
+    Create a whole auction site at `scale` (a SCALES key), overriding any row count
+    with `counts`, and rebuild the activity projection. Usernames carry `seed`, so
+    datasets with different seeds can be stacked. Returns a Dataset.
+    """
+    counts = {**SCALES[scale], **counts}
+    user_ids = create_users(counts["users"], prefix=f"user{seed}")
+    listing_ids = create_listings(counts["listings"], user_ids, seed=seed)
+    bids = create_bids(counts["bids"], listing_ids, user_ids, seed=seed)
+    create_comments(counts["comments"], listing_ids, user_ids, seed=seed)
+    watches = create_watches(counts["watches"], listing_ids, user_ids, seed=seed)
+    activity.rebuild()
+    live_auctions.clear()
+
+    rows = Listing.objects.filter(pk__in=listing_ids).values_list("id", "owner_id", "is_active")
+    owners, active = Counter(), set()
+    for listing_id, owner_id, is_active in rows.iterator():
+        owners[owner_id] += 1
+        if is_active:
+            active.add(listing_id)
+    bidders = Counter()
+    for alias in sharding.shard_aliases():
+        for bidder_id in Bid.objects.using(alias).filter(bidder_id__in=user_ids).values_list("bidder_id", flat=True):
+            bidders[bidder_id] += 1
+
+    def by_count(counter):
+        return [key for key, _ in sorted(counter.items(), key=lambda item: (-item[1], item[0]))]
+
+    return Dataset(
+        users=user_ids, listings=listing_ids, active=active, hot_listings=by_count(Counter(bids)),
+        sellers=by_count(owners), bidders=by_count(bidders), watchers=by_count(Counter(watches)),
+    )
+
+
+class query_budget(ContextDecorator):
+    """
+    Fail with AssertionError, listing the queries run, when the block runs more than
+    `queries` queries over `aliases` (every alias holding bids and comments by default)
+    or takes more than `ms` milliseconds. Time budgets are multiplied by
+    settings.QUERY_BUDGET_TIME_FACTOR, for slow machines. Either budget may be None.
+    After the block, len() of the budget is the number of queries run.
+    """
+
+    def __init__(self, queries=None, ms=None, aliases=None):
+        self.queries = queries
+        self.ms = ms
+        self.aliases = aliases
+        self.captured_queries = []
+        self.elapsed = 0
+
+    def __enter__(self):
+        self.contexts = []
+        for alias in self.aliases or sharding.shard_aliases():
+            connection = connections[alias]
+            # The query log is capped, and CaptureQueriesContext counts from its length
+            connection.queries_log.clear()
+            self.contexts.append(CaptureQueriesContext(connection))
+        for context in self.contexts:
+            context.__enter__()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.elapsed = (time.perf_counter() - self.start) * 1000
+        for context in self.contexts:
+            context.__exit__(exc_type, exc_value, traceback)
+        self.captured_queries = [query for context in self.contexts for query in context.captured_queries]
+        if exc_type is not None:
+            return False
+
+        if self.queries is not None and len(self) > self.queries:
+            sql = "\n".join(f"{index}. {query['sql']}" for index, query in enumerate(self.captured_queries, 1))
+            raise AssertionError(f"{len(self)} queries run, over the budget of {self.queries}:\n{sql}")
+        if self.ms is not None:
+            ms = self.ms * settings.QUERY_BUDGET_TIME_FACTOR
+            if self.elapsed > ms:
+                raise AssertionError(f"took {self.elapsed:.0f} ms, over the budget of {ms:.0f} ms")
+        return False
+
+    def __len__(self):
+        return len(self.captured_queries)
+
+
+def logged_in(user_id):
+    client = Client()
+    if user_id is not None:
+        client.force_login(User.objects.get(pk=user_id))
+    return client
+
+
+def fetch(client, method, path, data=None):
+    """Make a request and read the whole response, streamed or not."""
+    response = getattr(client, method)(path, data or {})
+    if response.streaming:
+        b"".join(response.streaming_content)
+    return response
+
+
+class AuctionTestCase(TestCase):
+    """A TestCase over every database alias, starting each test with empty per-process caches."""
+
+    databases = "__all__"
+
+    def setUp(self):
+        # Rate limits, cached users and auction states must not leak between tests
+        cache.clear()
+        live_auctions.clear()
+
+
+class ScalingTestCase(AuctionTestCase):
+    """
+    Starts from a "small" dataset; grow() stacks a "medium" one on top and piles more
+    bids, comments, watches and listings onto the rows the tests look at.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = create_dataset("small")
+        recommendations.refresh(full=True)
+
+    def grow(self):
+        data = self.data
+        more = create_dataset("medium", seed=2)
+        hot_listing = data.hot_listings[0]
+        create_bids(300, [hot_listing], more.users, seed=2)
+        create_comments(300, [hot_listing], more.users, seed=2)
+        create_watches(300, more.listings, [data.watchers[0]], seed=2)
+        create_listings(100, [data.sellers[0]], seed=2)
+        create_bids(300, more.listings, [data.bidders[0]], seed=3)
+        activity.rebuild()
+        recommendations.refresh(full=True)
+        live_auctions.clear()
+
+    def count_queries(self, func):
+        # Warm the cached user and auction states first, so runs before and after grow() start alike
+        func()
+        with query_budget() as budget:
+            func()
+        return budget
+
+    def assertConstantQueries(self, *funcs):
+        """Each of `funcs` runs as many queries after grow() as before."""
+        before = [len(self.count_queries(func)) for func in funcs]
+        self.grow()
+        for func, count in zip(funcs, before):
+            after = self.count_queries(func)
+            self.assertEqual(
+                len(after), count,
+                "queries grew with the data:\n" + "\n".join(query["sql"] for query in after.captured_queries),
+            )
+
+    def page(self, path, user_id=None):
+        client = logged_in(user_id)
+        return lambda: self.assertEqual(fetch(client, "get", path).status_code, 200)
+
+    def assertConstantPageQueries(self, path, user_id=None):
+        self.assertConstantQueries(self.page(path, user_id))
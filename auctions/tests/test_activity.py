@@ -0,0 +1,84 @@
+from importlib import import_module
+from types import SimpleNamespace
+
+from django.apps import apps
+from django.db import connection
+from django.urls import reverse
+
+from .. import activity
+from ..models import Bid, Listing, User, UserActivity, Watchlist
+from ..sharding import listing_db
+from ..testing import AuctionTestCase, create_dataset, logged_in
+
+backfill = import_module("auctions.migrations.0024_backfill_useractivity").backfill
+
+
+def projection():
+    return set(UserActivity.objects.values_list("user_id", "listing_id", "relation", "price", "last_bid", "status"))
+
+
+class ActivityTests(AuctionTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = create_dataset("small", listings=20, bids=200, watches=100)
+        cls.admin = User.objects.create_superuser("admin", "admin@example.com", "password")
+
+    def test_migration_backfills_an_empty_table(self):
+        expected = projection()
+        UserActivity.objects.all().delete()
+        backfill(apps, SimpleNamespace(connection=connection))
+        self.assertEqual(projection(), expected)
+
+    def test_migration_leaves_a_maintained_table_alone(self):
+        UserActivity.objects.exclude(relation="selling").delete()
+        expected = projection()
+        backfill(apps, SimpleNamespace(connection=connection))
+        self.assertEqual(projection(), expected)
+
+    def test_rebuild_listings_matches_a_full_rebuild(self):
+        expected = projection()
+        listing_ids = self.data.hot_listings[:3]
+        UserActivity.objects.filter(listing_id__in=listing_ids).update(status="lost", price=1)
+        activity.rebuild_listings(listing_ids)
+        self.assertEqual(projection(), expected)
+
+    def assertProjectionMatchesSources(self):
+        current = projection()
+        activity.rebuild()
+        self.assertEqual(current, projection())
+
+    def test_admin_listing_edit(self):
+        listing = Listing.objects.get(pk=self.data.hot_listings[0])
+        client = logged_in(self.admin.pk)
+        response = client.post(reverse("admin:auctions_listing_change", args=[listing.pk]), {
+            "title": listing.title, "description": listing.description, "starting_bid": listing.starting_bid,
+            "thumbnail": "", "category": listing.category or "", "owner": listing.owner_id,
+            "winner": self.data.bidders[0], "version": listing.version,
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertProjectionMatchesSources()
+
+    def test_admin_bid_edit(self):
+        # Moved between two listings on the same database
+        source, target = [listing_id for listing_id in self.data.hot_listings if listing_db(listing_id) == "default"][:2]
+        bid = Bid.objects.filter(listing_id=source).order_by("-amount").first()
+        client = logged_in(self.admin.pk)
+        response = client.post(reverse("admin:auctions_bid_change", args=[bid.pk]), {
+            "amount": bid.amount + 1000, "bidder": bid.bidder_id, "listing": target,
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertProjectionMatchesSources()
+
+    def test_admin_watch_edits(self):
+        client = logged_in(self.admin.pk)
+        user_id, listing_id = self.data.users[-1], self.data.listings[-1]
+        Watchlist.objects.filter(user_id=user_id, listing_id=listing_id).delete()
+        activity.rebuild()
+        client.post(reverse("admin:auctions_watchlist_add"), {"user": user_id, "listing": listing_id})
+        self.assertProjectionMatchesSources()
+
+        watch = Watchlist.objects.get(user_id=user_id, listing_id=listing_id)
+        client.post(reverse("admin:auctions_watchlist_delete", args=[watch.pk]), {"post": "yes"})
+        self.assertFalse(Watchlist.objects.filter(pk=watch.pk).exists())
+        self.assertProjectionMatchesSources()
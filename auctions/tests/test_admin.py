@@ -0,0 +1,75 @@
+from unittest import skipUnless
+
+from django.db import connection
+from django.urls import reverse
+
+from .. import events
+from ..models import Comment, Listing, User
+from ..testing import PASSWORD, AuctionTestCase, ScalingTestCase, create_dataset, create_proxies, logged_in
+
+
+class AdminQueryTests(ScalingTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.admin = User.objects.create_superuser("admin", "admin@example.com", PASSWORD)
+        create_proxies(50, cls.data.listings, cls.data.users)
+        events.backfill()
+
+    def grow(self):
+        super().grow()
+        create_proxies(1000, Listing.objects.values_list("pk", flat=True), User.objects.values_list("pk", flat=True))
+        events.backfill()
+
+    def test_changelists(self):
+        self.assertConstantQueries(*[
+            self.page(reverse(f"admin:auctions_{model}_changelist"), self.admin.pk)
+            for model in ("listing", "bid", "proxybid", "comment", "watchlist", "auctionevent", "user")
+        ])
+
+    def test_listing_change_page(self):
+        path = reverse("admin:auctions_listing_change", args=[self.data.hot_listings[0]])
+        self.assertConstantPageQueries(path, self.admin.pk)
+
+    def test_user_change_page(self):
+        path = reverse("admin:auctions_user_change", args=[self.data.sellers[0]])
+        self.assertConstantPageQueries(path, self.admin.pk)
+
+
+
+class AdminSearchTests(AuctionTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = create_dataset("small", listings=20, bids=50, comments=50)
+        cls.admin = User.objects.create_superuser("admin", "admin@example.com", PASSWORD)
+        Listing.objects.filter(pk=cls.data.listings[0]).update(title="Brass Lamp", description="A rare lamp from 1920")
+
+    def changelist(self, model, **params):
+        response = logged_in(self.admin.pk).get(reverse(f"admin:auctions_{model}_changelist"), params)
+        self.assertEqual(response.status_code, 200)
+        return [obj.pk for obj in response.context["cl"].result_list]
+
+    @skipUnless(connection.vendor == "sqlite", "checks SQLite's query plan")
+    def test_prefix_searches_use_the_case_insensitive_indexes(self):
+        for queryset, index in (
+            (Listing.objects.filter(title__istartswith="bra"), "auctions_listing_title_ci"),
+            (User.objects.filter(username__istartswith="user1"), "auctions_user_username_ci"),
+            (User.objects.filter(email__istartswith="user1"), "auctions_user_email_ci"),
+        ):
+            with self.subTest(index=index):
+                self.assertIn(f"USING INDEX {index}", queryset.explain())
+
+    def test_search_box_matches_title_prefixes(self):
+        self.assertEqual(self.changelist("listing", q="brass"), [self.data.listings[0]])
+        self.assertEqual(self.changelist("listing", q="lamp"), [])
+
+    def test_text_filters(self):
+        self.assertEqual(self.changelist("listing", contains="RARE LAMP"), [self.data.listings[0]])
+        books = Listing.objects.filter(category="Books").count()
+        self.assertEqual(len(self.changelist("listing", contains="book")), books)
+
+        comment = Comment.objects.using("default").order_by("pk").first()
+        Comment.objects.using("default").filter(pk=comment.pk).update(text="Is the shipping free?")
+        self.assertEqual(self.changelist("comment", contains="shipping"), [comment.pk])
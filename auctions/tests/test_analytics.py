@@ -0,0 +1,85 @@
+import csv
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from unittest import skipIf
+
+from .. import analytics
+from ..models import Bid, Listing
+from ..sharding import listing_db
+from ..testing import AuctionTestCase, create_users
+
+
+def read_csv(paths, name):
+    path = next(path for path in paths if os.path.basename(path) == name)
+    with open(path, newline="") as f:
+        return list(csv.DictReader(f))
+
+
+@skipIf(analytics.np is None, "NumPy is not installed")
+class AnalyticsTests(AuctionTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        seller_id, cls.alice_id, cls.bob_id = create_users(3)
+
+        def listing(category, is_active=True, winner_id=None):
+            return Listing.objects.create(
+                title="Lamp", description="", starting_bid=100, category=category,
+                owner_id=seller_id, is_active=is_active, winner_id=winner_id,
+            ).pk
+
+        cls.sold = listing("Home", is_active=False, winner_id=cls.alice_id)
+        cls.unsold = listing("Home", is_active=False)
+        cls.open = listing(None)
+        cls.retired = listing("Antiques")
+
+        minute = datetime(2026, 1, 1, 12, 30, 15, tzinfo=timezone.utc)
+
+        def bid(listing_id, bidder_id, amount):
+            Bid.objects.using(listing_db(listing_id)).create(
+                listing_id=listing_id, bidder_id=bidder_id, amount=amount, placed_at=minute,
+            )
+
+        bid(cls.sold, cls.alice_id, 150)
+        bid(cls.sold, cls.bob_id, 120)
+        bid(cls.retired, cls.bob_id, 200)
+        # Large enough that float64 sums would round
+        bid(cls.open, cls.bob_id, 2 ** 53 + 1)
+
+    def setUp(self):
+        super().setUp()
+        self.output = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output)
+
+    def test_categories(self):
+        for chunk_size in (1, 100):
+            with self.subTest(chunk_size=chunk_size):
+                _, categories = analytics.collect(chunk_size=chunk_size)
+                self.assertEqual(sum(totals["listings"] for totals in categories.values()), 4)
+                self.assertEqual(categories["Home"]["listings"], 2)
+                self.assertEqual(categories["Home"]["closed"], 2)
+                self.assertEqual(categories["Home"]["sold"], 1)
+                self.assertEqual(categories["Home"]["uplift_sum"], 0.5)
+                self.assertEqual(categories[analytics.UNCATEGORIZED]["listings"], 1)
+                self.assertEqual(categories[analytics.OTHER]["listings"], 1)
+                self.assertEqual(categories[analytics.OTHER]["with_bids"], 1)
+
+    def test_report(self):
+        paths = analytics.write_report(self.output, top=1, chunk_size=2)
+
+        minutes = read_csv(paths, "bids_per_minute.csv")
+        self.assertEqual(minutes, [{"minute": "2026-01-01T12:30:00+00:00", "bids": "4"}])
+
+        leaders = read_csv(paths, "top_bidders.csv")
+        self.assertEqual(leaders, [{
+            "user_id": str(self.bob_id), "username": "user-2", "bids": "3",
+            "total_amount": str(2 ** 53 + 1 + 120 + 200),
+        }])
+
+        categories = {row["category"]: row for row in read_csv(paths, "categories.csv")}
+        self.assertEqual(categories["Home"]["sell_through_rate"], "0.5")
+        self.assertEqual(categories["Home"]["mean_price_uplift"], "0.5")
+        self.assertEqual(categories[analytics.OTHER]["listings"], "1")
+        self.assertEqual(categories["Books"]["sell_through_rate"], "")
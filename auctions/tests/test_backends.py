@@ -0,0 +1,57 @@
+from django.contrib.auth import get_user
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from ..backends import CachedModelBackend
+from ..models import User
+from ..testing import AuctionTestCase
+
+
+class CachedUserTests(AuctionTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("alice", password="secret")
+
+    def setUp(self):
+        super().setUp()
+        self.backend = CachedModelBackend()
+        # Fill the cache
+        self.backend.get_user(self.user.pk)
+
+    def test_cached_after_the_first_lookup(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(self.backend.get_user(self.user.pk), self.user)
+
+    def test_save_invalidates(self):
+        self.user.is_staff = True
+        self.user.save()
+        self.assertTrue(self.backend.get_user(self.user.pk).is_staff)
+
+    def test_delete_invalidates(self):
+        User.objects.get(pk=self.user.pk).delete()
+        self.assertIsNone(self.backend.get_user(self.user.pk))
+
+    def test_queryset_update_invalidates(self):
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertIsNone(self.backend.get_user(self.user.pk))
+
+    def test_queryset_delete_invalidates(self):
+        User.objects.filter(username="alice").delete()
+        self.assertIsNone(self.backend.get_user(self.user.pk))
+
+    def test_password_change_logs_out(self):
+        client = Client()
+        client.login(username="alice", password="secret")
+        self.assertTrue(get_user(client.get(reverse("index")).wsgi_request).is_authenticated)
+
+        user = User.objects.get(pk=self.user.pk)
+        user.set_password("changed")
+        user.save()
+        self.assertFalse(get_user(client.get(reverse("index")).wsgi_request).is_authenticated)
+
+    @override_settings(AUTH_USER_CACHE_LOCAL=False)
+    def test_per_process_cache_is_not_used_by_default(self):
+        for _ in range(2):
+            with self.assertNumQueries(1):
+                self.backend.get_user(self.user.pk)
@@ -0,0 +1,201 @@
+"""
+Query and time budgets, tested at data volume.
+
+The fixtures come from auctions/testing.py. Every URL has a budget at the
+"medium" scale (URL_BUDGETS), and the pages and admin changelists must run as
+many queries after the data grows as before, which catches per-row queries.
+The budgets also hold with sharded bids: `COMMERCE_SHARDS=3 python manage.py
+test auctions` runs the whole suite that way, while test_sharding.py covers the
+shards themselves in every run.
+"""
+import os
+import shutil
+import tempfile
+
+from django.test import override_settings
+from django.urls import reverse
+
+from .. import recommendations, sharding
+from ..cards import listing_cards
+from ..images import thumbnail_dir
+from ..models import Listing, User, Watchlist
+from ..testing import PASSWORD, AuctionTestCase, ScalingTestCase, create_dataset, fetch, logged_in, query_budget
+from ..urls import urlpatterns
+
+# (queries, queries per alias, milliseconds) for the request UrlBudgetTests makes to
+# each URL of auctions/urls.py, at the "medium" scale. Every URL needs an entry. The
+# second count is only added, once per alias in AUCTION_SHARDS, when bids are sharded:
+# grids then price their cards with one query per shard instead of a join.
+URL_BUDGETS = {
+    "index": (3, 2, 300),
+    "login": (9, 0, 100),
+    "logout": (3, 0, 100),
+    "register": (10, 0, 100),
+    "create_listing": (3, 0, 100),
+    "listing_detail": (11, 2, 300),
+    "place_bid": (14, 0, 200),
+    "place_proxy_bid": (15, 0, 200),
+    "close_auction": (16, 1, 200),
+    "add_comment": (8, 0, 200),
+    "toggle_watchlist": (11, 0, 200),
+    "remove_listing_from_mode": (5, 0, 100),
+    "watchlist": (2, 0, 100),
+    "category_listings": (2, 1, 200),
+    "my_listings": (2, 0, 100),
+    "my_purchases": (2, 0, 100),
+    "categories": (2, 0, 100),
+    "thumbnail": (0, 0, 100),
+    "metrics": (0, 0, 100),
+}
+
+
+class UrlBudgetTests(AuctionTestCase):
+    def active_listing(self, listing_ids):
+        """The first of `listing_ids` that is still open."""
+        return next(listing_id for listing_id in listing_ids if listing_id in self.data.active)
+
+    def owned_listing(self, owner_id):
+        return Listing.objects.filter(owner_id=owner_id, is_active=True).values_list("pk", flat=True).first()
+
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = create_dataset("medium")
+        recommendations.refresh(full=True)
+
+    def assertWithinBudget(self, name, method, path, user_id=None, data=None, status=200):
+        client = logged_in(user_id)
+        queries, per_alias, ms = URL_BUDGETS[name]
+        if sharding.is_sharded():
+            queries += per_alias * len(sharding.shard_aliases())
+        with query_budget(queries, ms):
+            response = fetch(client, method, path, data)
+        self.assertEqual(response.status_code, status)
+        return response
+
+    def test_every_url_has_a_budget(self):
+        self.assertEqual(set(URL_BUDGETS), {pattern.name for pattern in urlpatterns})
+
+    def test_index(self):
+        self.assertWithinBudget("index", "get", reverse("index"))
+
+    def test_login(self):
+        username = User.objects.get(pk=self.data.sellers[0]).username
+        self.assertWithinBudget("login", "post", reverse("login"), data={
+            "username": username, "password": PASSWORD,
+        }, status=302)
+
+    def test_logout(self):
+        self.assertWithinBudget("logout", "get", reverse("logout"), self.data.users[0], status=302)
+
+    def test_register(self):
+        self.assertWithinBudget("register", "post", reverse("register"), data={
+            "username": "newcomer", "email": "newcomer@example.com", "password": PASSWORD, "confirmation": PASSWORD,
+        }, status=302)
+
+    def test_create_listing(self):
+        self.assertWithinBudget("create_listing", "post", reverse("create_listing"), self.data.sellers[0], data={
+            "title": "New listing", "description": "Brand new", "starting_bid": "10", "category": "Toys",
+        }, status=302)
+
+    def test_listing_detail(self):
+        listing_id = self.data.hot_listings[0]
+        self.assertWithinBudget("listing_detail", "get", reverse("listing_detail", args=[listing_id]),
+                                self.data.watchers[0])
+
+    def test_place_bid(self):
+        listing_id = self.active_listing(self.data.hot_listings)
+        bidder_id = next(user_id for user_id in self.data.bidders
+                         if user_id != Listing.objects.get(pk=listing_id).owner_id)
+        self.assertWithinBudget("place_bid", "post", reverse("place_bid", args=[listing_id]), bidder_id,
+                                data={"bid_amount": "10000000"}, status=302)
+
+    def test_place_proxy_bid(self):
+        listing_id = self.active_listing(self.data.hot_listings)
+        bidder_id = next(user_id for user_id in self.data.bidders
+                         if user_id != Listing.objects.get(pk=listing_id).owner_id)
+        self.assertWithinBudget("place_proxy_bid", "post", reverse("place_proxy_bid", args=[listing_id]), bidder_id,
+                                data={"max_amount": "10000000"}, status=302)
+
+    def test_close_auction(self):
+        seller_id = self.data.sellers[0]
+        listing_id = self.owned_listing(seller_id)
+        self.assertWithinBudget("close_auction", "post", reverse("close_auction", args=[listing_id]), seller_id)
+        self.assertFalse(Listing.objects.get(pk=listing_id).is_active)
+
+    def test_add_comment(self):
+        listing_id = self.data.hot_listings[0]
+        self.assertWithinBudget("add_comment", "post", reverse("add_comment", args=[listing_id]),
+                                self.data.users[0], data={"text": "Is it still available?"})
+
+    def test_toggle_watchlist(self):
+        listing_id = self.data.hot_listings[0]
+        self.assertWithinBudget("toggle_watchlist", "post", reverse("toggle_watchlist", args=[listing_id]),
+                                self.data.watchers[0])
+
+    def test_remove_listing_from_mode(self):
+        watcher_id = self.data.watchers[0]
+        listing_id = Watchlist.objects.filter(user_id=watcher_id).values_list("listing_id", flat=True).first()
+        self.assertWithinBudget("remove_listing_from_mode", "post",
+                                reverse("remove_listing_from_mode", args=[listing_id]), watcher_id,
+                                data={"mode": "watchlist"}, status=302)
+
+    def test_watchlist(self):
+        self.assertWithinBudget("watchlist", "get", reverse("watchlist"), self.data.watchers[0])
+
+    def test_category_listings(self):
+        self.assertWithinBudget("category_listings", "get", reverse("category_listings", args=["Toys"]),
+                                self.data.users[0])
+
+    def test_my_listings(self):
+        self.assertWithinBudget("my_listings", "get", reverse("my_listings"), self.data.sellers[0])
+
+    def test_my_purchases(self):
+        self.assertWithinBudget("my_purchases", "get", reverse("my_purchases"), self.data.bidders[0])
+
+    def test_categories(self):
+        self.assertWithinBudget("categories", "get", reverse("categories"), self.data.users[0])
+
+    def test_thumbnail(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        name = "0" * 32 + ".jpg"
+        with override_settings(MEDIA_ROOT=media_root):
+            os.makedirs(thumbnail_dir())
+            with open(os.path.join(thumbnail_dir(), name), "wb") as file:
+                file.write(b"\xff\xd8\xff\xd9")
+            self.assertWithinBudget("thumbnail", "get", reverse("thumbnail", args=[name]))
+
+    def test_metrics(self):
+        self.assertWithinBudget("metrics", "get", reverse("metrics"))
+
+
+class PageQueryTests(ScalingTestCase):
+
+    def test_index(self):
+        self.assertConstantPageQueries(reverse("index"))
+
+    def test_listing_detail(self):
+        path = reverse("listing_detail", args=[self.data.hot_listings[0]])
+        self.assertConstantPageQueries(path, self.data.watchers[0])
+
+    def test_watchlist(self):
+        self.assertConstantPageQueries(reverse("watchlist"), self.data.watchers[0])
+
+    def test_my_listings(self):
+        self.assertConstantPageQueries(reverse("my_listings"), self.data.sellers[0])
+
+    def test_my_purchases(self):
+        self.assertConstantPageQueries(reverse("my_purchases"), self.data.bidders[0])
+
+    def test_category_listings(self):
+        self.assertConstantPageQueries(reverse("category_listings", args=["Books"]), self.data.users[0])
+
+    def test_categories(self):
+        self.assertConstantPageQueries(reverse("categories"), self.data.users[0])
+
+    def test_listing_cards(self):
+        self.assertConstantQueries(lambda: listing_cards(Listing.objects.all()))
+
+    def test_popular(self):
+        self.assertConstantQueries(recommendations.popular)
@@ -0,0 +1,56 @@
+from importlib import import_module
+from types import SimpleNamespace
+
+from django.apps import apps
+from django.db import connection
+from django.urls import reverse
+
+from .. import activity
+from ..cards import activity_cards, listing_cards
+from ..models import Listing, User, UserActivity
+from ..testing import AuctionTestCase, create_users, fetch, logged_in
+
+fill_has_bids = import_module("auctions.migrations.0026_useractivity_has_bids").fill_has_bids
+
+
+class CardTests(AuctionTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller_id, cls.bidder_id, cls.watcher_id = create_users(3)
+        cls.listing = Listing.objects.create(
+            title="Lamp", description="Brass", starting_bid=100, category="Home", owner_id=cls.seller_id,
+        )
+        activity.listing_created(cls.listing)
+
+    def bid_at_starting_price(self):
+        response = logged_in(self.bidder_id).post(reverse("place_bid", args=[self.listing.pk]), {"bid_amount": "100"})
+        self.assertEqual(response.status_code, 302)
+
+    def dashboard_cards(self, user_id, mode):
+        rows, _ = activity.dashboard(User.objects.get(pk=user_id), mode)
+        return activity_cards(rows, mode)
+
+    def test_first_bid_at_the_starting_price_counts_as_a_bid(self):
+        self.assertFalse(self.dashboard_cards(self.seller_id, "my_listings")[0]["has_bids"])
+        self.bid_at_starting_price()
+        fetch(logged_in(self.watcher_id), "post", reverse("toggle_watchlist", args=[self.listing.pk]))
+        for user_id, mode in ((self.seller_id, "my_listings"), (self.bidder_id, "my_purchases"),
+                              (self.watcher_id, "watchlist")):
+            with self.subTest(mode=mode):
+                card, = self.dashboard_cards(user_id, mode)
+                self.assertEqual((card["current_price"], card["has_bids"]), (100, True))
+
+    def test_rebuild_and_migration_find_bids(self):
+        self.bid_at_starting_price()
+        activity.rebuild()
+        self.assertEqual(set(UserActivity.objects.values_list("has_bids", flat=True)), {True})
+        UserActivity.objects.update(has_bids=False)
+        fill_has_bids(apps, SimpleNamespace(connection=connection))
+        self.assertEqual(set(UserActivity.objects.values_list("has_bids", flat=True)), {True})
+
+    def test_listing_cards_leave_the_status_to_the_template(self):
+        card, = listing_cards(Listing.objects.filter(pk=self.listing.pk))
+        self.assertEqual(card["status_message"], "")
+        response = fetch(logged_in(self.watcher_id), "get", reverse("category_listings", args=["Home"]))
+        self.assertContains(response, "Current price: $100")
@@ -0,0 +1,96 @@
+from collections import Counter
+from io import StringIO
+
+from django.core.management import call_command
+from django.urls import reverse
+
+from .. import activity, sharding
+from ..models import Comment, Listing, User, UserActivity
+from ..testing import AuctionTestCase, create_dataset, fetch, logged_in, query_budget
+from ..utils import close_listings
+
+
+class CloseListingsTests(AuctionTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = create_dataset("small", listings=400, bids=4000)
+        Listing.objects.update(is_active=True, winner=None)
+        activity.rebuild()
+
+    def test_fixed_number_of_queries(self):
+        # Sharded, winners are written back set_winners()'s 300 per UPDATE, so both sets fit in one batch
+        listing_ids = sorted(self.data.listings)
+        with query_budget() as few:
+            self.assertEqual(close_listings(Listing.objects.filter(pk__in=listing_ids[:10])), 10)
+        with query_budget(queries=len(few)):
+            self.assertEqual(close_listings(Listing.objects.filter(pk__in=listing_ids[100:])), 300)
+
+    def test_winners_and_activity(self):
+        close_listings(Listing.objects.all())
+        top_bidders = sharding.top_bidders(self.data.listings)
+        self.assertEqual(dict(Listing.objects.values_list("pk", "winner_id")),
+                         {listing_id: top_bidders.get(listing_id) for listing_id in self.data.listings})
+        listing_id = self.data.hot_listings[0]
+        statuses = dict(UserActivity.objects.filter(listing_id=listing_id, relation="bidding")
+                        .values_list("user_id", "status"))
+        self.assertEqual(statuses.pop(top_bidders[listing_id]), "won")
+        self.assertEqual(set(statuses.values()), {"lost"})
+        self.assertFalse(UserActivity.objects.filter(status="active").exists())
+
+    def test_closed_listings_are_skipped(self):
+        listing_ids = sorted(self.data.listings)[:20]
+        close_listings(Listing.objects.filter(pk__in=listing_ids[:10]))
+        self.assertEqual(close_listings(Listing.objects.filter(pk__in=listing_ids)), 10)
+
+
+class ModerationTests(AuctionTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = create_dataset("small", listings=20, bids=50, comments=200)
+
+    def comments(self, **filters):
+        return [
+            comment for alias in sharding.shard_aliases()
+            for comment in Comment.objects.using(alias).filter(**filters)
+        ]
+
+    def moderate(self, *args):
+        """Run moderate_comments and return the number of comments it reports."""
+        stdout = StringIO()
+        call_command("moderate_comments", *args, stdout=stdout)
+        return int(stdout.getvalue().split(": ")[1].split()[0])
+
+    def test_hidden_comments_leave_the_listing_page(self):
+        listing_id = self.data.hot_listings[0]
+        count = len(self.comments(listing_id=listing_id))
+        self.assertEqual(self.moderate("hide", "--listing", str(listing_id)), count)
+        self.assertTrue(all(comment.is_hidden for comment in self.comments(listing_id=listing_id)))
+        response = fetch(logged_in(None), "get", reverse("listing_detail", args=[listing_id]))
+        self.assertEqual(list(response.context["comments"]), [])
+
+        self.assertEqual(self.moderate("unhide", "--listing", str(listing_id)), count)
+        self.assertFalse(any(comment.is_hidden for comment in self.comments(listing_id=listing_id)))
+
+    def test_by_author_on_every_shard(self):
+        author_id = self.comments()[0].author_id
+        username = User.objects.get(pk=author_id).username
+        count = len(self.comments(author_id=author_id))
+        self.assertEqual(self.moderate("delete", "--author", username), count)
+        self.assertEqual(self.comments(author_id=author_id), [])
+        self.assertTrue(self.comments())
+
+    def test_fixed_number_of_queries(self):
+        for field, option in (("listing_id", "--listing"), ("author_id", "--author")):
+            counts = Counter(getattr(comment, field) for comment in self.comments()).most_common()
+            (most, many), (fewest, few) = counts[0], counts[-1]
+            self.assertGreater(many, few)
+            if field == "author_id":
+                most, fewest = (User.objects.get(pk=pk).username for pk in (most, fewest))
+            for action in ("hide", "unhide", "delete"):
+                with self.subTest(option=option, action=action):
+                    with query_budget() as small:
+                        self.assertEqual(self.moderate(action, option, str(fewest)), few)
+                    with query_budget(queries=len(small)):
+                        self.assertEqual(self.moderate(action, option, str(most)), many)
@@ -0,0 +1,138 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TransactionTestCase
+from django.urls import reverse
+
+from .. import events, sharding
+from ..livestate import live_auctions
+from ..models import AuctionEvent, Bid, Listing, User, Watchlist
+from ..testing import create_dataset, create_listings, create_users, logged_in, query_budget
+from ..utils import close_listings
+
+
+def event_inserts(budget):
+    return [query for query in budget.captured_queries if query["sql"].startswith('INSERT INTO "auctions_auctionevent"')]
+
+
+class EventLogTests(TransactionTestCase):
+    # TestCase never commits, so on_commit() would never write the events
+    databases = "__all__"
+
+    def setUp(self):
+        cache.clear()
+        live_auctions.clear()
+
+    def record_with_rollbacks(self, atomic):
+        listing_id, = create_listings(1, create_users(2))
+        user_id = User.objects.exclude(listings=listing_id).values_list("pk", flat=True).first()
+        with query_budget() as budget:
+            with self.assertRaises(ValueError), atomic():
+                events.record(events.BID, listing_id, user_id, 100)
+                raise ValueError
+            with atomic():
+                events.record(events.WATCHED, listing_id, user_id)
+                events.record(events.UNWATCHED, listing_id, user_id)
+                with self.assertRaises(ValueError), atomic():
+                    events.record(events.BID, listing_id, user_id, 100)
+                    raise ValueError
+        self.assertEqual(list(AuctionEvent.objects.order_by("seq").values_list("kind", flat=True)),
+                         [events.WATCHED, events.UNWATCHED])
+        return len(event_inserts(budget))
+
+    def test_rolled_back_actions_leave_no_event(self):
+        self.assertEqual(self.record_with_rollbacks(events.atomic), 1)
+
+    def test_one_callback_per_event_outside_events_atomic(self):
+        self.assertEqual(self.record_with_rollbacks(transaction.atomic), 2)
+
+    def test_site_actions_replay_to_the_live_tables(self):
+        seller, *bidders = [logged_in(user_id) for user_id in create_users(4)]
+        for index in range(3):
+            seller.post(reverse("create_listing"), {
+                "title": f"Listing {index}", "description": "Like new", "starting_bid": "10", "category": "Toys",
+            })
+        first, second, third = Listing.objects.order_by("pk").values_list("pk", flat=True)
+        bidders[0].post(reverse("place_bid", args=[first]), {"bid_amount": "20"})
+        bidders[1].post(reverse("place_proxy_bid", args=[first]), {"max_amount": "100"})
+        bidders[2].post(reverse("place_bid", args=[first]), {"bid_amount": "50"})
+        bidders[0].post(reverse("toggle_watchlist", args=[first]))
+        bidders[1].post(reverse("toggle_watchlist", args=[second]))
+        bidders[1].post(reverse("toggle_watchlist", args=[second]))
+        bidders[2].post(reverse("add_comment", args=[second]), {"text": "Still there?"})
+        bidders[2].post(reverse("place_bid", args=[second]), {"bid_amount": "15"})
+        seller.post(reverse("close_auction", args=[first]))
+        seller.post(reverse("close_auction", args=[second]))
+
+        state = events.replay()
+        self.assertEqual(events.check(state), [])
+        self.assertEqual(state.listings[first].price, 52)
+        self.assertFalse(state.listings[second].is_active)
+        self.assertTrue(state.listings[third].is_active)
+
+    def test_admin_actions_replay_to_the_live_tables(self):
+        seller_id, bidder_id, watcher_id = create_users(3)
+        admin = logged_in(User.objects.create_superuser("admin", "admin@example.com", "password").pk)
+
+        def add(model, **data):
+            response = admin.post(reverse(f"admin:auctions_{model}_add"), data)
+            self.assertEqual(response.status_code, 302)
+
+        for title in ("Lamp", "Chair"):
+            add("listing", title=title, description="Oak", starting_bid="10", category="Home",
+                owner=seller_id, is_active="on", version=0)
+        lamp, chair = Listing.objects.order_by("pk").values_list("pk", flat=True)
+        add("bid", amount=25, bidder=bidder_id, listing=lamp)
+        add("bid", amount=30, bidder=bidder_id, listing=chair)
+        add("comment", text="Is it oak?", author=watcher_id, listing=lamp)
+        add("watchlist", user=watcher_id, listing=lamp)
+        watch = Watchlist.objects.get(user_id=watcher_id)
+        admin.post(reverse("admin:auctions_watchlist_change", args=[watch.pk]), {"user": watcher_id, "listing": chair})
+        admin.post(reverse("admin:auctions_listing_changelist"), {
+            "action": "close_selected", "_selected_action": [lamp],
+        })
+        state = events.replay()
+        self.assertEqual(set(state.listings), {lamp, chair})
+        self.assertEqual(events.check(state), [])
+
+        # A changed bid has no event of its own: the listing is left out of the check from then on
+        bid = sharding.for_listing(Bid, chair).get()
+        admin.post(reverse("admin:auctions_bid_change", args=[bid.pk]), {
+            "amount": 40, "bidder": bidder_id, "listing": chair,
+        })
+        state = events.replay()
+        self.assertEqual(events.check(state), [])
+        self.assertTrue(state.listings[chair].edited)
+        self.assertFalse(state.listings[lamp].edited)
+        self.assertEqual(AuctionEvent.objects.get(kind=events.EDITED).user_id, User.objects.get(username="admin").pk)
+
+        # Writes that bypass both the site and the admin are still reported
+        sharding.for_listing(Bid, lamp).update(amount=26)
+        self.assertIn(f"listing {lamp} top bid: live 26, replayed 25", events.check())
+
+    def test_show_after_still_replays_from_the_start(self):
+        seller_id, bidder_id = create_users(2)
+        events.record(events.LISTED, 7, seller_id, "10.00", "Toys")
+        for amount in (20, 30):
+            events.record(events.BID, 7, bidder_id, amount)
+        after = AuctionEvent.objects.filter(kind=events.BID).order_by("seq").values_list("seq", flat=True)[0]
+        stdout = StringIO()
+        call_command("auction_events", "show", "--listing", "7", "--after", str(after), stdout=stdout)
+        lines = stdout.getvalue().splitlines()
+        self.assertEqual([line.split()[3] for line in lines[:-1]], ["Bid"])
+        self.assertEqual(lines[-1], "Replayed: $30 after 2 bid(s), active.")
+
+    def test_backfilled_dataset_checks_clean(self):
+        create_dataset("small")
+        self.assertGreater(events.backfill(), 0)
+        self.assertEqual(events.backfill(), 0)
+        self.assertEqual(events.check(), [])
+
+    def test_closing_writes_events_in_one_insert(self):
+        create_dataset("small", listings=200)
+        with query_budget() as budget:
+            closed = close_listings(Listing.objects.all())
+        self.assertEqual(len(event_inserts(budget)), 1)
+        self.assertEqual(AuctionEvent.objects.filter(kind=events.CLOSED).count(), closed)
@@ -0,0 +1,175 @@
+import io
+import os
+import shutil
+import socket
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock, skipUnless
+
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+
+from .. import images
+from ..images import HAS_PILLOW, UnsafeImageURL, fetch_image, generate_thumbnail, is_public_address
+from ..models import Listing, User
+from ..testing import AuctionTestCase, create_listings, create_users, logged_in
+
+real_getaddrinfo = socket.getaddrinfo
+
+
+def png_bytes(size=(800, 600)):
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (200, 30, 30)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+class ImageServer:
+    """
+    Local HTTP server standing in for the image host, so nothing leaves the machine.
+    Host names are resolved through `hosts` instead of DNS, and 127.0.0.1 counts as
+    public while it runs.
+    """
+
+    def __init__(self, routes):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                status, headers, body = routes.get(self.path, (404, {}, b""))
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.port = self.server.server_address[1]
+        self.hosts = {"images.example": "127.0.0.1", "internal.example": "10.1.2.3"}
+
+    def getaddrinfo(self, host, port, *args, **kwargs):
+        if host not in self.hosts:
+            return real_getaddrinfo(host, port, *args, **kwargs)
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", (self.hosts[host], port))]
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.patches = [
+            mock.patch("socket.getaddrinfo", self.getaddrinfo),
+            mock.patch.object(images, "is_public_address", lambda address: address == "127.0.0.1"),
+        ]
+        for patch in self.patches:
+            patch.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        for patch in self.patches:
+            patch.stop()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def url(self, path, host="images.example"):
+        return f"http://{host}:{self.port}{path}"
+
+
+class FetchImageTests(SimpleTestCase):
+
+    def test_public_addresses(self):
+        self.assertTrue(is_public_address("93.184.216.34"))
+        self.assertTrue(is_public_address("2606:2800:220:1::1"))
+        for address in ("127.0.0.1", "10.0.0.1", "172.16.0.1", "192.168.1.1", "169.254.169.254",
+                        "0.0.0.0", "100.64.0.1", "::1", "fd00::1", "fe80::1", "::ffff:127.0.0.1"):
+            with self.subTest(address=address):
+                self.assertFalse(is_public_address(address))
+
+    def test_only_http_and_https(self):
+        for url in ("file:///etc/passwd", "ftp://example.com/a.png", "data:image/png;base64,AAAA"):
+            with self.subTest(url=url), self.assertRaises(UnsafeImageURL):
+                fetch_image(url)
+
+    def test_private_hosts_are_refused(self):
+        for url in ("http://127.0.0.1/a.png", "http://localhost/a.png", "http://10.0.0.1/a.png", "http://[::1]/a.png"):
+            with self.subTest(url=url), self.assertRaises(UnsafeImageURL):
+                fetch_image(url)
+
+    def test_names_are_checked_after_resolving(self):
+        with ImageServer({}) as server, self.assertRaises(UnsafeImageURL):
+            fetch_image(server.url("/a.png", host="internal.example"))
+
+    def test_fetch(self):
+        with ImageServer({"/a.png": (200, {}, b"image")}) as server:
+            self.assertEqual(fetch_image(server.url("/a.png")), b"image")
+
+    def test_redirects_are_checked(self):
+        routes = {"/a.png": (200, {}, b"image")}
+        with ImageServer(routes) as server:
+            routes["/public"] = (302, {"Location": server.url("/a.png")}, b"")
+            self.assertEqual(fetch_image(server.url("/public")), b"image")
+            routes["/private"] = (302, {"Location": server.url("/a.png", host="internal.example")}, b"")
+            routes["/ftp"] = (302, {"Location": "ftp://images.example/a.png"}, b"")
+            for path in ("/private", "/ftp"):
+                with self.subTest(path=path), self.assertRaises(UnsafeImageURL):
+                    fetch_image(server.url(path))
+
+    @override_settings(THUMBNAIL_MAX_BYTES=10)
+    def test_oversized_images_are_refused(self):
+        with ImageServer({"/a.png": (200, {}, b"x" * 11)}) as server, self.assertRaises(ValueError):
+            fetch_image(server.url("/a.png"))
+
+
+@skipUnless(HAS_PILLOW, "Pillow is not installed")
+class ThumbnailTests(AuctionTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        seller_id, = create_users(1)
+        cls.listing_id, = create_listings(1, [seller_id], active_share=1)
+        cls.admin = User.objects.create_superuser("admin", "admin@example.com", "password")
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def test_generate_thumbnail(self):
+        routes = {"/a.png": (200, {}, png_bytes())}
+        with ImageServer(routes) as server:
+            listing = Listing.objects.get(pk=self.listing_id)
+            listing.image_url = server.url("/a.png")
+            listing.save()
+            name = generate_thumbnail(listing)
+
+        self.assertEqual(Listing.objects.get(pk=self.listing_id).thumbnail, name)
+        from PIL import Image
+        for extension in images.THUMBNAIL_FORMATS:
+            with Image.open(os.path.join(images.thumbnail_dir(), f"{name}.{extension}")) as thumbnail:
+                self.assertEqual(thumbnail.size, (400, 300))
+
+    def test_background_failures_are_logged(self):
+        Listing.objects.filter(pk=self.listing_id).update(image_url="file:///etc/passwd")
+        with self.assertLogs("auctions.images", "ERROR") as logs:
+            images._generate_in_background(self.listing_id)
+        self.assertIn(f"listing {self.listing_id}", logs.output[0])
+        self.assertIn("UnsafeImageURL", logs.output[0])
+
+    def test_editing_image_url_rebuilds_the_thumbnail(self):
+        Listing.objects.filter(pk=self.listing_id).update(image_url="https://example.com/old.png", thumbnail="a" * 32)
+        listing = Listing.objects.get(pk=self.listing_id)
+        data = {
+            "title": listing.title, "description": listing.description, "starting_bid": listing.starting_bid,
+            "image_url": "https://example.com/new.png", "thumbnail": listing.thumbnail, "category": listing.category or "",
+            "is_active": "on", "owner": listing.owner_id, "version": listing.version,
+        }
+        with mock.patch.object(images, "schedule_thumbnail") as schedule:
+            response = logged_in(self.admin.pk).post(reverse("admin:auctions_listing_change", args=[listing.pk]), data)
+        self.assertEqual(response.status_code, 302)
+        listing.refresh_from_db()
+        self.assertEqual((listing.image_url, listing.thumbnail), ("https://example.com/new.png", ""))
+        schedule.assert_called_once_with(listing)
@@ -0,0 +1,108 @@
+import threading
+import time
+from unittest import mock
+
+from django.db.models import F
+from django.test import SimpleTestCase, override_settings
+
+from .. import livestate, sharding
+from ..livestate import AuctionState, LiveAuctionStore, live_auctions
+from ..models import Bid, Listing, User
+from ..testing import AuctionTestCase, create_listings, create_users
+
+
+def state(listing_id, version=0):
+    return AuctionState(listing_id, 1, 10, None, None, 0, None, version, True)
+
+
+class LiveAuctionStoreTests(SimpleTestCase):
+
+    def test_concurrent_loads_share_one_state(self):
+        store = LiveAuctionStore()
+        barrier = threading.Barrier(4)
+        results = []
+
+        def slow_load(listing_id):
+            time.sleep(0.05)
+            return state(listing_id)
+
+        def get():
+            barrier.wait()
+            results.append(store.get(1))
+
+        with mock.patch.object(livestate, "load_state", slow_load):
+            threads = [threading.Thread(target=get) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(results), 4)
+        self.assertEqual(len({id(result) for result in results}), 1)
+        self.assertIs(store.get(1), results[0])
+
+    @override_settings(LIVE_AUCTIONS_MAX=2)
+    def test_least_recently_used_states_are_evicted(self):
+        store = LiveAuctionStore()
+        with mock.patch.object(livestate, "load_state", state):
+            first = store.get(1)
+            store.get(2)
+            store.get(1)
+            store.get(3)
+            self.assertEqual(len(store), 2)
+            self.assertIs(store.get(1), first)
+            self.assertIsNot(store.get(2), first)
+
+    @override_settings(LIVE_AUCTIONS_TTL=0)
+    def test_expired_states_are_reloaded(self):
+        store = LiveAuctionStore()
+        with mock.patch.object(livestate, "load_state", state):
+            self.assertIsNot(store.get(1), store.get(1))
+
+
+class VersionConflictTests(AuctionTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        seller_id, = create_users(1, prefix="seller")
+        cls.first, cls.second = User.objects.filter(pk__in=create_users(2, prefix="bidder")).order_by("pk")
+        cls.listing_id, = create_listings(1, [seller_id], active_share=1)
+        Listing.objects.filter(pk=cls.listing_id).update(starting_bid=100)
+
+    def bids(self):
+        return list(sharding.for_listing(Bid, self.listing_id).order_by("id").values_list("amount", "bidder_id"))
+
+    def bid_from_another_worker(self, amount, bidder):
+        """Write a bid the way another process would, leaving this process's state stale."""
+        Bid.objects.using(sharding.listing_db(self.listing_id)).create(
+            amount=amount, bidder=bidder, listing_id=self.listing_id,
+        )
+        Listing.objects.filter(pk=self.listing_id).update(version=F("version") + 1)
+
+    def test_stale_state_is_reloaded_and_the_bid_checked_again(self):
+        live_auctions.get(self.listing_id)
+        self.bid_from_another_worker(300, self.second)
+
+        # Valid against the stale state, too low against the reloaded one
+        self.assertIn("greater than the current price ($300", live_auctions.place_bid(self.listing_id, self.first, 200))
+        self.assertEqual(self.bids(), [(300, self.second.pk)])
+
+    def test_stale_state_accepts_a_bid_that_is_still_high_enough(self):
+        live_auctions.get(self.listing_id)
+        self.bid_from_another_worker(300, self.second)
+        self.assertEqual(live_auctions.place_bid(self.listing_id, self.first, 400), "")
+        self.assertEqual(self.bids(), [(300, self.second.pk), (400, self.first.pk)])
+        self.assertEqual(live_auctions.get(self.listing_id).version, Listing.objects.get(pk=self.listing_id).version)
+
+    def test_repeated_conflicts_give_up_without_writing(self):
+        stale = livestate.load_state(self.listing_id)
+        Listing.objects.filter(pk=self.listing_id).update(version=stale.version + 1)
+        with mock.patch.object(livestate, "load_state", lambda listing_id: state(listing_id, stale.version)):
+            error = live_auctions.place_bid(self.listing_id, self.first, 200)
+        self.assertIn("changed while your bid was being placed", error)
+        self.assertEqual(self.bids(), [])
+
+    def test_closed_elsewhere(self):
+        live_auctions.get(self.listing_id)
+        Listing.objects.filter(pk=self.listing_id).update(is_active=False, version=F("version") + 1)
+        self.assertEqual(live_auctions.place_bid(self.listing_id, self.first, 200), livestate.REJECTIONS["closed"])
+        self.assertEqual(self.bids(), [])
@@ -0,0 +1,74 @@
+import gc
+import threading
+
+from django.test import SimpleTestCase
+
+from ..metrics import Registry
+
+
+class MetricsTests(SimpleTestCase):
+
+    def setUp(self):
+        self.registry = Registry()
+
+    def test_counter_rendering(self):
+        counter = self.registry.counter("bids_total", "Bids.", ("outcome",))
+        counter.inc("accepted")
+        counter.inc("accepted", amount=2)
+        counter.inc('say "hi"\n')
+        self.assertEqual(self.registry.render(), "\n".join([
+            "# HELP bids_total Bids.",
+            "# TYPE bids_total counter",
+            'bids_total{outcome="accepted"} 3',
+            'bids_total{outcome="say \\"hi\\"\\n"} 1',
+        ]) + "\n")
+
+    def test_unlabelled_counter(self):
+        counter = self.registry.counter("closed_total", "Closed.")
+        counter.inc()
+        self.assertIn("closed_total 1", self.registry.render().splitlines())
+
+    def test_histogram_buckets(self):
+        histogram = self.registry.histogram("cards", "Cards.", ("mode",), buckets=(1, 10))
+        for value in (0, 1, 5, 10, 11):
+            histogram.observe(value, "all")
+        self.assertEqual(histogram.totals(), {("all",): [2, 2, 1, 27]})
+        self.assertEqual(list(histogram.samples()), [
+            'cards_bucket{mode="all",le="1"} 2',
+            'cards_bucket{mode="all",le="10"} 4',
+            'cards_bucket{mode="all",le="+Inf"} 5',
+            'cards_sum{mode="all"} 27',
+            'cards_count{mode="all"} 5',
+        ])
+
+    def test_threads_are_summed(self):
+        counter = self.registry.counter("hits_total", "Hits.")
+        histogram = self.registry.histogram("seconds", "Seconds.", buckets=(1,))
+        start = threading.Barrier(8)
+
+        def record():
+            # Every thread is alive at once, so each has its own cell
+            start.wait()
+            for _ in range(1000):
+                counter.inc()
+                histogram.observe(0.5)
+
+        threads = [threading.Thread(target=record) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(counter.totals(), {(): 8000})
+        self.assertEqual(histogram.totals(), {(): [8000, 0, 4000.0]})
+
+    def test_cells_of_ended_threads_are_freed(self):
+        counter = self.registry.counter("hits_total", "Hits.", ("kind",))
+        counter.inc("main")
+        for _ in range(20):
+            thread = threading.Thread(target=counter.inc, args=("thread",))
+            thread.start()
+            thread.join()
+        del thread
+        gc.collect()
+        self.assertEqual(len(counter._cells), 1)
+        self.assertEqual(counter.totals(), {("main",): 1, ("thread",): 20})
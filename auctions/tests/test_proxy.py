@@ -0,0 +1,162 @@
+import random
+import threading
+
+from django.core.cache import cache
+from django.db import OperationalError, connections
+from django.test import TransactionTestCase
+
+from .. import proxy, sharding
+from ..livestate import live_auctions
+from ..models import Bid, Listing, ProxyBid, User
+from ..testing import AuctionTestCase, create_listings, create_users, query_budget
+
+
+def top_bid(listing_id):
+    return sharding.for_listing(Bid, listing_id).order_by("-amount", "id").values_list("amount", "bidder_id").first()
+
+
+class ProxyBiddingTests(AuctionTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        seller_id, = create_users(1, prefix="seller")
+        cls.bidders = list(User.objects.filter(pk__in=create_users(80, prefix="bidder")).order_by("pk"))
+        cls.listing_id, = create_listings(1, [seller_id], active_share=1)
+
+    def top_bid(self):
+        return top_bid(self.listing_id)
+
+    def test_competing_proxies_settle_one_step_over_the_runner_up(self):
+        rng = random.Random(1)
+        accepted = []
+        for order, bidder in enumerate(self.bidders):
+            max_amount = rng.randint(1, 20000)
+            if not live_auctions.place_proxy(self.listing_id, bidder, max_amount):
+                accepted.append((-max_amount, order, bidder.pk))
+        (winner_max, _, winner_id), (runner_up_max, _, _) = sorted(accepted)[:2]
+        winner_max, runner_up_max = -winner_max, -runner_up_max
+        expected = min(winner_max, runner_up_max + proxy.bid_step(runner_up_max))
+        self.assertEqual(self.top_bid(), (expected, winner_id))
+
+        amounts = list(sharding.for_listing(Bid, self.listing_id).order_by("id").values_list("amount", flat=True))
+        self.assertEqual(amounts, sorted(set(amounts)))
+        # At most two bids per accepted proxy, however far apart the maxima are
+        self.assertLessEqual(len(amounts), 2 * len(accepted))
+
+    def test_proxy_answers_a_lower_bid(self):
+        first, second, third = self.bidders[:3]
+        self.assertEqual(live_auctions.place_proxy(self.listing_id, first, 1000000), "")
+        self.assertEqual(live_auctions.place_proxy(self.listing_id, second, 500), "")
+        price, leader_id = self.top_bid()
+        self.assertEqual((price, leader_id), (500 + proxy.bid_step(500), first.pk))
+
+        bid = price + proxy.bid_step(price)
+        self.assertEqual(live_auctions.place_bid(self.listing_id, third, bid), "")
+        self.assertEqual(self.top_bid(), (bid + proxy.bid_step(bid), first.pk))
+        self.assertEqual(live_auctions.place_bid(self.listing_id, third, 2000000), "")
+        self.assertEqual(self.top_bid(), (2000000, third.pk))
+
+    def test_earlier_proxy_wins_a_tie_with_an_explicit_bid(self):
+        first, second = self.bidders[:2]
+        self.assertEqual(live_auctions.place_proxy(self.listing_id, first, 700), "")
+        self.assertIn("takes precedence", live_auctions.place_bid(self.listing_id, second, 700))
+        self.assertEqual(self.top_bid(), (700, first.pk))
+        self.assertFalse(sharding.for_listing(Bid, self.listing_id).filter(bidder=second).exists())
+        # One more step does win
+        self.assertEqual(live_auctions.place_bid(self.listing_id, second, 710), "")
+        self.assertEqual(self.top_bid(), (710, second.pk))
+
+    def test_own_proxy_does_not_tie_with_the_bidder(self):
+        first, = self.bidders[:1]
+        self.assertEqual(live_auctions.place_proxy(self.listing_id, first, 700), "")
+        self.assertEqual(live_auctions.place_bid(self.listing_id, first, 700), "")
+        self.assertEqual(self.top_bid(), (700, first.pk))
+
+    def test_settle_runs_a_fixed_number_of_queries(self):
+        listing = Listing.objects.get(pk=self.listing_id)
+        rng = random.Random(2)
+
+        def add_proxies(bidders):
+            ProxyBid.objects.bulk_create([
+                ProxyBid(user=bidder, listing=listing, max_amount=rng.randint(100, 20000)) for bidder in bidders
+            ])
+            with query_budget() as budget:
+                proxy.settle(self.listing_id)
+            return len(budget)
+
+        self.assertEqual(add_proxies(self.bidders[:5]), add_proxies(self.bidders[5:]))
+
+
+class ConcurrentBiddingTests(TransactionTestCase):
+    # Every thread commits on its own connection, which TestCase's one transaction can't show
+    databases = "__all__"
+
+    THREADS = 8
+    ROUNDS = 15
+
+    def setUp(self):
+        cache.clear()
+        live_auctions.clear()
+        seller_id, = create_users(1, prefix="seller")
+        self.bidders = list(User.objects.filter(pk__in=create_users(self.THREADS, prefix="bidder")).order_by("pk"))
+        self.listing_id, = create_listings(1, [seller_id], active_share=1)
+
+    def run_bidders(self, bidder):
+        rng = random.Random(bidder.pk)
+        # Half the bidders only leave maxima, the other half only bid explicitly
+        by_proxy = bidder.pk % 2 == 0
+        ceiling = 0
+        try:
+            for _ in range(self.ROUNDS):
+                while True:
+                    try:
+                        price, _ = top_bid(self.listing_id) or (0, None)
+                        amount = price + rng.randint(1, 3) * proxy.bid_step(price)
+                        if by_proxy:
+                            # Maxima only go up, so every earlier proxy bid stays under the stored one
+                            ceiling = max(ceiling, amount + rng.randint(0, 200))
+                            live_auctions.place_proxy(self.listing_id, bidder, ceiling)
+                        else:
+                            live_auctions.place_bid(self.listing_id, bidder, amount)
+                        break
+                    except OperationalError:
+                        # SQLite's shared test database refuses concurrent writers outright; try again
+                        live_auctions.forget(self.listing_id)
+        except Exception as error:
+            self.errors.append(error)
+        finally:
+            connections.close_all()
+
+    def test_concurrent_bids_and_proxies(self):
+        self.errors = []
+        threads = [threading.Thread(target=self.run_bidders, args=(bidder,)) for bidder in self.bidders]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.errors, [])
+
+        bids = list(sharding.for_listing(Bid, self.listing_id).order_by("id").values_list("amount", "bidder_id"))
+        amounts = [amount for amount, _ in bids]
+        # No two bids were ever accepted against the same price
+        self.assertEqual(amounts, sorted(set(amounts)))
+
+        maxima = dict(ProxyBid.objects.filter(listing_id=self.listing_id).values_list("user_id", "max_amount"))
+        for amount, bidder_id in bids:
+            if bidder_id in maxima:
+                self.assertLessEqual(amount, maxima[bidder_id])
+
+        # The final price is what resolving the stored maxima against the top bid gives
+        price, leader_id = top_bid(self.listing_id)
+        proxies = [
+            proxy.Contender(max_amount, order, user_id)
+            for order, (max_amount, user_id) in enumerate(
+                ProxyBid.objects.filter(listing_id=self.listing_id, max_amount__gte=price)
+                .order_by("created_at", "id").values_list("max_amount", "user_id")
+            )
+        ]
+        self.assertEqual(proxy.resolve(price, True, leader_id, proxies), [])
+
+        listing = Listing.objects.get(pk=self.listing_id)
+        state = live_auctions.get(self.listing_id)
+        self.assertEqual((state.price, state.top_bidder_id, state.version), (price, leader_id, listing.version))
@@ -0,0 +1,74 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase
+from django.urls import reverse
+
+from ..ratelimit import hit, parse_rate, ratelimit
+from ..testing import AuctionTestCase, create_listings, create_users, logged_in
+
+
+class SlidingWindowTests(SimpleTestCase):
+
+    def setUp(self):
+        caches[settings.RATELIMIT_CACHE].clear()
+
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate("10/m"), (10, 60))
+        self.assertEqual(parse_rate("5/h"), (5, 3600))
+
+    def test_limit_within_a_window(self):
+        keys = [("key", 3, 60)]
+        self.assertEqual([hit(keys, now=600) for _ in range(3)], [0, 0, 0])
+        self.assertEqual(hit(keys, now=630), 31)
+
+    def test_previous_window_weighs_by_its_overlap(self):
+        keys = [("key", 4, 60)]
+        for _ in range(4):
+            hit(keys, now=650)
+        # A quarter into the next window, 3 of the 4 previous hits still count
+        self.assertEqual(hit(keys, now=675), 0)
+        self.assertGreater(hit(keys, now=675), 0)
+        # Halfway, only 2 do
+        self.assertEqual(hit(keys, now=690), 0)
+
+    def test_rejected_hits_are_not_counted(self):
+        keys = [("key", 2, 60)]
+        hit(keys, now=600)
+        hit(keys, now=600)
+        for _ in range(10):
+            self.assertGreater(hit(keys, now=610), 0)
+        self.assertEqual(caches[settings.RATELIMIT_CACHE].get("rl:key:60:10"), 2)
+        # Only the two accepted hits carry over, weighted by what is left of their window
+        self.assertEqual(hit(keys, now=690), 0)
+
+    def test_rejection_takes_back_every_rule(self):
+        keys = [("loose", 100, 60), ("tight", 1, 60)]
+        hit(keys, now=600)
+        self.assertGreater(hit(keys, now=600), 0)
+        self.assertEqual(caches[settings.RATELIMIT_CACHE].get("rl:loose:60:10"), 1)
+
+    def test_only_limited_methods_count(self):
+        view = ratelimit(("ip", "1/m"))(lambda request: HttpResponse())
+        factory = RequestFactory()
+        self.assertEqual(view(factory.post("/")).status_code, 200)
+        self.assertEqual(view(factory.get("/")).status_code, 200)
+        response = view(factory.post("/"))
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response)
+
+
+class BidFloodTests(AuctionTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        seller_id, cls.flooder_id, cls.bidder_id = create_users(3)
+        cls.listing_id, = create_listings(1, [seller_id], active_share=1)
+
+    def test_one_bidder_flooding_an_auction_leaves_the_others_bidding(self):
+        path = reverse("place_bid", args=[self.listing_id])
+        flooder = logged_in(self.flooder_id)
+        statuses = [flooder.post(path, {"bid_amount": "x"}).status_code for _ in range(15)]
+        self.assertEqual(statuses.count(429), 5)
+        response = logged_in(self.bidder_id).post(path, {"bid_amount": "1000"})
+        self.assertEqual(response.status_code, 302)
@@ -0,0 +1,96 @@
+import random
+from unittest import mock
+
+from django.conf import settings
+
+from .. import recommendations
+from ..models import Listing, ListingPopularity, RecommendationWatermark, SimilarListing, User, Watchlist
+from ..testing import AuctionTestCase, create_bids, create_dataset
+from ..utils import add_to_watchlist, close_listings, remove_from_watchlist
+
+
+def watermark(name):
+    return RecommendationWatermark.objects.get(name=name).last_id
+
+
+class RecommendationTests(AuctionTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = create_dataset("medium")
+
+    def top_similar(self):
+        """{listing_id: scores of the similar listings served}, leaving out which of equal scores made the cut."""
+        lists = {}
+        for listing_id, score in SimilarListing.objects.values_list("listing_id", "score"):
+            lists.setdefault(listing_id, []).append(round(score, 9))
+        k = settings.RECOMMENDATIONS_K
+        return {listing_id: sorted(scores, reverse=True)[:k] for listing_id, scores in lists.items()}
+
+    def popularity(self):
+        return sorted(ListingPopularity.objects.values_list("listing_id", "score"))
+
+    def test_incremental_refresh_matches_full(self):
+        recommendations.refresh(full=True)
+        rng = random.Random(1)
+        users = {user.pk: user for user in User.objects.filter(pk__in=self.data.users)}
+        listings = {listing.pk: listing for listing in Listing.objects.filter(pk__in=self.data.listings)}
+        for _ in range(3):
+            for _ in range(30):
+                add_to_watchlist(users[rng.choice(self.data.watchers[:20])], listings[rng.choice(self.data.listings)])
+            for user_id, listing_id in rng.sample(list(Watchlist.objects.values_list("user_id", "listing_id")), 15):
+                remove_from_watchlist(users[user_id], listings[listing_id])
+            create_bids(50, self.data.listings, self.data.users, seed=rng.random())
+            close_listings(Listing.objects.filter(pk=rng.choice(sorted(self.data.active))))
+            recommendations.refresh()
+
+            popularity = self.popularity()
+            similar = self.top_similar()
+            recommendations.refresh(full=True)
+            self.assertEqual(popularity, self.popularity())
+            self.assertEqual(similar, self.top_similar())
+
+    def test_batches_commit_separately(self):
+        recommendations.refresh(full=True)
+        rows = list(Watchlist.objects.order_by("-id").values_list("id", flat=True)[:2])
+        RecommendationWatermark.objects.filter(name="watchlist").update(last_id=rows[-1] - 1000)
+        merge_similar = recommendations.merge_similar
+        calls = []
+
+        def fail_second_batch(*args):
+            calls.append(args)
+            if len(calls) == 2:
+                raise RuntimeError
+            return merge_similar(*args)
+
+        with mock.patch.object(recommendations, "BATCH_ROWS", 400), \
+                mock.patch.object(recommendations, "merge_similar", side_effect=fail_second_batch), \
+                self.assertRaises(RuntimeError):
+            recommendations.refresh()
+        # The first batch stayed committed, with its watermark, when the second failed
+        first_batch = list(
+            Watchlist.objects.filter(id__gt=rows[-1] - 1000 - recommendations.WATERMARK_LOOKBACK)
+            .order_by("id").values_list("id", flat=True)[:400]
+        )
+        self.assertEqual(watermark("watchlist"), first_batch[-1])
+
+        # The next refresh picks up from there
+        recommendations.refresh()
+        self.assertEqual(watermark("watchlist"), rows[0])
+        popularity = self.popularity()
+        recommendations.refresh(full=True)
+        self.assertEqual(popularity, self.popularity())
+
+    def test_rows_committed_behind_the_watermark(self):
+        recommendations.refresh(full=True)
+        # A watch that got its id before the last one read, but only committed after the refresh
+        last_id = watermark("watchlist")
+        gap = Watchlist.objects.get(pk=last_id - 1)
+        gap.delete()
+        listing_id = next(listing_id for listing_id in sorted(self.data.active) if listing_id != gap.listing_id)
+        watching = set(Watchlist.objects.filter(listing_id=listing_id).values_list("user_id", flat=True))
+        user_id = next(user_id for user_id in self.data.users if user_id not in watching)
+        watches = ListingPopularity.objects.get(listing_id=listing_id).watchers
+        Watchlist.objects.create(pk=last_id - 1, user_id=user_id, listing_id=listing_id)
+        recommendations.refresh()
+        self.assertEqual(ListingPopularity.objects.get(listing_id=listing_id).watchers, watches + 1)
@@ -0,0 +1,192 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connections
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+
+from .. import sharding
+from ..cards import listing_cards
+from ..models import Bid, Comment, Listing, User
+from ..testing import AuctionTestCase, create_dataset, create_listings, create_users, logged_in
+
+# commerce/test_settings.py always configures these, so sharding is tested without COMMERCE_SHARDS=N
+SHARDS = ["default", "shard1", "shard2"]
+
+
+def foreign_keys(alias, table):
+    connection = connections[alias]
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, table)
+    return {constraint["columns"][0] for constraint in constraints.values() if constraint["foreign_key"]}
+
+
+class JumpHashTests(SimpleTestCase):
+
+    def test_growing_only_moves_keys_to_the_new_bucket(self):
+        for buckets in range(1, 8):
+            for key in range(2000):
+                moved = sharding.jump_hash(key, buckets + 1)
+                self.assertIn(moved, (sharding.jump_hash(key, buckets), buckets))
+
+    def test_keys_spread_evenly(self):
+        counts = [0] * 4
+        for key in range(20000):
+            counts[sharding.jump_hash(key, 4)] += 1
+        for count in counts:
+            self.assertAlmostEqual(count, 5000, delta=500)
+
+
+@override_settings(AUCTION_SHARDS=SHARDS, AUCTION_SHARDS_PREVIOUS=None)
+class ShardingTests(AuctionTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = create_dataset("small")
+
+    def test_rows_live_on_their_listing_shard(self):
+        for alias in sharding.shard_aliases():
+            for model in (Bid, Comment):
+                listing_ids = set(model.objects.using(alias).values_list("listing_id", flat=True))
+                self.assertEqual({sharding.shard_for(listing_id) for listing_id in listing_ids} - {alias}, set())
+        used = {sharding.shard_for(listing_id) for listing_id in self.data.listings}
+        self.assertEqual(used, set(sharding.shard_aliases()))
+
+    def test_cards_price_from_every_shard(self):
+        for card in listing_cards(Listing.objects.all()):
+            top = sharding.for_listing(Bid, card["id"]).order_by("-amount").values_list("amount", flat=True).first()
+            self.assertEqual(card["has_bids"], top is not None)
+            if top is not None:
+                self.assertEqual(card["current_price"], top)
+
+    def test_related_managers_read_the_listing_shard(self):
+        listing = Listing.objects.get(pk=self.data.hot_listings[0])
+        self.assertEqual(listing.bids.count(), sharding.for_listing(Bid, listing.pk).count())
+        self.assertGreater(listing.bids.count(), 0)
+
+    def test_deleting_a_listing_deletes_its_shard_rows(self):
+        listing_id = self.data.hot_listings[0]
+        Listing.objects.get(pk=listing_id).delete()
+        for alias in sharding.shard_aliases():
+            self.assertFalse(sharding.holds_listing(alias, listing_id))
+
+    def test_user_rows_are_merged_across_shards(self):
+        bidder_id = self.data.bidders[0]
+        bids = sharding.for_user(Bid, "bidder_id", bidder_id, limit=1000)
+        self.assertEqual(len(bids), sum(
+            Bid.objects.using(alias).filter(bidder_id=bidder_id).count() for alias in sharding.shard_aliases()
+        ))
+        self.assertGreater(len({sharding.shard_for(bid.listing_id) for bid in bids}), 1)
+
+    def test_ids_are_unique_across_shards(self):
+        for model in (Bid, Comment):
+            ids = {alias: set(model.objects.using(alias).values_list("pk", flat=True)) for alias in SHARDS}
+            for alias, alias_ids in ids.items():
+                base = sharding.id_base(alias)
+                self.assertTrue(alias_ids)
+                self.assertTrue(all(base < pk <= base + sharding.SHARD_ID_SPAN for pk in alias_ids))
+            self.assertEqual(sum(map(len, ids.values())), len(set.union(*ids.values())))
+
+    def test_moderate_comments_by_id_on_two_shards(self):
+        ids = [Comment.objects.using(alias).order_by("pk").values_list("pk", flat=True)[0] for alias in SHARDS[1:]]
+        stdout = StringIO()
+        call_command("moderate_comments", "hide", *map(str, ids), stdout=stdout)
+        self.assertIn("Hide: 2 comment(s).", stdout.getvalue())
+        for alias, comment_id in zip(SHARDS[1:], ids):
+            self.assertTrue(Comment.objects.using(alias).get(pk=comment_id).is_hidden)
+        self.assertEqual(sum(Comment.objects.using(alias).filter(is_hidden=True).count() for alias in SHARDS), 2)
+
+    def test_only_shards_drop_foreign_keys(self):
+        for table in ("auctions_bid", "auctions_comment"):
+            self.assertTrue(foreign_keys("default", table))
+            for alias in SHARDS[1:]:
+                self.assertEqual(foreign_keys(alias, table), set())
+
+
+@override_settings(AUCTION_SHARDS=SHARDS, AUCTION_SHARDS_PREVIOUS=["default"])
+class RebalanceTests(AuctionTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        seller_id, bidder_id = create_users(2)
+        listing_ids = create_listings(20, [seller_id], active_share=1)
+        cls.moving = [listing_id for listing_id in listing_ids if sharding.shard_for(listing_id) != "default"][:2]
+        # Bids written before the layout grew are still on "default"
+        Bid.objects.using("default").create(listing_id=cls.moving[0], bidder_id=bidder_id, amount=500)
+
+    def setUp(self):
+        super().setUp()
+        sharding._moved["layout"] = None
+
+    def test_unmoved_listing_stays_on_its_old_shard(self):
+        stays = self.moving[0]
+        self.assertEqual(sharding.listing_db(stays), "default")
+        with self.assertNumQueries(1, using="default"):
+            self.assertEqual(sharding.listing_db(stays), "default")
+
+    def test_moved_listing_is_only_looked_up_once(self):
+        moved = self.moving[1]
+        self.assertEqual(sharding.listing_db(moved), sharding.shard_for(moved))
+        with self.assertNumQueries(0, using="default"):
+            self.assertEqual(sharding.listing_db(moved), sharding.shard_for(moved))
+
+
+@override_settings(AUCTION_SHARDS=SHARDS, AUCTION_SHARDS_PREVIOUS=None)
+class ShardedAdminTests(AuctionTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = create_dataset("small", listings=30, bids=300, comments=150)
+        cls.admin = User.objects.create_superuser("admin", "admin@example.com", "password")
+
+    def setUp(self):
+        super().setUp()
+        self.client = logged_in(self.admin.pk)
+
+    def changelist(self, model, **params):
+        response = self.client.get(reverse(f"admin:auctions_{model}_changelist"), params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_changelists_list_one_shard(self):
+        for alias in SHARDS:
+            with self.subTest(alias=alias):
+                response = self.changelist("bid", shard=alias)
+                listed = {bid.pk for bid in response.context["cl"].result_list}
+                self.assertTrue(listed)
+                self.assertLessEqual(listed, set(Bid.objects.using(alias).values_list("pk", flat=True)))
+                self.assertContains(response, f"?shard={alias}")
+
+    def test_filters_and_search_on_a_shard(self):
+        bid = Bid.objects.using("shard1").order_by("pk").first()
+        bidder = User.objects.get(pk=bid.bidder_id)
+        expected = set(Bid.objects.using("shard1").filter(bidder_id=bidder.pk).values_list("pk", flat=True))
+        for params in ({"bidder": bidder.username}, {"q": bidder.username}):
+            with self.subTest(params=params):
+                response = self.changelist("bid", shard="shard1", **params)
+                self.assertLessEqual({bid.pk for bid in response.context["cl"].result_list}, expected)
+                self.assertIn(bid.pk, {bid.pk for bid in response.context["cl"].result_list})
+
+    def test_edit_a_shard_row(self):
+        bid = Bid.objects.using("shard2").order_by("-amount").first()
+        url = reverse("admin:auctions_bid_change", args=[bid.pk]) + "?_changelist_filters=shard%3Dshard2"
+        self.assertEqual(self.client.get(url).status_code, 200)
+        response = self.client.post(url, {"amount": bid.amount + 1000, "bidder": bid.bidder_id, "listing": bid.listing_id})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Bid.objects.using("shard2").get(pk=bid.pk).amount, bid.amount + 1000)
+
+    def test_moving_a_row_to_another_shard(self):
+        bid = Bid.objects.using("shard2").order_by("pk").first()
+        target = next(listing_id for listing_id in self.data.listings if sharding.shard_for(listing_id) == "shard1")
+        url = reverse("admin:auctions_bid_change", args=[bid.pk]) + "?_changelist_filters=shard%3Dshard2"
+        self.client.post(url, {"amount": bid.amount, "bidder": bid.bidder_id, "listing": target})
+        self.assertFalse(Bid.objects.using("shard2").filter(pk=bid.pk).exists())
+        moved = Bid.objects.using("shard1").get(listing_id=target, amount=bid.amount, bidder_id=bid.bidder_id)
+        self.assertGreater(moved.pk, sharding.id_base("shard1"))
+
+    def test_actions_on_a_shard(self):
+        comments = list(Comment.objects.using("shard1").filter(is_hidden=False).values_list("pk", flat=True)[:3])
+        self.client.post(reverse("admin:auctions_comment_changelist") + "?shard=shard1", {
+            "action": "hide_selected", "_selected_action": comments,
+        })
+        self.assertEqual(Comment.objects.using("shard1").filter(pk__in=comments, is_hidden=True).count(), 3)
@@ -0,0 +1,48 @@
+import os
+from copy import deepcopy
+
+from django.apps import apps
+from django.conf import settings
+from django.template import engines
+from django.test import SimpleTestCase, override_settings
+
+from ..management.commands.importtime import parse_importtime
+
+CACHED_TEMPLATES = deepcopy(settings.TEMPLATES)
+CACHED_TEMPLATES[0]['APP_DIRS'] = False
+CACHED_TEMPLATES[0]['OPTIONS']['loaders'] = [
+    ('django.template.loaders.cached.Loader', ['django.template.loaders.app_directories.Loader']),
+]
+
+
+class ImportTimeTests(SimpleTestCase):
+
+    def test_parse(self):
+        output = "\n".join([
+            "import time: self [us] | cumulative | imported package",
+            "import time:       120 |        120 |   _io",
+            "import time:      2500 |       2620 | django.conf",
+            "unrelated line",
+        ])
+        self.assertEqual(parse_importtime(output), [("_io", 120, 120, 1), ("django.conf", 2500, 2620, 0)])
+
+
+@override_settings(TEMPLATES=CACHED_TEMPLATES)
+class TemplatePreloadTests(SimpleTestCase):
+
+    def test_every_template_is_compiled(self):
+        config = apps.get_app_config('auctions')
+        root = os.path.join(config.path, 'templates')
+        expected = {
+            os.path.relpath(os.path.join(directory, name), root).replace(os.sep, '/')
+            for directory, _, names in os.walk(os.path.join(root, 'auctions'))
+            for name in names if name.endswith('.html')
+        }
+        loader = engines['django'].engine.template_loaders[0]
+        self.assertEqual(loader.get_template_cache, {})
+
+        config.preload_templates()
+
+        self.assertGreater(len(expected), 5)
+        self.assertLessEqual(expected, set(loader.get_template_cache))
+        self.assertFalse(any(isinstance(template, Exception) for template in loader.get_template_cache.values()))
@@ -0,0 +1,124 @@
+import gzip
+import os
+import shutil
+import tempfile
+
+from django.contrib.staticfiles import finders
+from django.core.management import call_command
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from ..finders import ICONS_DIR, SPRITE_NAME, build_sprite, sprite_path
+from ..storage import CompressedManifestStaticFilesStorage
+from ..views import accepted_encodings, static_file
+
+
+def temp_dir(test):
+    path = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, path)
+    return path
+
+
+class AcceptEncodingTests(SimpleTestCase):
+
+    def test_parse(self):
+        self.assertEqual(accepted_encodings(""), {})
+        self.assertEqual(accepted_encodings("gzip, deflate, br"), {"gzip": 1.0, "deflate": 1.0, "br": 1.0})
+        self.assertEqual(accepted_encodings("br;q=0, GZIP; q=0.5, *;q=0.1"), {"br": 0.0, "gzip": 0.5, "*": 0.1})
+        self.assertEqual(accepted_encodings("gzip;q=x"), {"gzip": 0.0})
+
+    def test_tokens_are_not_substrings(self):
+        self.assertEqual(accepted_encodings("x-gzip-nope, brx"), {"x-gzip-nope": 1.0, "brx": 1.0})
+
+
+class StaticFileTests(SimpleTestCase):
+
+    def setUp(self):
+        static_root = temp_dir(self)
+        static = override_settings(STATIC_ROOT=static_root)
+        static.enable()
+        self.addCleanup(static.disable)
+        self.path = "styles.0123456789ab.css"
+        for extension, data in (("", b"body{}"), (".gz", b"gz"), (".br", b"br")):
+            with open(os.path.join(static_root, self.path + extension), "wb") as f:
+                f.write(data)
+
+    def get(self, accept_encoding=None):
+        headers = {"HTTP_ACCEPT_ENCODING": accept_encoding} if accept_encoding is not None else {}
+        response = static_file(RequestFactory().get("/static/" + self.path, **headers), self.path)
+        return response.get("Content-Encoding"), b"".join(response.streaming_content)
+
+    def test_negotiation(self):
+        cases = {
+            None: (None, b"body{}"),
+            "gzip, deflate, br": ("br", b"br"),
+            "gzip": ("gzip", b"gz"),
+            "br;q=0, gzip": ("gzip", b"gz"),
+            "br;q=0.5, gzip": ("gzip", b"gz"),
+            "br;q=0, gzip;q=0": (None, b"body{}"),
+            "*": ("br", b"br"),
+            "*;q=0": (None, b"body{}"),
+            "x-brotli-ish": (None, b"body{}"),
+        }
+        for header, expected in cases.items():
+            with self.subTest(header=header):
+                self.assertEqual(self.get(header), expected)
+
+    def test_hashed_names_are_immutable(self):
+        response = static_file(RequestFactory().get("/"), self.path)
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+
+
+class ManifestStorageTests(SimpleTestCase):
+
+    def storage(self):
+        return CompressedManifestStaticFilesStorage(location=temp_dir(self))
+
+    def test_plain_names_only_in_debug(self):
+        with self.settings(DEBUG=True):
+            self.assertEqual(self.storage().stored_name("auctions/styles.css"), "auctions/styles.css")
+        with self.settings(DEBUG=False), self.assertRaises(ValueError):
+            self.storage().stored_name("auctions/styles.css")
+
+    def test_collectstatic_hashes_and_compresses(self):
+        static_root = temp_dir(self)
+        storage = "auctions.storage.CompressedManifestStaticFilesStorage"
+        with self.settings(STATIC_ROOT=static_root, STATICFILES_STORAGE=storage, SPRITE_ROOT=temp_dir(self)):
+            call_command("collectstatic", interactive=False, verbosity=0)
+            hashed = CompressedManifestStaticFilesStorage().stored_name("auctions/styles.css")
+        self.assertRegex(hashed, r"^auctions/styles\.[0-9a-f]{12}\.css$")
+        with open(os.path.join(static_root, hashed), "rb") as f, gzip.open(os.path.join(static_root, hashed + ".gz")) as g:
+            self.assertEqual(f.read(), g.read())
+
+
+class SpriteTests(SimpleTestCase):
+
+    def setUp(self):
+        sprite_root = override_settings(SPRITE_ROOT=temp_dir(self))
+        sprite_root.enable()
+        self.addCleanup(sprite_root.disable)
+
+    def test_finder_never_builds_the_sprite(self):
+        self.assertIsNone(finders.find(SPRITE_NAME))
+        self.assertFalse(os.path.exists(sprite_path()))
+
+    def test_collectstatic_builds_the_sprite(self):
+        with self.settings(STATIC_ROOT=temp_dir(self)):
+            call_command("collectstatic", interactive=False, verbosity=0)
+        self.assertTrue(os.path.exists(sprite_path()))
+
+    def test_sprite_is_built_outside_the_source_tree(self):
+        build_sprite()
+        path = finders.find(SPRITE_NAME)
+        self.assertEqual(path, sprite_path())
+        self.assertFalse(os.path.exists(os.path.join(ICONS_DIR, "sprite.svg")))
+        with open(path) as f:
+            sprite = f.read()
+        self.assertIn('<symbol id="ppl-apps"', sprite)
+        self.assertNotIn('fill="#', sprite)
+
+    def test_sprite_is_only_rebuilt_when_stale(self):
+        self.assertGreater(build_sprite(), 0)
+        self.assertIsNone(build_sprite())
+        os.utime(sprite_path(), (0, 0))
+        self.assertGreater(build_sprite(), 0)
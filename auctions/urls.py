@@ -1,4 +1,4 @@
-from django.urls import path
+from django.urls import path, re_path
 from . import views
 
 urlpatterns = [
@@ -16,6 +16,7 @@ urlpatterns = [
     # Listing page
     path("listing/<int:listing_id>/", views.listing_detail, name="listing_detail"),
     path("listing/<int:listing_id>/bid/", views.place_bid, name="place_bid"),
+    path("listing/<int:listing_id>/proxy/", views.place_proxy_bid, name="place_proxy_bid"),
     path("listing/<int:listing_id>/close/", views.close_auction, name="close_auction"),
     path("listing/<int:listing_id>/comment/", views.add_comment, name="add_comment"),
     path("listing/<int:listing_id>/watchlist/", views.toggle_watchlist, name="toggle_watchlist"),
@@ -29,4 +30,10 @@ urlpatterns = [
 
     # Categories
     path("categories/", views.categories_view, name="categories"),
+
+    # Locally cached listing thumbnails
+    re_path(r"^thumbs/(?P<name>[0-9a-f]{32}\.(?:webp|jpg))$", views.thumbnail, name="thumbnail"),
+
+    # Prometheus metrics of this worker
+    path("metrics", views.metrics_view, name="metrics"),
 ]
@@ -1,7 +1,9 @@
-from .models import Listing, Watchlist, Comment
+from . import activity, events, metrics, recommendations, sharding
+from .forms import CommentForm
+from .models import Listing, Watchlist, Bid, ProxyBid
 from decimal import Decimal
 from collections.abc import Iterable
-from .forms import CommentForm
+from django.db.models import Case, IntegerField, OuterRef, Subquery, Value, When
 
 def is_watching(user, listing):
     """Return True if user has listing in watchlist."""
@@ -34,34 +36,52 @@ def current_price(listings):
 
     raise TypeError("Argument must be a Listing or an iterable of Listings.")
 
+@metrics.timed(metrics.LISTING_CONTEXT_SECONDS)
 def get_listing_context(listing, user=None, error=""):
     """
     Build context dictionary for a listing page.
     Includes current price, watching status, owner, messages, comments, and comment form.
+    Everything the template shows is resolved here, so rendering runs no queries;
+    pass a listing fetched with select_related("owner", "winner").
     """
-    if isinstance(listing, Listing):
-        current_price_value, has_bids = current_price(listing)
-    else:
-        current_price_value, has_bids = 0, False
+    is_authenticated = bool(user and getattr(user, 'is_authenticated', False))
+    is_watching_value = is_watching(user, listing) if is_authenticated else False
+    is_owner = is_authenticated and user.pk == listing.owner_id
+    proxy_max = (
+        ProxyBid.objects.filter(user=user, listing=listing).values_list("max_amount", flat=True).first()
+        if is_authenticated and not is_owner and listing.is_active else None
+    )
 
-    is_watching_value = is_watching(user, listing) if user and hasattr(user, 'is_authenticated') and user.is_authenticated else False
+    # One query gives the price, whether there are bids and who is leading
+    highest_bid = listing.bids.order_by("-amount", "id").values("amount", "bidder_id").first()
+    has_bids = highest_bid is not None
+    current_price_value = Decimal(highest_bid["amount"]) if has_bids else Decimal(listing.starting_bid)
+    comments = list(
+        listing.comments.filter(is_hidden=False).order_by('-id').values_list("author_id", "text")
+    )
 
-    highest_bid = listing.bids.order_by("-amount").first()
-    current_owner = highest_bid.bidder.username if highest_bid else listing.owner.username
+    # Bids and comments may be on another shard than users, so their authors are looked up in one query
+    authors = {author_id for author_id, _ in comments} | ({highest_bid["bidder_id"]} if has_bids else set())
+    names = sharding.usernames(authors - {listing.owner_id})
+    owner_username = names[listing.owner_id] = listing.owner.username
+    current_owner = names[highest_bid["bidder_id"]] if has_bids else owner_username
 
     show_message = False
     message = ""
 
     if not listing.is_active:
-        if listing.winner:
-            if user == listing.owner or user == listing.winner:
+        if listing.winner_id:
+            if is_authenticated and user.pk in (listing.owner_id, listing.winner_id):
                 show_message = True
                 message = f"Auction closed. Won by {listing.winner.username}, ${current_price_value}."
         else:
             show_message = True
             message = f"Auction closed. No bids were placed. Starting bid: ${listing.starting_bid}"
 
-    comments = Comment.objects.filter(listing=listing).order_by('-id')
+    comments = [
+        {"author": names.get(author_id, ""), "text": text, "by_owner": author_id == listing.owner_id}
+        for author_id, text in comments
+    ]
     form = CommentForm()
 
     return {
@@ -71,6 +91,10 @@ def get_listing_context(listing, user=None, error=""):
         "current_price": current_price_value,
         "is_watching": is_watching_value,
         "current_owner": current_owner,
+        "owner_username": owner_username,
+        "is_owner": is_owner,
+        "can_bid": is_authenticated and not is_owner and listing.is_active,
+        "proxy_max": proxy_max,
         "show_message": show_message,
         "message": message,
         "comments": comments,
@@ -80,7 +104,57 @@ def get_listing_context(listing, user=None, error=""):
 
 
 def add_to_watchlist(user, listing):
-    Watchlist.objects.get_or_create(user=user, listing=listing)
+    _, created = Watchlist.objects.get_or_create(user=user, listing=listing)
+    activity.watch_added(user, listing, *current_price(listing))
+    if created:
+        events.record(events.WATCHED, listing.pk, user.pk)
 
 def remove_from_watchlist(user, listing):
-    Watchlist.objects.filter(user=user, listing=listing).delete()
+    deleted, _ = Watchlist.objects.filter(user=user, listing=listing).delete()
+    activity.watch_removed(user, listing)
+    if deleted:
+        events.record(events.UNWATCHED, listing.pk, user.pk)
+    # New watches are found by the next refresh on their own, removals have to be flagged
+    recommendations.mark_stale([listing.pk])
+
+
+def close_listings(listings):
+    """
+    Close every active listing in the `listings` queryset and record its winner.
+    Runs a fixed number of queries however many listings are closed:
+    winners are resolved by a correlated subquery inside one UPDATE.
+    Sharded, winners are looked up shard by shard and written back in batches.
+    """
+    highest_bidder = Bid.objects.filter(listing=OuterRef("pk")).order_by("-amount", "id").values("bidder_id")[:1]
+
+    with events.atomic():
+        # `listings` may itself filter on is_active, so every step runs while the set is still active
+        to_close = listings.filter(is_active=True).values("pk")
+        if sharding.is_sharded():
+            set_winners(sharding.top_bidders(list(to_close.values_list("pk", flat=True))))
+        else:
+            Listing.objects.filter(pk__in=to_close).update(winner=Subquery(highest_bidder))
+        activity.listings_closed(to_close)
+        recommendations.mark_stale(to_close)
+        # Written with one INSERT when the transaction commits
+        for listing_id, winner_id in Listing.objects.filter(pk__in=to_close).values_list("pk", "winner_id"):
+            events.record(events.CLOSED, listing_id, None, winner_id)
+        closed = Listing.objects.filter(pk__in=to_close).update(is_active=False)
+    metrics.AUCTIONS_CLOSED.inc(amount=closed)
+    return closed
+
+
+def set_winners(winners, batch_size=300):
+    """Write {listing_id: winner_id} with one CASE UPDATE per batch."""
+    winners = list(winners.items())
+    for start in range(0, len(winners), batch_size):
+        batch = winners[start:start + batch_size]
+        Listing.objects.filter(pk__in=[listing_id for listing_id, _ in batch]).update(winner=Case(
+            *[When(pk=listing_id, then=Value(winner_id)) for listing_id, winner_id in batch],
+            output_field=IntegerField(),
+        ))
+
+
+def set_comments_hidden(comments, hidden=True):
+    """Hide or unhide every comment in the `comments` queryset with one UPDATE."""
+    return comments.update(is_hidden=hidden)
@@ -1,31 +1,41 @@
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.db import IntegrityError
-from django.http import HttpResponseRedirect
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseRedirect
+from django.utils._os import safe_join
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse
 from django.views.decorators.cache import never_cache
+from django.views.static import serve
 
+import mimetypes
+import os
+import re
 from decimal import Decimal
 
+from . import activity, events, metrics, recommendations
+from .cards import activity_cards, listing_cards, render_grid
 from .forms import ListingForm, CommentForm
-from .models import User, Listing, Watchlist, Bid, Comment, RemovedPurchase
+from .images import schedule_thumbnail, thumbnail_dir
+from .livestate import live_auctions
+from .models import User, Listing, Watchlist, Comment, RemovedPurchase
+from .ratelimit import client_ip, ratelimit
 
-from .utils import current_price, add_to_watchlist, remove_from_watchlist, get_listing_context
+from .utils import add_to_watchlist, remove_from_watchlist, get_listing_context, close_listings
 
 
 def index(request):
-    # Fetch all active listings
-    active_listings = Listing.objects.filter(is_active=True)
-    
-    # Attach dynamic current price to each listing
-    current_price(active_listings)
+    # Active listings as flat cards, priced in the same query
+    cards = listing_cards(Listing.objects.filter(is_active=True))
 
-    return render(request, "auctions/index.html", {
-        "listings": active_listings,
+    return render_grid(request, "auctions/index.html", "auctions/cards/index.html", {
+        "listings": cards,
+        "popular": recommendations.popular(),
     })
 
 
+@ratelimit(("ip", "20/m"), ("username", "5/m"))
 def login_view(request):
     if request.method == "POST":
         username = request.POST["username"]
@@ -88,6 +98,10 @@ def create_listing(request):
             listing.owner = request.user
             listing.is_active = True
             listing.save()
+            activity.listing_created(listing)
+            events.record(events.LISTED, listing.pk, request.user.pk, listing.starting_bid, listing.category)
+            # Thumbnails are built off the request path
+            schedule_thumbnail(listing)
             return redirect('index')
     else:
         form = ListingForm()
@@ -95,17 +109,22 @@ def create_listing(request):
     return render(request, "auctions/create_listing.html", {"form": form})
 
 @never_cache
+@metrics.timed(metrics.VIEW_SECONDS, "listing_detail")
 def listing_detail(request, listing_id):
-    listing = get_object_or_404(Listing, pk=listing_id)
+    listing = get_object_or_404(Listing.objects.select_related("owner", "winner"), pk=listing_id)
     # Get context including current price and has_bids
     context = get_listing_context(listing, user=request.user, error=request.GET.get("error", ""))
+    # Top-K reads of the precomputed rankings
+    context["similar"] = recommendations.similar(listing.id)
+    context["popular"] = recommendations.popular(listing.category, exclude=listing.id)
     return render(request, "auctions/listing_detail.html", context)
 
 
 @never_cache
 @login_required
+@ratelimit(("user", "30/m"))
 def toggle_watchlist(request, listing_id):
-    listing = get_object_or_404(Listing, pk=listing_id)
+    listing = get_object_or_404(Listing.objects.select_related("owner", "winner"), pk=listing_id)
     
     # Toggle watchlist
     if Watchlist.objects.filter(user=request.user, listing=listing).exists():
@@ -121,33 +140,29 @@ def toggle_watchlist(request, listing_id):
 
 @never_cache
 @login_required
+@ratelimit(("user", "20/m"), ("ip", "60/m"), ("user_listing", "10/m"))
+@metrics.timed(metrics.VIEW_SECONDS, "place_bid")
 def place_bid(request, listing_id):
-    listing = get_object_or_404(Listing, pk=listing_id)
     error = ""
 
     if request.method == "POST":
-        if request.user == listing.owner:
-            error = "Owners cannot place bids on their own listings."
+        try:
+            bid_amount = int(request.POST["bid_amount"])
+        except (KeyError, ValueError):
+            metrics.BIDS.inc("invalid")
+            error = "Invalid bid amount."
         else:
+            # Checked against the in-memory auction state, then written with a versioned update
             try:
-                bid_amount = int(request.POST["bid_amount"])
-            except (KeyError, ValueError):
-                error = "Invalid bid amount."
-            else:
-                current_amount, has_bids = current_price(listing)
-
-                if has_bids:
-                    if bid_amount <= current_amount:
-                        error = f"Your bid must be greater than the current price (${current_amount})."
-                    else:
-                        Bid.objects.create(amount=bid_amount, bidder=request.user, listing=listing)
-                        return redirect("listing_detail", listing_id=listing.id)
-                else:
-                    if bid_amount < current_amount:
-                        error = f"Your bid must be at least the starting price (${current_amount})."
-                    else:
-                        Bid.objects.create(amount=bid_amount, bidder=request.user, listing=listing)
-                        return redirect("listing_detail", listing_id=listing.id)
+                error = live_auctions.place_bid(listing_id, request.user, bid_amount)
+            except Listing.DoesNotExist:
+                metrics.BIDS.inc("not_found")
+                raise Http404("No Listing matches the given query.")
+            if not error:
+                return redirect("listing_detail", listing_id=listing_id)
+
+    # The listing is only loaded to show the page again
+    listing = get_object_or_404(Listing.objects.select_related("owner", "winner"), pk=listing_id)
 
     # Build context using utils
     context = get_listing_context(listing, user=request.user, error=error)
@@ -157,14 +172,39 @@ def place_bid(request, listing_id):
 
 @never_cache
 @login_required
+@ratelimit(("user", "20/m"), ("ip", "60/m"), ("user_listing", "10/m"))
+def place_proxy_bid(request, listing_id):
+    error = ""
+
+    if request.method == "POST":
+        try:
+            max_amount = int(request.POST["max_amount"])
+        except (KeyError, ValueError):
+            error = "Invalid maximum bid."
+        else:
+            # The engine bids on the user's behalf, up to this maximum
+            try:
+                error = live_auctions.place_proxy(listing_id, request.user, max_amount)
+            except Listing.DoesNotExist:
+                raise Http404("No Listing matches the given query.")
+            if not error:
+                return redirect("listing_detail", listing_id=listing_id)
+
+    listing = get_object_or_404(Listing.objects.select_related("owner", "winner"), pk=listing_id)
+    context = get_listing_context(listing, user=request.user, error=error)
+
+    return render(request, "auctions/listing_detail.html", context)
+
+
+@never_cache
+@login_required
+@metrics.timed(metrics.VIEW_SECONDS, "close_auction")
 def close_auction(request, listing_id):
-    listing = get_object_or_404(Listing, pk=listing_id)
+    listing = get_object_or_404(Listing.objects.select_related("owner", "winner"), pk=listing_id)
 
     if request.method == "POST" and request.user == listing.owner and listing.is_active:
-        highest_bid = listing.bids.order_by("-amount").first()
-        listing.is_active = False
-        listing.winner = highest_bid.bidder if highest_bid else None
-        listing.save()
+        close_listings(Listing.objects.filter(pk=listing.pk))
+        listing.refresh_from_db()
 
     # Build context using utils
     context = get_listing_context(listing, user=request.user)
@@ -174,8 +214,9 @@ def close_auction(request, listing_id):
 
 @never_cache
 @login_required
+@ratelimit(("user", "10/m"), ("ip", "30/m"))
 def add_comment(request, listing_id):
-    listing = get_object_or_404(Listing, pk=listing_id)
+    listing = get_object_or_404(Listing.objects.select_related("owner", "winner"), pk=listing_id)
 
     if request.method == 'POST':
         form = CommentForm(request.POST)
@@ -184,6 +225,7 @@ def add_comment(request, listing_id):
             comment.author = request.user
             comment.listing = listing
             comment.save()
+            events.record(events.COMMENT, listing.pk, request.user.pk, comment.text)
 
     # Build context using utils
     context = get_listing_context(listing, user=request.user)
@@ -201,54 +243,27 @@ def categories_view(request):
     })
 
 @login_required
+@metrics.timed(metrics.VIEW_SECONDS, "unified_listings")
 def unified_listings(request, mode, category_name=None):
-    listings = []
-
-    if mode == "watchlist":
-        listings = Listing.objects.filter(
-            watchlist_entries__user=request.user
-        ).order_by('-id')
-
-    elif mode == "my_listings":
-        listings = Listing.objects.filter(owner=request.user).order_by('-id')
-
-    elif mode == "my_purchases":
-        bids = Bid.objects.filter(bidder=request.user).select_related('listing')
-        listings_set = {bid.listing for bid in bids}
-
-        removed = RemovedPurchase.objects.filter(user=request.user).values_list('listing_id', flat=True)
-
-        listings = []
-        for listing in listings_set:
-            if listing.id in removed:
-                continue
-            if listing.owner == request.user:
-                continue
-            listings.append(listing)
-
-    elif mode == "category":
-        listings = Listing.objects.filter(is_active=True, category=category_name)
-
-    current_price(listings)
-
-    for listing in listings:
-        if mode in ["my_purchases", "watchlist"]:
-            if listing.is_active:
-                listing.status_message = f"Current price: ${listing.current_price}"
-            else:
-                if listing.winner == request.user:
-                    listing.status_message = "YOU WON!"
-                else:
-                    listing.status_message = "YOU DID NOT WIN"
-        elif mode == "my_listings":
-            listing.status_message = "Active" if listing.is_active else "Closed"
-        else:
-            listing.status_message = ""
+    next_before = None
 
-    return render(request, "auctions/listings.html", {
+    if mode == "category":
+        listings = listing_cards(Listing.objects.filter(is_active=True, category=category_name))
+    else:
+        # Watchlist, my listings and my purchases all read the per-user activity projection
+        try:
+            before = int(request.GET.get("before", ""))
+        except ValueError:
+            before = None
+        rows, next_before = activity.dashboard(request.user, mode, before)
+        listings = activity_cards(rows, mode)
+    metrics.GRID_CARDS.observe(len(listings), mode)
+
+    return render_grid(request, "auctions/listings.html", "auctions/cards/listings.html", {
         "listings": listings,
         "mode": mode,
         "category_name": category_name,
+        "next_before": next_before,
     })
 
 
@@ -258,10 +273,11 @@ def remove_listing_from_mode(request, listing_id):
     listing = Listing.objects.get(pk=listing_id)
 
     if mode == "watchlist":
-        Watchlist.objects.filter(user=request.user, listing=listing).delete()
+        remove_from_watchlist(request.user, listing)
 
     elif mode == "my_purchases":
         RemovedPurchase.objects.get_or_create(user=request.user, listing=listing)
+        activity.purchase_removed(request.user, listing)
 
     if mode == "watchlist":
         return redirect("watchlist")
@@ -269,3 +285,68 @@ def remove_listing_from_mode(request, listing_id):
         return redirect("my_listings")
     elif mode == "my_purchases":
         return redirect("my_purchases")
+
+
+def thumbnail(request, name):
+    # Thumbnail names are content hashes, so browsers may cache them forever
+    response = serve(request, name, document_root=thumbnail_dir())
+    response["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
+
+
+@never_cache
+def metrics_view(request):
+    # Prometheus scrape target; only served to METRICS_ALLOWED_IPS unless that list is empty
+    if settings.METRICS_ALLOWED_IPS and client_ip(request) not in settings.METRICS_ALLOWED_IPS:
+        raise Http404
+    return HttpResponse(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
+
+def accepted_encodings(header):
+    """Parse an Accept-Encoding header into {coding: q-value}; q=0 means the coding is refused."""
+    accepted = {}
+    for part in header.split(","):
+        coding, *params = [token.strip() for token in part.split(";")]
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding.lower()] = quality
+    return accepted
+
+
+def static_file(request, path):
+    # Serve collected static files, preferring the precompressed variant the browser accepts
+    try:
+        full_path = safe_join(settings.STATIC_ROOT, path)
+    except ValueError:
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+
+    content_type = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+    accepted = accepted_encodings(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+    encoding = None
+    # Highest q-value wins; on a tie brotli is preferred since it is smaller
+    variants = [(accepted.get(name, accepted.get("*", 0)), name, extension)
+                for name, extension in (("br", ".br"), ("gzip", ".gz"))]
+    for quality, name, extension in sorted(variants, key=lambda variant: -variant[0]):
+        if quality > 0 and os.path.isfile(full_path + extension):
+            full_path += extension
+            encoding = name
+            break
+
+    response = FileResponse(open(full_path, "rb"), content_type=content_type)
+    response["Vary"] = "Accept-Encoding"
+    if encoding:
+        response["Content-Encoding"] = encoding
+    # Names fingerprinted by the manifest storage ("styles.2ceb5b540984.css") never change
+    if re.search(r"\.[0-9a-f]{12}\.[^/]+$", path):
+        response["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
@@ -30,8 +30,13 @@ ALLOWED_HOSTS = []
 
 # Application definition
 
+# Startup
+# COMMERCE_TEMPLATE_PRELOAD=1 compiles every auctions/*.html template into the cached
+# template loader when the app loads, so the first request after boot doesn't compile templates.
+TEMPLATE_PRELOAD = bool(os.environ.get('COMMERCE_TEMPLATE_PRELOAD'))
+
 INSTALLED_APPS = [
-    'auctions',
+    'auctions.apps.AuctionsConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -68,6 +73,29 @@ TEMPLATES = [
     },
 ]
 
+# Production always renders through the cached loader. Django would pick it implicitly
+# with DEBUG off; it is spelled out so TEMPLATE_PRELOAD can opt into it under DEBUG too.
+if TEMPLATE_PRELOAD or not DEBUG:
+    # Loaders replace APP_DIRS; the cached loader keeps compiled templates for the worker's lifetime
+    TEMPLATES[0]['APP_DIRS'] = False
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]
+
+# Listing grids with more cards than this are sent as a StreamingHttpResponse
+LISTING_STREAM_THRESHOLD = 1000
+
+# Cards per recommendation strip on the index and listing pages (see auctions/recommendations.py)
+RECOMMENDATIONS_K = 8
+
+# Live auction state (auctions/livestate.py): how many auctions each worker keeps in
+# memory, and how many seconds a loaded state is trusted before it is read again
+LIVE_AUCTIONS_MAX = 10000
+LIVE_AUCTIONS_TTL = 60
+
 WSGI_APPLICATION = 'commerce.wsgi.application'
 
 
@@ -81,8 +109,54 @@ DATABASES = {
     }
 }
 
+# Bids and comments sharded by listing (see auctions/sharding.py). COMMERCE_SHARDS=N spreads
+# them over the default database and N - 1 local SQLite files, e.g. to try sharding out.
+SHARD_COUNT = int(os.environ.get('COMMERCE_SHARDS', 1))
+
+# Set while `manage.py rebalance_shards` moves rows from the old layout (COMMERCE_SHARDS_PREVIOUS=M)
+PREVIOUS_SHARD_COUNT = int(os.environ.get('COMMERCE_SHARDS_PREVIOUS', 0))
+
+SHARD_ALIASES = ['default'] + [f'shard{index}' for index in range(1, max(SHARD_COUNT, PREVIOUS_SHARD_COUNT))]
+
+for alias in SHARD_ALIASES[1:]:
+    DATABASES[alias] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, f'db-{alias}.sqlite3'),
+    }
+
+AUCTION_SHARDS = SHARD_ALIASES[:SHARD_COUNT]
+
+AUCTION_SHARDS_PREVIOUS = SHARD_ALIASES[:PREVIOUS_SHARD_COUNT] or None
+
+DATABASE_ROUTERS = ['auctions.sharding.ShardRouter']
+
 AUTH_USER_MODEL = 'auctions.User'
 
+# Keeps the logged-in User in the cache so requests skip the user query. Only active when the
+# default cache is shared by all workers (memcached/redis); with locmem it behaves like ModelBackend.
+AUTHENTICATION_BACKENDS = ['auctions.backends.CachedModelBackend']
+
+AUTH_USER_CACHE_TIMEOUT = 300
+
+# Cache users in a per-process cache anyway; only safe when a single process serves every request
+AUTH_USER_CACHE_LOCAL = False
+
+# Session storage profile: "db", "cached_db" (write-through cache) or "signed_cookies" (no server storage)
+SESSION_PROFILE = os.environ.get('COMMERCE_SESSION_PROFILE', 'cached_db')
+
+SESSION_ENGINE = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}[SESSION_PROFILE]
+
+# Production keeps Django's default hashers. The test settings and COMMERCE_FAST_HASHERS=1
+# (benchmarks) opt into a deliberately cheap hasher, since PBKDF2 dominates user creation and login there.
+FAST_PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+if os.environ.get('COMMERCE_FAST_HASHERS'):
+    PASSWORD_HASHERS = FAST_PASSWORD_HASHERS
+
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
 
@@ -121,5 +195,66 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 
-STATICFILES_DIRS = [os.path.join(BASE_DIR, "static")]
+# App static files are found by the app directories finder; the project-level folder is optional
+STATICFILES_DIRS = [path for path in [os.path.join(BASE_DIR, "static")] if os.path.isdir(path)]
+
+# Target of `manage.py build_static` (sprite + collectstatic with hashed, precompressed files)
+STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
+
+STATICFILES_STORAGE = 'auctions.storage.CompressedManifestStaticFilesStorage'
+
+STATICFILES_FINDERS = [
+    'django.contrib.staticfiles.finders.FileSystemFinder',
+    'django.contrib.staticfiles.finders.AppDirectoriesFinder',
+    # Serves auctions/icons/sprite.svg once collectstatic or build_static has built it
+    'auctions.finders.SpriteFinder',
+]
+
+# Generated static files (the icon sprite) are written here, never into the source tree
+SPRITE_ROOT = os.path.join(BASE_DIR, "build", "static")
+
+# Let Django serve STATIC_ROOT with immutable caching when no web server sits in front of it
+SERVE_STATIC = False
+
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.0/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+
+# Rate limiting (see auctions/ratelimit.py)
+# The cache must support atomic incr() and be shared by all workers in production (memcached/redis):
+# on the default locmem cache every worker process enforces the limits on its own.
+
+RATELIMIT_ENABLE = True
+
+RATELIMIT_CACHE = 'default'
+
+
+# Metrics (see auctions/metrics.py)
+# /metrics is only served to these addresses; an empty list serves everyone, e.g. behind a proxy that restricts it.
+METRICS_ALLOWED_IPS = [ip for ip in os.environ.get('COMMERCE_METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',') if ip]
+
+
+# Listing thumbnails (see auctions/images.py)
+
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+MEDIA_URL = '/media/'
+
+THUMBNAIL_SIZE = (400, 300)
+
+THUMBNAIL_FETCH_TIMEOUT = 10
+
+THUMBNAIL_MAX_BYTES = 10 * 1024 * 1024
+
 
+# Query budgets of the test suite (see auctions/testing.py)
+# Time budgets are multiplied by this factor, e.g. COMMERCE_QUERY_BUDGET_TIME_FACTOR=3 on slow CI machines.
+QUERY_BUDGET_TIME_FACTOR = float(os.environ.get('COMMERCE_QUERY_BUDGET_TIME_FACTOR', 1))
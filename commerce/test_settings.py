@@ -0,0 +1,21 @@
+"""
+Settings for the test suite: the production settings plus overrides that only make
+sense under test. `manage.py test` selects this module unless DJANGO_SETTINGS_MODULE
+is set.
+"""
+from .settings import *  # noqa: F401,F403
+
+# Tests render templates without running collectstatic, so there is no manifest to hash names with
+STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
+
+# PBKDF2 would dominate the run time of every test that creates or logs in a user
+PASSWORD_HASHERS = FAST_PASSWORD_HASHERS  # noqa: F405
+
+# The test client runs in this one process, so locmem stands in for the shared cache production uses
+AUTH_USER_CACHE_LOCAL = True
+
+# Two shards the sharding tests switch on with override_settings, so they run without COMMERCE_SHARDS=N
+for _alias in ('shard1', 'shard2'):
+    if _alias not in SHARD_ALIASES:  # noqa: F405
+        SHARD_ALIASES.append(_alias)  # noqa: F405
+        DATABASES[_alias] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}  # noqa: F405
@@ -13,10 +13,16 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
-from django.urls import include, path
+from django.urls import include, path, re_path
+
+from auctions.views import static_file
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("", include("auctions.urls"))
-]
\ No newline at end of file
+]
+
+if settings.SERVE_STATIC:
+    urlpatterns.insert(0, re_path(r"^%s(?P<path>.*)$" % settings.STATIC_URL.lstrip("/"), static_file))
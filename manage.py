@@ -5,7 +5,9 @@ import sys
 
 
 def main():
-    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'commerce.settings')
+    # The test runner gets its own settings module, see commerce/test_settings.py
+    default_settings = 'commerce.test_settings' if sys.argv[1:2] == ['test'] else 'commerce.settings'
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', default_settings)
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc: